@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+DEFAULT_QUERIES = [
+    "What does the gate want from us?",
+    "Which song should I play if I want the night to answer back?",
+    "Tell me who Ritsu, Patch, Null, Duct, and Sei are.",
+    "Show me the fracture line between receipt and myth.",
+    "Where does the witness choir first appear?",
+    "What is the fork tax?",
+    "lantern",
+    "Who keeps its own counsel?",
+]
+IN_FLIGHT_RE = re.compile(r'^fork_tales_http_requests_in_flight\{route="/api/chat"\} ([0-9.e+]+)$', re.MULTILINE)
+METRICS_POLL_SECONDS = 0.25
+
+
+@dataclass
+class LoadResult:
+    latencies: list[float] = field(default_factory=list)
+    statuses: dict[str, int] = field(default_factory=dict)
+    fallbacks: int = 0
+    client_in_flight: list[int] = field(default_factory=list)
+    server_in_flight: list[float] = field(default_factory=list)
+    lateness: list[float] = field(default_factory=list)
+    elapsed: float = 0.0
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+async def fire(client: httpx.AsyncClient, query: str, result: LoadResult) -> None:
+    started = time.perf_counter()
+    try:
+        response = await client.post("/api/chat", json={"message": query})
+    except httpx.HTTPError as exc:
+        key = type(exc).__name__
+    else:
+        key = str(response.status_code)
+        if response.status_code == 200 and response.json().get("fallback"):
+            result.fallbacks += 1
+    result.latencies.append((time.perf_counter() - started) * 1000)
+    result.statuses[key] = result.statuses.get(key, 0) + 1
+
+
+async def poll_metrics(client: httpx.AsyncClient, result: LoadResult, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        try:
+            body = (await client.get("/metrics")).text
+        except httpx.HTTPError:
+            body = ""
+        match = IN_FLIGHT_RE.search(body)
+        if match:
+            result.server_in_flight.append(float(match.group(1)))
+        try:
+            await asyncio.wait_for(stop.wait(), METRICS_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_load(base_url: str, rps: float, duration: float, queries: list[str], timeout: float, seed: int) -> LoadResult:
+    """Open-loop load: requests start on schedule whether or not earlier ones finished,
+    so a slow server shows up as latency instead of silently lowering the offered rate."""
+    result = LoadResult()
+    rng = random.Random(seed)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=256)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        stop = asyncio.Event()
+        poller = asyncio.create_task(poll_metrics(client, result, stop))
+        tasks: set[asyncio.Task[None]] = set()
+        started = time.perf_counter()
+        total = int(rps * duration)
+        for index in range(total):
+            scheduled = started + index / rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                result.lateness.append(-delay * 1000)
+            task = asyncio.create_task(fire(client, rng.choice(queries), result))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            result.client_in_flight.append(len(tasks))
+        if tasks:
+            await asyncio.gather(*tasks)
+        result.elapsed = time.perf_counter() - started
+        stop.set()
+        await poller
+    return result
+
+
+def summarize(result: LoadResult, rps: float, duration: float) -> dict[str, Any]:
+    completed = len(result.latencies)
+    ok = result.statuses.get("200", 0)
+    return {
+        "targetRps": rps,
+        "durationSeconds": duration,
+        "requests": completed,
+        "elapsedSeconds": round(result.elapsed, 3),
+        "achievedRps": round(completed / result.elapsed, 2) if result.elapsed else 0.0,
+        "latencyMs": {
+            "p50": round(percentile(result.latencies, 0.50), 2),
+            "p90": round(percentile(result.latencies, 0.90), 2),
+            "p99": round(percentile(result.latencies, 0.99), 2),
+            "max": round(max(result.latencies, default=0.0), 2),
+        },
+        "statuses": result.statuses,
+        "errorRate": round(1 - ok / completed, 4) if completed else 0.0,
+        "fallbackRate": round(result.fallbacks / ok, 4) if ok else 0.0,
+        "saturation": {
+            "clientInFlightMax": max(result.client_in_flight, default=0),
+            "serverChatInFlightMax": max(result.server_in_flight, default=0.0),
+            "serverChatInFlightMean": round(sum(result.server_in_flight) / len(result.server_in_flight), 2) if result.server_in_flight else 0.0,
+            "scheduleLagP99Ms": round(percentile(result.lateness, 0.99), 2),
+        },
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Drive /api/chat at a fixed request rate and report latency and saturation.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8794")
+    parser.add_argument("--rps", type=float, default=20.0)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--queries", type=Path, help="file with one query per line")
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--output", type=Path)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    queries = DEFAULT_QUERIES
+    if args.queries:
+        queries = [line.strip() for line in args.queries.read_text(encoding="utf-8").splitlines() if line.strip()]
+    result = asyncio.run(run_load(args.base_url, args.rps, args.duration, queries, args.timeout, args.seed))
+    summary = summarize(result, args.rps, args.duration)
+    text = json.dumps(summary, indent=2)
+    print(text)
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(text, encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
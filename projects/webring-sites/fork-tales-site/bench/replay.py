@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+from bench.loadtest import percentile
+from fork_tales_api.shadow import jaccard
+
+
+@dataclass
+class TargetRun:
+    base_url: str
+    latencies: list[float] = field(default_factory=list)
+    statuses: dict[str, int] = field(default_factory=dict)
+    fallbacks: int = 0
+    citations: dict[int, list[str]] = field(default_factory=dict)
+    sessions: dict[str, str] = field(default_factory=dict)
+
+
+def load_capture(paths: list[Path]) -> list[dict[str, Any]]:
+    """Read capture files (including rotated `.N` siblings) and order records by capture time."""
+    records = []
+    for path in paths:
+        with path.open(encoding="utf-8") as handle:
+            for line in handle:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(record, dict) and "request" in record:
+                    records.append(record)
+    records.sort(key=lambda record: record["ts"])
+    return records
+
+
+def conversation(record: dict[str, Any]) -> str | None:
+    """The captured session a record's turn ran in: the response's id, or the request's in older captures."""
+    return record.get("sessionId") or record["request"].get("sessionId")
+
+
+def request_body(record: dict[str, Any], run: TargetRun) -> dict[str, Any]:
+    request = dict(record["request"])
+    captured_session = request.pop("sessionId", None)
+    if captured_session:
+        # Session ids are per-server; map each captured conversation onto one this build issued.
+        live = run.sessions.get(captured_session)
+        if live:
+            request["sessionId"] = live
+        else:
+            request["session"] = True
+    return request
+
+
+async def send(client: httpx.AsyncClient, run: TargetRun, position: int, record: dict[str, Any]) -> None:
+    body = request_body(record, run)
+    started = time.perf_counter()
+    try:
+        response = await client.post(f"{run.base_url}/api/chat", json=body)
+    except httpx.HTTPError as exc:
+        key = type(exc).__name__
+    else:
+        key = str(response.status_code)
+        if response.status_code == 200:
+            payload = response.json()
+            run.fallbacks += bool(payload.get("fallback"))
+            run.citations[position] = [citation["id"] for citation in payload.get("citations", [])]
+            captured_session = conversation(record)
+            if captured_session and payload.get("sessionId"):
+                run.sessions.setdefault(captured_session, payload["sessionId"])
+    run.latencies.append((time.perf_counter() - started) * 1000)
+    run.statuses[key] = run.statuses.get(key, 0) + 1
+
+
+async def replay(
+    records: list[dict[str, Any]],
+    targets: list[str],
+    speed: float | None,
+    timeout: float,
+    transport: httpx.AsyncBaseTransport | None = None,
+) -> list[TargetRun]:
+    """Re-send captured requests on their original schedule divided by `speed`; `None` sends as fast as possible.
+
+    Turns of one captured session are sent in order so session ids can be remapped.
+    """
+    runs = [TargetRun(base_url.rstrip("/")) for base_url in targets]
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=256)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits, transport=transport) as client:
+        session_tails: dict[tuple[int, str], asyncio.Task[None]] = {}
+        tasks: list[asyncio.Task[None]] = []
+        origin = records[0]["ts"] if records else 0.0
+        started = time.perf_counter()
+        for position, record in enumerate(records):
+            if speed is not None:
+                delay = started + (record["ts"] - origin) / speed - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            requested = record["request"].get("sessionId")
+            captured_session = conversation(record)
+            for slot, run in enumerate(runs):
+                previous = session_tails.get((slot, requested)) if requested else None
+                task = asyncio.create_task(chained(previous, send(client, run, position, record)))
+                # An expired session continues under a new id, so later turns may name either.
+                for key in {requested, captured_session} - {None}:
+                    session_tails[(slot, key)] = task
+                tasks.append(task)
+        await asyncio.gather(*tasks)
+    return runs
+
+
+async def chained(previous: asyncio.Task[None] | None, request: Any) -> None:
+    if previous is not None:
+        await asyncio.wait([previous])
+    await request
+
+
+def summarize_run(run: TargetRun) -> dict[str, Any]:
+    completed = len(run.latencies)
+    ok = run.statuses.get("200", 0)
+    return {
+        "baseUrl": run.base_url,
+        "requests": completed,
+        "latencyMs": {
+            "p50": round(percentile(run.latencies, 0.50), 2),
+            "p90": round(percentile(run.latencies, 0.90), 2),
+            "p99": round(percentile(run.latencies, 0.99), 2),
+            "max": round(max(run.latencies, default=0.0), 2),
+        },
+        "statuses": run.statuses,
+        "errorRate": round(1 - ok / completed, 4) if completed else 0.0,
+        "fallbackRate": round(run.fallbacks / ok, 4) if ok else 0.0,
+    }
+
+
+def citation_overlap(left: dict[int, list[str]], right: dict[int, list[str]]) -> dict[str, Any]:
+    shared = sorted(left.keys() & right.keys())
+    if not shared:
+        return {"compared": 0}
+    overlaps = [jaccard(left[position], right[position]) for position in shared]
+    top_agree = [bool(left[position][:1] == right[position][:1]) for position in shared]
+    return {
+        "compared": len(shared),
+        "meanJaccard": round(statistics.fmean(overlaps), 4),
+        "minJaccard": round(min(overlaps), 4),
+        "identical": sum(1 for overlap in overlaps if overlap == 1.0),
+        "topCitationAgreement": round(sum(top_agree) / len(top_agree), 4),
+    }
+
+
+def parse_speed(value: str) -> float | None:
+    if value == "max":
+        return None
+    speed = float(value.removesuffix("x"))
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be positive or 'max'")
+    return speed
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Replay captured /api/chat traffic against one or two builds.")
+    parser.add_argument("capture", type=Path, nargs="+", help="capture JSONL files, rotated siblings included")
+    parser.add_argument("--target", required=True, help="base URL of the build under test")
+    parser.add_argument("--compare", help="base URL of a second build; citations are diffed against it")
+    parser.add_argument("--speed", type=parse_speed, default=1.0, help="1, N (e.g. 4x), or max")
+    parser.add_argument("--limit", type=int, help="replay only the first N captured requests")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--output", type=Path)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    records = load_capture(args.capture)[: args.limit]
+    targets = [args.target] + ([args.compare] if args.compare else [])
+    runs = asyncio.run(replay(records, targets, args.speed, args.timeout))
+
+    captured = {position: record["citations"] for position, record in enumerate(records) if "citations" in record}
+    captured_latency = [record["latencyMs"] for record in records if "latencyMs" in record]
+    summary: dict[str, Any] = {
+        "records": len(records),
+        "speed": "max" if args.speed is None else args.speed,
+        "captured": {
+            "latencyMs": {"p50": round(percentile(captured_latency, 0.50), 2), "p99": round(percentile(captured_latency, 0.99), 2)},
+        },
+        "runs": [summarize_run(run) for run in runs],
+        "citationOverlapVsCapture": [citation_overlap(captured, run.citations) for run in runs],
+    }
+    if len(runs) == 2:
+        summary["citationOverlapBetweenBuilds"] = citation_overlap(runs[0].citations, runs[1].citations)
+    text = json.dumps(summary, indent=2)
+    print(text)
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(text, encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
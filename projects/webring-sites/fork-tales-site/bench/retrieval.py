@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import resource
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from bench.synthetic_corpus import SyntheticVocabulary, generate_chunks
+from fork_tales_api.debug import peak_rss_bytes
+from fork_tales_api.retrieval import CorpusIndex
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+QUERY_LENGTHS = (1, 3, 8, 16)
+QUERIES_PER_LENGTH = 200
+CONCURRENCY_LEVELS = (1, 4, 8)
+THROUGHPUT_SECONDS = 3.0
+REGRESSION_THRESHOLD = 0.15
+
+
+def current_rss_bytes() -> int:
+    try:
+        pages = int(Path("/proc/self/statm").read_text().split()[1])
+    except (OSError, IndexError, ValueError):
+        return peak_rss_bytes()
+    return pages * resource.getpagesize()
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def measure_size(size: int, dense: bool, seed: int) -> dict[str, Any]:
+    """Run in a fresh process so RSS numbers belong to one index only."""
+    # Queries are drawn from the vocabulary the corpus was written in, continuing its random stream.
+    vocabulary = SyntheticVocabulary(50_000, 0.08, seed)
+    chunks = list(generate_chunks(size, vocabulary=vocabulary))
+    rss_before = current_rss_bytes()
+    started = time.perf_counter()
+    index = CorpusIndex(chunks, dense=dense)
+    build_seconds = time.perf_counter() - started
+    rss_index = current_rss_bytes() - rss_before
+
+    latency: dict[str, dict[str, float]] = {}
+    queries_by_length = {length: [" ".join(vocabulary.sample(length)) for _ in range(QUERIES_PER_LENGTH)] for length in QUERY_LENGTHS}
+    for length, queries in queries_by_length.items():
+        timings = []
+        for query in queries:
+            began = time.perf_counter()
+            index.search(query)
+            timings.append((time.perf_counter() - began) * 1000)
+        latency[str(length)] = {
+            "p50Ms": round(percentile(timings, 0.50), 3),
+            "p99Ms": round(percentile(timings, 0.99), 3),
+            "meanMs": round(statistics.fmean(timings), 3),
+        }
+
+    mixed = [query for queries in queries_by_length.values() for query in queries]
+    throughput: dict[str, float] = {}
+    for workers in CONCURRENCY_LEVELS:
+        throughput[str(workers)] = round(run_throughput(index, mixed, workers), 1)
+
+    return {
+        "chunks": size,
+        "dense": dense,
+        "buildSeconds": round(build_seconds, 3),
+        "indexRssBytes": rss_index,
+        "peakRssBytes": peak_rss_bytes(),
+        "latencyByQueryTokens": latency,
+        "throughputQps": throughput,
+    }
+
+
+def run_throughput(index: CorpusIndex, queries: list[str], workers: int) -> float:
+    stop = threading.Event()
+    counts = [0] * workers
+
+    def worker(slot: int) -> None:
+        position = slot
+        while not stop.is_set():
+            index.search(queries[position % len(queries)])
+            counts[slot] += 1
+            position += workers
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(worker, slot) for slot in range(workers)]
+        time.sleep(THROUGHPUT_SECONDS)
+        stop.set()
+        for future in futures:
+            future.result()
+    return sum(counts) / THROUGHPUT_SECONDS
+
+
+def compare(current: dict[str, Any], baseline: dict[str, Any]) -> list[str]:
+    """List metrics that got worse than the baseline by more than REGRESSION_THRESHOLD."""
+    regressions: list[str] = []
+    previous = {(run["chunks"], run["dense"]): run for run in baseline.get("runs", [])}
+    for run in current["runs"]:
+        before = previous.get((run["chunks"], run["dense"]))
+        if before is None:
+            continue
+        label = f"{run['chunks']} chunks (dense={run['dense']})"
+        checks = [("buildSeconds", run["buildSeconds"], before["buildSeconds"], True)]
+        checks.append(("indexRssBytes", run["indexRssBytes"], before["indexRssBytes"], True))
+        for length, stats in run["latencyByQueryTokens"].items():
+            old = before["latencyByQueryTokens"].get(length)
+            if old:
+                checks.append((f"p99Ms[{length} tokens]", stats["p99Ms"], old["p99Ms"], True))
+        for workers, qps in run["throughputQps"].items():
+            old_qps = before["throughputQps"].get(workers)
+            if old_qps:
+                checks.append((f"throughputQps[{workers}]", qps, old_qps, False))
+        for name, now, then, lower_is_better in checks:
+            if not then:
+                continue
+            change = (now - then) / then
+            if (change if lower_is_better else -change) > REGRESSION_THRESHOLD:
+                regressions.append(f"{label}: {name} {then} -> {now} ({change:+.0%})")
+    return regressions
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark CorpusIndex build time, memory, latency, and throughput.")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES), help="comma-separated chunk counts")
+    parser.add_argument("--no-dense", action="store_true", help="benchmark BM25 only")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", type=Path, default=Path("bench/results/retrieval.json"))
+    parser.add_argument("--baseline", type=Path, help="previous results file to diff against")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    sizes = [int(value) for value in args.sizes.split(",") if value.strip()]
+    runs = []
+    for size in sizes:
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            run = pool.submit(measure_size, size, not args.no_dense, args.seed).result()
+        print(json.dumps(run), flush=True)
+        runs.append(run)
+
+    results = {
+        "generatedAt": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "runs": runs,
+    }
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+    if args.baseline:
+        regressions = compare(results, json.loads(args.baseline.read_text(encoding="utf-8")))
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, AsyncIterator
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+STUB_ANSWER = (
+    "The gate hums because someone is still listening on the other side. "
+    "Open next: Chapter 02 — Just Another Day."
+)
+
+
+@dataclass(frozen=True)
+class StubConfig:
+    latency_ms: float = 400.0
+    latency_dist: str = "lognormal"
+    latency_sigma: float = 0.5
+    stream_chunk_ms: float = 30.0
+    error_rate: float = 0.0
+    error_status: int = 500
+    hang_rate: float = 0.0
+    seed: int | None = None
+
+
+class LatencyModel:
+    def __init__(self, config: StubConfig) -> None:
+        self.config = config
+        self.rng = random.Random(config.seed)
+
+    def sample_seconds(self) -> float:
+        mean = self.config.latency_ms / 1000
+        match self.config.latency_dist:
+            case "fixed":
+                return mean
+            case "uniform":
+                return self.rng.uniform(0, 2 * mean)
+            case "exponential":
+                return self.rng.expovariate(1 / mean) if mean > 0 else 0.0
+            case _:
+                # lognormal with the requested mean: mu = ln(mean) - sigma^2 / 2
+                sigma = self.config.latency_sigma
+                return self.rng.lognormvariate(math.log(mean) - sigma * sigma / 2, sigma) if mean > 0 else 0.0
+
+
+def completion_payload(model: str, content: str) -> dict[str, Any]:
+    return {
+        "id": f"chatcmpl-stub-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": len(content.split()), "total_tokens": len(content.split())},
+    }
+
+
+def create_stub_app(config: StubConfig) -> FastAPI:
+    app = FastAPI(title="Fork Tales stub provider")
+    latency = LatencyModel(config)
+    stats = {"requests": 0, "errors": 0, "hangs": 0, "streams": 0}
+
+    @app.get("/stats")
+    async def stub_stats() -> dict[str, int]:
+        return stats
+
+    @app.post("/{prefix:path}")
+    async def chat_completions(prefix: str, request: Request):
+        if not prefix.endswith("chat/completions"):
+            return JSONResponse({"error": {"message": f"unknown route /{prefix}"}}, status_code=404)
+        stats["requests"] += 1
+        body = await request.json()
+        model = str(body.get("model", "stub"))
+
+        roll = latency.rng.random()
+        if roll < config.hang_rate:
+            stats["hangs"] += 1
+            await asyncio.sleep(3600)
+        await asyncio.sleep(latency.sample_seconds())
+        if roll < config.hang_rate + config.error_rate:
+            stats["errors"] += 1
+            return JSONResponse({"error": {"message": "injected failure"}}, status_code=config.error_status)
+
+        if body.get("stream"):
+            stats["streams"] += 1
+            return StreamingResponse(stream_chunks(model, config.stream_chunk_ms / 1000), media_type="text/event-stream")
+        return JSONResponse(completion_payload(model, STUB_ANSWER))
+
+    return app
+
+
+async def stream_chunks(model: str, interval: float) -> AsyncIterator[bytes]:
+    completion_id = f"chatcmpl-stub-{uuid.uuid4().hex[:12]}"
+    for word in STUB_ANSWER.split(" "):
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}],
+        }
+        yield f"data: {json.dumps(chunk)}\n\n".encode()
+        await asyncio.sleep(interval)
+    yield b"data: [DONE]\n\n"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub chat-completions server for load tests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8795)
+    parser.add_argument("--latency-ms", type=float, default=StubConfig.latency_ms, help="mean response latency")
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "exponential", "lognormal"], default=StubConfig.latency_dist)
+    parser.add_argument("--latency-sigma", type=float, default=StubConfig.latency_sigma, help="lognormal shape")
+    parser.add_argument("--stream-chunk-ms", type=float, default=StubConfig.stream_chunk_ms)
+    parser.add_argument("--error-rate", type=float, default=StubConfig.error_rate)
+    parser.add_argument("--error-status", type=int, default=StubConfig.error_status)
+    parser.add_argument("--hang-rate", type=float, default=StubConfig.hang_rate, help="fraction of requests that never answer")
+    parser.add_argument("--seed", type=int)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    config = StubConfig(
+        latency_ms=args.latency_ms,
+        latency_dist=args.latency_dist,
+        latency_sigma=args.latency_sigma,
+        stream_chunk_ms=args.stream_chunk_ms,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        hang_rate=args.hang_rate,
+        seed=args.seed,
+    )
+    uvicorn.run(create_stub_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
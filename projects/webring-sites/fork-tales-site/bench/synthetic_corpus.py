@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+
+SYLLABLES = [
+    "ka", "ri", "tsu", "no", "mi", "sha", "el", "or", "an", "th", "ve", "ra", "lo", "qu", "ix", "um",
+    "gate", "wit", "ness", "lan", "tern", "cho", "ir", "fork", "tax", "null", "duct", "sei", "ax", "iom",
+]
+CJK_RANGES = [(0x4E00, 0x9FAF), (0x3041, 0x309F), (0x30A1, 0x30FF)]
+CHUNK_CHARS = 900
+TITLE_WORDS = (2, 6)
+CHUNKS_PER_REF = 6
+
+
+def latin_words(count: int, rng: np.random.Generator) -> list[str]:
+    """`count` distinct syllable words, shortest first, so frequent ranks get the short words as in real text."""
+    words: list[str] = []
+    seen: set[str] = set()
+    length = 0
+    while len(words) < count:
+        length += 1
+        combinations = len(SYLLABLES) ** length
+        if combinations <= 1_000_000:
+            codes = rng.permutation(combinations)
+        else:
+            codes = rng.integers(combinations, size=2 * (count - len(words)))
+        for code in codes.tolist():
+            parts = []
+            for _ in range(length):
+                code, syllable = divmod(code, len(SYLLABLES))
+                parts.append(SYLLABLES[syllable])
+            word = "".join(parts)
+            if word not in seen:
+                seen.add(word)
+                words.append(word)
+                if len(words) == count:
+                    break
+    return words
+
+
+def cjk_words(count: int, rng: np.random.Generator, exclude: set[str]) -> list[str]:
+    words: list[str] = []
+    seen = set(exclude)
+    while len(words) < count:
+        start, end = CJK_RANGES[int(rng.integers(len(CJK_RANGES)))]
+        word = "".join(chr(code) for code in rng.integers(start, end, size=int(rng.integers(2, 5))).tolist())
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+def cjk_ranks(weights: np.ndarray, ratio: float, count: int) -> np.ndarray:
+    """Mask of `count` ranks whose share of `weights` stays at `ratio` from the top rank down."""
+    is_cjk = np.zeros(len(weights), dtype=bool)
+    target = np.cumsum(weights) * ratio
+    mass = 0.0
+    for rank, weight in enumerate(weights.tolist()):
+        if mass + weight <= target[rank]:
+            is_cjk[rank] = True
+            mass += weight
+    # The diffusion lands within a few ranks of `count`; settle the difference on the lightest ranks.
+    surplus = int(is_cjk.sum()) - count
+    if surplus > 0:
+        is_cjk[np.flatnonzero(is_cjk)[-surplus:]] = False
+    elif surplus < 0:
+        is_cjk[np.flatnonzero(~is_cjk)[surplus:]] = True
+    return is_cjk
+
+
+class SyntheticVocabulary:
+    """Zipf-distributed pseudo-words, `round(size * cjk_ratio)` of them CJK.
+
+    CJK ranks are placed by error diffusion over the Zipf weights, so CJK
+    words make up `cjk_ratio` of sampled tokens as well as of the vocabulary.
+    """
+
+    def __init__(self, size: int, cjk_ratio: float, seed: int) -> None:
+        self.rng = np.random.default_rng(seed)
+        weights = 1.0 / np.arange(1, size + 1) ** 1.07
+        weights /= weights.sum()
+        is_cjk = cjk_ranks(weights, cjk_ratio, round(size * cjk_ratio))
+        latin = latin_words(size - int(is_cjk.sum()), self.rng)
+        self.words = np.empty(size, dtype=object)
+        self.words[~is_cjk] = latin
+        self.words[is_cjk] = cjk_words(int(is_cjk.sum()), self.rng, set(latin))
+        self.cdf = np.cumsum(weights)
+
+    def sample(self, count: int) -> list[str]:
+        indexes = np.minimum(np.searchsorted(self.cdf, self.rng.random(count)), len(self.words) - 1)
+        return list(self.words[indexes])
+
+    def text(self, chars: int) -> str:
+        words = self.sample(chars // 4)
+        breaks = set(np.cumsum(self.rng.integers(6, 18, size=len(words))).tolist())
+        parts = [f"{word}." if position + 1 in breaks else word for position, word in enumerate(words)]
+        return " ".join(parts)[:chars]
+
+
+def generate_chunks(
+    count: int,
+    *,
+    vocabulary_size: int = 50_000,
+    cjk_ratio: float = 0.08,
+    seed: int = 7,
+    vocabulary: SyntheticVocabulary | None = None,
+) -> Iterator[dict[str, object]]:
+    vocabulary = vocabulary or SyntheticVocabulary(vocabulary_size, cjk_ratio, seed)
+    for index in range(count):
+        ref_number = index // CHUNKS_PER_REF
+        ref_type = "audio" if ref_number % 5 == 0 else "doc"
+        ref_id = f"{ref_type}-synthetic-{ref_number}"
+        title = " ".join(vocabulary.sample(int(vocabulary.rng.integers(*TITLE_WORDS)))).title()
+        yield {
+            "id": f"chunk-{ref_id}-{index % CHUNKS_PER_REF}",
+            "refId": ref_id,
+            "refType": ref_type,
+            "title": title,
+            "kind": "music" if ref_type == "audio" else "chapter",
+            "sourcePath": f"synthetic/{ref_id}.md",
+            "text": vocabulary.text(CHUNK_CHARS),
+        }
+
+
+def write_site(root: Path, chunks: list[dict[str, object]]) -> None:
+    """Write a minimal site root (shell + library.json + corpus.json) the API can serve."""
+    content = root / "content"
+    content.mkdir(parents=True, exist_ok=True)
+    (root / "index.html").write_text("<html><body><h1>fork//tales synthetic</h1></body></html>", encoding="utf-8")
+    refs: dict[str, dict[str, object]] = {}
+    for chunk in chunks:
+        refs.setdefault(str(chunk["refId"]), chunk)
+    docs = [
+        {"id": ref_id, "title": chunk["title"], "kind": chunk["kind"], "visible": True, "sourcePath": chunk["sourcePath"]}
+        for ref_id, chunk in refs.items()
+        if chunk["refType"] == "doc"
+    ]
+    audio = [
+        {"id": ref_id, "title": chunk["title"], "kind": chunk["kind"], "sourcePath": chunk["sourcePath"], "mediaUrl": None, "relatedDocIds": []}
+        for ref_id, chunk in refs.items()
+        if chunk["refType"] == "audio"
+    ]
+    library = {
+        "generatedAt": None,
+        "counts": {"docs": len(docs), "visibleDocs": len(docs), "audio": len(audio), "corpusChunks": len(chunks)},
+        "docs": docs,
+        "audio": audio,
+        "playlists": [],
+        "gallery": [],
+    }
+    (content / "library.json").write_text(json.dumps(library, ensure_ascii=False), encoding="utf-8")
+    (content / "corpus.json").write_text(json.dumps(chunks, ensure_ascii=False), encoding="utf-8")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Generate a synthetic Fork Tales corpus for benchmarks and load tests.")
+    parser.add_argument("--chunks", type=int, default=10_000)
+    parser.add_argument("--vocabulary", type=int, default=50_000)
+    parser.add_argument("--cjk-ratio", type=float, default=0.08)
+    parser.add_argument("--seed", type=int, default=7)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--out", type=Path, help="write a bare corpus.json here")
+    target.add_argument("--site-root", type=Path, help="write a servable site root here")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    chunks = list(generate_chunks(args.chunks, vocabulary_size=args.vocabulary, cjk_ratio=args.cjk_ratio, seed=args.seed))
+    if args.site_root:
+        write_site(args.site_root, chunks)
+    else:
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        args.out.write_text(json.dumps(chunks, ensure_ascii=False), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
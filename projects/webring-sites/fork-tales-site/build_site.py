@@ -1,25 +1,49 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+import errno
+import fcntl
+import fnmatch
+import functools
 import hashlib
+import itertools
 import json
+import math
+import multiprocessing
 import os
 import re
 import shutil
+import subprocess
+import threading
+import time
 import unicodedata
-from collections import defaultdict
+import zlib
+from collections import Counter, defaultdict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Iterable
+from typing import Callable, Iterable, Iterator, TypeVar
 
 import markdown
 
+import numpy as np
+
+from fork_tales_api.dense import HASH_MASK, HASH_PRIME, DenseVectors, l2_normalize, term_frequencies
+from fork_tales_api.text import TOKEN_PATTERN_JS, tokenize
+
 PROJECT_ROOT = Path(__file__).resolve().parent
 SRC_ROOT = PROJECT_ROOT / "src"
 DIST_ROOT = PROJECT_ROOT / "dist"
 CONTENT_ROOT = DIST_ROOT / "content"
 MEDIA_ROOT = DIST_ROOT / "media"
+STREAM_ROOT = MEDIA_ROOT / "streams"
+CACHE_ROOT = Path(os.getenv("FORK_TALES_BUILD_CACHE", PROJECT_ROOT / ".build-cache"))
+STREAM_CACHE_ROOT = CACHE_ROOT / "streams"
+BUILD_MANIFEST_PATH = CACHE_ROOT / "build-manifest.json"
+BLOB_ROOT = CACHE_ROOT / "blobs"
+HASH_CACHE_PATH = CACHE_ROOT / "file-hashes.json"
+RENDER_CACHE_ROOT = CACHE_ROOT / "renders"
 
 FORK_ROOT = Path(os.getenv("FORK_TALES_SOURCE_ROOT", "/home/err/devel/orgs/octave-commons/fork_tales"))
 MUSIC_ROOT = Path(os.getenv("FORK_TALES_MUSIC_ROOT", "/home/err/Music"))
@@ -101,8 +125,26 @@ PROMPTS = [
     "Show me the fracture line between receipt and myth.",
 ]
 
-CHUNK_SIZE = 900
-CHUNK_OVERLAP = 140
+RELATED_TOP_K = 8
+RELATED_BLOCK_ROWS = 512
+
+SEARCH_INDEX_VERSION = 1
+SEARCH_TITLE_WEIGHT = 3
+SEARCH_MAX_TERM_LENGTH = 32
+SEARCH_MAX_TF = 255
+SEARCH_NORM_SCALE = 16
+
+# Corpus chunk budget and overlap in whitespace-separated tokens, capped in characters for text without spaces (CJK).
+CHUNK_TOKENS = int(os.getenv("FORK_TALES_CHUNK_TOKENS", "160"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("FORK_TALES_CHUNK_OVERLAP_TOKENS", "24"))
+CHUNK_MAX_CHARS = int(os.getenv("FORK_TALES_CHUNK_CHARS", "900"))
+CHUNK_OVERLAP_CHARS = 140
+# Chunks whose word 3-gram sets overlap at least this much (Jaccard) collapse into the earlier one.
+CORPUS_DUPLICATE_JACCARD = 0.8
+SHINGLE_WORDS = 3
+MINHASH_PERMUTATIONS = 64
+MINHASH_BANDS = 16
+MINHASH_SEED = 1729
 AUDIO_EXT_PRIORITY = {".mp3": 3, ".wav": 2, ".mp4": 1}
 IMAGE_EXTS = {".png", ".jpg", ".jpeg", ".webp", ".gif"}
 TEXT_EXTS = {".md", ".txt"}
@@ -110,6 +152,277 @@ AUDIO_EXTS = {".mp3", ".wav", ".mp4"}
 
 MARKDOWN_EXTENSIONS = ["extra", "sane_lists", "nl2br", "fenced_code"]
 
+FFMPEG = os.getenv("FORK_TALES_FFMPEG", "ffmpeg")
+TRANSCODE_WORKERS = int(os.getenv("FORK_TALES_TRANSCODE_WORKERS", "0")) or os.cpu_count() or 1
+BUILD_WORKERS = int(os.getenv("FORK_TALES_BUILD_WORKERS", "0")) or os.cpu_count() or 1
+IO_WORKERS = int(os.getenv("FORK_TALES_IO_WORKERS", "0")) or min(32, (os.cpu_count() or 1) + 4)
+# Indent library.json and corpus.json for reading diffs; the API and browser load the compact form just as well.
+BUILD_PRETTY = os.getenv("FORK_TALES_BUILD_PRETTY") == "1"
+JSON_INDENT = 2
+# Containers this close to the top of a written document are encoded member by member (see iter_json).
+JSON_STREAM_DEPTH = 2
+AUDIO_RENDITIONS_KBPS = (64, 128, 192)
+FALLBACK_KBPS = 96
+HLS_SEGMENT_SECONDS = 4
+STREAM_LAYOUT_VERSION = 1
+BUILD_MANIFEST_VERSION = 2
+HASH_CACHE_TTL_SECONDS = 30 * 24 * 3600
+RENDER_CACHE_TTL_SECONDS = 30 * 24 * 3600
+# Files modified this recently may change again within one mtime tick, so their hashes are not persisted.
+HASH_CACHE_RACY_NS = 2_000_000_000
+# linux/fs.h: share the source's extents with the destination (Btrfs, XFS, bcachefs).
+FICLONE = 0x40049409
+# os.link failures that mean "not linkable from here" (another filesystem, no hardlink support, link limit).
+UNLINKABLE_ERRNOS = frozenset({errno.EXDEV, errno.EPERM, errno.EMLINK})
+
+T = TypeVar("T")
+
+
+@functools.cache
+def render_key() -> str:
+    """Changes whenever cached doc entries and lyric HTML from an earlier build can no longer be reused.
+
+    Entries are built by this script (titles, ids, excerpts, kinds), so its
+    own source is part of the key and any edit to it invalidates them.
+    """
+    script = hashlib.sha256(Path(__file__).read_bytes()).hexdigest()
+    settings = (BUILD_MANIFEST_VERSION, MARKDOWN_EXTENSIONS, markdown.__version__, script)
+    return hashlib.sha1(repr(settings).encode("utf-8")).hexdigest()[:10]
+
+
+class HashCache:
+    """sha256 of files keyed on (device, inode, size, mtime_ns), persisted across builds.
+
+    A write changes a file's mtime_ns, or its inode for tools that replace
+    files, so a hit never reads the file. Concurrent builds merge their
+    entries under an exclusive lock when saving; entries no build has used
+    for `HASH_CACHE_TTL_SECONDS` are dropped then.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.hashed = 0
+        self._entries = self._read()
+        self._used: dict[str, list[object]] = {}
+        self._lock = threading.Lock()
+
+    def _read(self) -> dict[str, list[object]]:
+        try:
+            entries = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def sha256(self, path: Path, stat: os.stat_result | None = None) -> str:
+        stat = stat or path.stat()
+        key = f"{stat.st_dev}:{stat.st_ino}:{stat.st_size}:{stat.st_mtime_ns}"
+        entry = self._used.get(key) or self._entries.get(key)
+        if entry is not None:
+            digest = str(entry[0])
+        else:
+            digest = file_sha256(path)
+            with self._lock:
+                self.hashed += 1
+        if time.time_ns() - stat.st_mtime_ns >= HASH_CACHE_RACY_NS:
+            self._used[key] = [digest, int(time.time())]
+        return digest
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.with_name(f"{self.path.name}.lock").open("a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            cutoff = time.time() - HASH_CACHE_TTL_SECONDS
+            entries = {key: entry for key, entry in self._read().items() if entry[1] >= cutoff}
+            entries.update(self._used)
+            scratch = self.path.with_name(f"{self.path.name}.tmp-{os.getpid()}")
+            scratch.write_text(json.dumps(entries, separators=(",", ":")), encoding="utf-8")
+            scratch.replace(self.path)
+
+
+class BuildManifest:
+    """Source fingerprints and media outputs of the previous build, and the ones this build records.
+
+    Fingerprints come from the `HashCache`, so an unchanged source is never
+    read. Values derived from a source (doc entries,
+    lyric HTML) are reused while its hash is unchanged, and a `dist/media`
+    output is rewritten only when the content it was built from changes.
+    Outputs the previous build recorded and this one did not are orphans.
+    """
+
+    def __init__(self, hashes: HashCache, tree: SourceTree, previous: dict[str, object] | None = None) -> None:
+        previous = previous or {}
+        self.hashes = hashes
+        self.tree = tree
+        self.has_previous = bool(previous)
+        self._previous_outputs: dict[str, str] = previous.get("outputs", {})
+        self._previous_derived: dict[str, dict[str, object]] = (
+            previous.get("derived", {}) if previous.get("renderKey") == render_key() else {}
+        )
+        self.sources: dict[str, dict[str, object]] = {}
+        self.outputs: dict[str, str] = {}
+        self.derived: dict[str, dict[str, object]] = {}
+
+    @classmethod
+    def load(cls, path: Path, hashes: HashCache, tree: SourceTree) -> BuildManifest:
+        try:
+            previous = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return cls(hashes, tree)
+        if not isinstance(previous, dict) or previous.get("version") != BUILD_MANIFEST_VERSION:
+            return cls(hashes, tree)
+        return cls(hashes, tree, previous)
+
+    def save(self, path: Path) -> None:
+        payload = {
+            "version": BUILD_MANIFEST_VERSION,
+            "renderKey": render_key(),
+            "sources": self.sources,
+            "outputs": self.outputs,
+            "derived": self.derived,
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_json(path, payload)
+
+    def fingerprint(self, source: Path) -> str:
+        # Safe to call from worker threads; a source fingerprinted by two at once is just hashed twice.
+        key = source.as_posix()
+        known = self.sources.get(key)
+        if known is not None:
+            return str(known["sha256"])
+        stat = self.tree.stat(source)
+        digest = self.hashes.sha256(source, stat)
+        self.sources[key] = {"size": stat.st_size, "mtimeNs": stat.st_mtime_ns, "inode": stat.st_ino, "sha256": digest}
+        return digest
+
+    def derive(self, source: Path, build_value: Callable[[], T]) -> T:
+        """`build_value()`, or its JSON result from the previous build when `source` has the same content."""
+        key = source.as_posix()
+        digest = self.fingerprint(source)
+        previous = self._previous_derived.get(key)
+        if previous is not None and previous["sha256"] == digest:
+            value = previous["value"]
+        else:
+            value = build_value()
+        self.derived[key] = {"sha256": digest, "value": value}
+        return value
+
+    def output_current(self, relative_url: str, content_key: str) -> bool:
+        return self._previous_outputs.get(relative_url) == content_key and (DIST_ROOT / relative_url).exists()
+
+    def record_output(self, relative_url: str, content_key: str) -> None:
+        self.outputs[relative_url] = content_key
+
+    def remove_orphans(self) -> int:
+        removed = 0
+        for relative_url in sorted(self._previous_outputs.keys() - self.outputs.keys()):
+            path = DIST_ROOT / relative_url
+            if path.is_dir():
+                shutil.rmtree(path)
+            elif path.exists():
+                path.unlink()
+            else:
+                continue
+            removed += 1
+            parent = path.parent
+            while parent != MEDIA_ROOT and parent.is_relative_to(MEDIA_ROOT) and not any(parent.iterdir()):
+                parent.rmdir()
+                parent = parent.parent
+        return removed
+
+
+def clone_file(source: Path, target: Path) -> None:
+    """Reflink `source` to `target` where the filesystem supports it, otherwise copy the bytes."""
+    try:
+        with source.open("rb") as src, target.open("wb") as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    except OSError:
+        shutil.copy2(source, target)
+    else:
+        shutil.copystat(source, target)
+
+
+def link_or_clone(source: Path, target: Path) -> None:
+    """Hardlink `target` to `source`, falling back to a reflink or copy where it cannot be linked."""
+    try:
+        os.link(source, target)
+    except OSError as error:
+        if error.errno not in UNLINKABLE_ERRNOS:
+            raise
+        clone_file(source, target)
+
+
+class BlobStore:
+    """Media content addressed by sha256 under `root/<2 hex>/<sha256>`, hardlinked into `dist/media`.
+
+    A blob is a hardlink to the first source seen with its content, and every
+    output with that content is a hardlink to the blob, so a source file and
+    all its outputs share one inode. Where a link is impossible (another
+    filesystem, no hardlink support) the file is reflinked or copied instead.
+    Since a blob may share the source's inode, an in-place edit of the source
+    changes the blob and every output linked to it, including outputs of
+    other sources with the old content. Blobs and existing outputs are
+    therefore checked against their digest (through the `HashCache`, free
+    while their stat is unchanged) before they are reused. Outputs are never
+    written in place, since that would change every path sharing the blob,
+    the source included.
+    """
+
+    def __init__(self, root: Path, hashes: HashCache) -> None:
+        self.root = root
+        self.hashes = hashes
+        self.linked = 0
+        self._lock = threading.Lock()
+
+    def path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def publish(self, source: Path, digest: str, dest: Path) -> None:
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        blob = self.path(digest)
+        if self.holds(blob, digest):
+            with self._lock:
+                self.linked += 1
+        else:
+            self._store(source, blob)
+        if dest.exists() and os.path.samefile(blob, dest):
+            # Renaming onto another link of the same inode is a no-op that would leave the scratch file behind.
+            return
+        scratch = dest.with_name(f".{dest.name}.tmp-{os.getpid()}")
+        scratch.unlink(missing_ok=True)
+        link_or_clone(blob, scratch)
+        scratch.replace(dest)
+
+    def holds(self, path: Path, digest: str) -> bool:
+        try:
+            return self.hashes.sha256(path) == digest
+        except FileNotFoundError:
+            return False
+
+    def _store(self, source: Path, blob: Path) -> None:
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        scratch = blob.with_name(f"{blob.name}.tmp-{os.getpid()}")
+        scratch.unlink(missing_ok=True)
+        link_or_clone(source, scratch)
+        # Replacing rather than linking in place also repairs a blob whose source was edited in place.
+        scratch.replace(blob)
+
+    def prune(self, digests: Iterable[str]) -> int:
+        """Drop blobs whose digest is not in `digests` (the build's recorded outputs); returns the number removed.
+
+        Neither link counts nor inodes can tell, since a blob is usually linked
+        from its source too and outputs that fell back to copies share no inode.
+        """
+        removed = 0
+        if not self.root.exists():
+            return removed
+        keep = set(digests)
+        for shard in self.root.iterdir():
+            for blob in shard.iterdir():
+                if blob.name not in keep:
+                    blob.unlink(missing_ok=True)
+                    removed += 1
+        return removed
+
 
 @dataclass
 class CopiedAsset:
@@ -119,34 +432,73 @@ class CopiedAsset:
 
 
 class AssetCopier:
-    def __init__(self, media_root: Path) -> None:
+    """Assign `dist/media` paths to source files; the files are written later by `publish`.
+
+    Deferring the writes lets later stages drop assets they replace (HLS
+    streams), lets unchanged outputs from the previous build stay in place,
+    and moves hashing and file I/O onto worker threads. Sources are hashed
+    through the manifest fingerprint, so each at most once per build.
+    """
+
+    def __init__(self, media_root: Path, manifest: BuildManifest, store: BlobStore) -> None:
         self.media_root = media_root
+        self.manifest = manifest
+        self.store = store
         self._by_source: dict[Path, CopiedAsset] = {}
-        self._used_paths: set[Path] = set()
+        self._by_url: dict[str, CopiedAsset] = {}
+        self._discarded: set[str] = set()
 
     def copy(self, source: Path, bucket: str, preferred_slug: str | None = None) -> str:
-        source = source.resolve()
+        source = self.manifest.tree.resolve(source)
         if source in self._by_source:
             return self._by_source[source].relative_url
 
         ext = source.suffix.lower()
         base_slug = preferred_slug or slugify(source.stem)
         subdir = self.media_root / bucket
-        subdir.mkdir(parents=True, exist_ok=True)
         dest = subdir / f"{base_slug}{ext}"
         counter = 2
-        while dest in self._used_paths or dest.exists():
-            if dest.exists() and file_sha256(dest) == file_sha256(source):
-                break
+        # Sources with identical content share one destination; only a name collision needs the hashes here.
+        while (claimed := self._by_url.get(dest.relative_to(DIST_ROOT).as_posix())) is not None and (
+            self.manifest.fingerprint(claimed.source) != self.manifest.fingerprint(source)
+        ):
             dest = subdir / f"{base_slug}-{counter}{ext}"
             counter += 1
-        if not dest.exists():
-            shutil.copy2(source, dest)
-        self._used_paths.add(dest)
-        relative_url = dest.relative_to(DIST_ROOT).as_posix()
-        copied = CopiedAsset(source=source, relative_url=relative_url, dest=dest)
-        self._by_source[source] = copied
-        return relative_url
+        if claimed is None:
+            claimed = CopiedAsset(source=source, relative_url=dest.relative_to(DIST_ROOT).as_posix(), dest=dest)
+            self._by_url[claimed.relative_url] = claimed
+        self._by_source[source] = claimed
+        return claimed.relative_url
+
+    def asset(self, relative_url: str) -> CopiedAsset:
+        return self._by_url[relative_url]
+
+    def discard(self, relative_url: str) -> None:
+        self._discarded.add(relative_url)
+
+    def publish(self, executor: Executor | None = None) -> int:
+        """Write every kept asset whose output is missing or stale; returns the number of outputs written.
+
+        Assets with the same content are written by one task, so the first
+        one stores the blob and the rest link to it.
+        """
+        run = executor.map if executor is not None else map
+        kept = [asset for relative_url, asset in self._by_url.items() if relative_url not in self._discarded]
+        by_digest: dict[str, list[CopiedAsset]] = defaultdict(list)
+        for asset, digest in zip(kept, run(lambda asset: self.manifest.fingerprint(asset.source), kept), strict=True):
+            by_digest[digest].append(asset)
+        return sum(run(self._publish_same_content, by_digest.items()))
+
+    def _publish_same_content(self, group: tuple[str, list[CopiedAsset]]) -> int:
+        digest, assets = group
+        written = 0
+        for asset in assets:
+            # An output linked to another source's inode changes when that source is edited in place.
+            if not (self.manifest.output_current(asset.relative_url, digest) and self.store.holds(asset.dest, digest)):
+                self.store.publish(asset.source, digest, asset.dest)
+                written += 1
+            self.manifest.record_output(asset.relative_url, digest)
+        return written
 
 
 def file_sha256(path: Path) -> str:
@@ -182,6 +534,127 @@ def collapse_whitespace(text: str) -> str:
     return re.sub(r"\s+", " ", text).strip()
 
 
+@dataclass(frozen=True)
+class SourceFile:
+    path: Path
+    entry: os.DirEntry[str]
+
+    @property
+    def suffix(self) -> str:
+        return self.path.suffix.lower()
+
+    @property
+    def stat(self) -> os.stat_result:
+        # DirEntry caches its stat, so each file costs at most one syscall however many stages ask.
+        return self.entry.stat()
+
+
+@dataclass
+class DirectoryListing:
+    files: list[SourceFile]
+    subdirs: list[Path]
+    by_suffix: dict[str, list[SourceFile]]
+
+
+class SourceTree:
+    """Source files read with one `os.scandir` per directory, shared by every build stage.
+
+    A directory is listed on first use and kept, so stages that look at the
+    same tree never list it twice. Each file is stat'ed at most once, on
+    demand, and that result serves primary-audio selection, fingerprints and
+    path resolution. Recursive listings keep `Path.rglob` order (a
+    directory's files, then its subdirectories depth-first) and, like it, do
+    not follow symlinked directories.
+    """
+
+    def __init__(self) -> None:
+        self._listings: dict[Path, DirectoryListing] = {}
+        self._files: dict[Path, SourceFile] = {}
+        self._variants: dict[Path, dict[str, list[SourceFile]]] = {}
+        self._resolved_dirs: dict[Path, Path] = {}
+
+    @property
+    def directories_read(self) -> int:
+        return len(self._listings)
+
+    def _listing(self, directory: Path) -> DirectoryListing:
+        listing = self._listings.get(directory)
+        if listing is not None:
+            return listing
+        files: list[SourceFile] = []
+        subdirs: list[Path] = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(directory / entry.name)
+                        elif entry.is_file():
+                            files.append(SourceFile(directory / entry.name, entry))
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        by_suffix: dict[str, list[SourceFile]] = defaultdict(list)
+        for file in files:
+            by_suffix[file.suffix].append(file)
+            self._files[file.path] = file
+        listing = DirectoryListing(files=files, subdirs=subdirs, by_suffix=dict(by_suffix))
+        self._listings[directory] = listing
+        return listing
+
+    def files(self, directory: Path, *, recursive: bool = False, suffixes: Iterable[str] | None = None) -> list[SourceFile]:
+        """Files in `directory`, optionally only those with one of `suffixes` (compared lowercased)."""
+        listing = self._listing(directory)
+        if suffixes is None:
+            found = list(listing.files)
+        else:
+            wanted = {suffix.lower() for suffix in suffixes}
+            if len(wanted) == 1:
+                found = list(listing.by_suffix.get(next(iter(wanted)), []))
+            else:
+                found = [file for file in listing.files if file.suffix in wanted]
+        if recursive:
+            for subdir in listing.subdirs:
+                found.extend(self.files(subdir, recursive=True, suffixes=suffixes))
+        return found
+
+    def glob(self, directory: Path, pattern: str) -> list[Path]:
+        """Sorted files in `directory` whose name matches `pattern`, case-sensitively like `Path.glob`."""
+        return sorted(file.path for file in self._listing(directory).files if fnmatch.fnmatchcase(file.path.name, pattern))
+
+    def variants(self, root: Path) -> dict[str, list[SourceFile]]:
+        """Files under `root` grouped by variant stem, so `Song.mp3` and `Song(1).wav` land together."""
+        groups = self._variants.get(root)
+        if groups is None:
+            grouped: dict[str, list[SourceFile]] = defaultdict(list)
+            for file in self.files(root, recursive=True):
+                grouped[normalize_variant_stem(file.path.stem)].append(file)
+            groups = self._variants[root] = dict(grouped)
+        return groups
+
+    def get(self, path: Path) -> SourceFile | None:
+        self._listing(path.parent)
+        return self._files.get(path)
+
+    def stat(self, path: Path) -> os.stat_result:
+        # Only reads the index, so worker threads may call it while the main thread lists directories.
+        known = self._files.get(path)
+        return known.stat if known is not None else path.stat()
+
+    def resolve(self, path: Path) -> Path:
+        """`path.resolve()`, resolving each listed directory once instead of once per file."""
+        known = self._files.get(path)
+        if known is None or known.entry.is_symlink():
+            return path.resolve()
+        parent = self._resolved_dirs.get(path.parent)
+        if parent is None:
+            parent = self._resolved_dirs[path.parent] = path.parent.resolve()
+        resolved = parent / path.name
+        self._files.setdefault(resolved, known)
+        return resolved
+
+
 def first_heading(text: str) -> str | None:
     for line in text.splitlines():
         match = re.match(r"^#{1,3}\s+(.+?)\s*$", line.strip())
@@ -190,8 +663,116 @@ def first_heading(text: str) -> str | None:
     return None
 
 
+@functools.cache
+def markdown_converter() -> markdown.Markdown:
+    # One per process: building the extension pipeline costs more than converting a short lyric sheet.
+    return markdown.Markdown(extensions=MARKDOWN_EXTENSIONS)
+
+
 def markdown_to_html(text: str) -> str:
-    return markdown.markdown(text, extensions=MARKDOWN_EXTENSIONS)
+    return markdown_converter().reset().convert(text)
+
+
+def pool_chunksize(count: int, workers: int) -> int:
+    # A few batches per worker: large enough to amortize pickling, small enough to balance uneven texts.
+    return max(1, count // (workers * 4))
+
+
+def pool_map(function: Callable[[str], T], texts: list[str], executor: Executor | None = None, workers: int = 1) -> Iterator[T]:
+    if executor is not None and texts:
+        return executor.map(function, texts, chunksize=pool_chunksize(len(texts), workers))
+    return map(function, texts)
+
+
+class RenderCache:
+    """Markdown HTML under `root/<2 hex>/<key>.html`, keyed on the text, the extensions and the markdown version.
+
+    The manifest reuses HTML per source file; this reuses it per text, so an
+    edited chapter leaves the rest of the manuscript cached and a moved doc
+    is not rendered again. Entries are written whole and renamed into place,
+    so concurrent builds can share the cache. A hit refreshes the entry's
+    mtime, and `prune` drops entries unused for `RENDER_CACHE_TTL_SECONDS`.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.hits = 0
+        self._settings = repr((MARKDOWN_EXTENSIONS, markdown.__version__)).encode("utf-8")
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(self._settings + b"\0" + text.encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.html"
+
+    def get(self, key: str) -> str | None:
+        path = self.path(key)
+        try:
+            html = path.read_text(encoding="utf-8")
+            os.utime(path)
+        except OSError:
+            return None
+        self.hits += 1
+        return html
+
+    def put(self, key: str, html: str) -> None:
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        scratch = path.with_name(f"{path.name}.tmp-{os.getpid()}")
+        scratch.write_text(html, encoding="utf-8")
+        scratch.replace(path)
+
+    def prune(self) -> int:
+        """Drop entries no build has used for `RENDER_CACHE_TTL_SECONDS`; returns the number removed."""
+        removed = 0
+        if not self.root.exists():
+            return removed
+        cutoff = time.time() - RENDER_CACHE_TTL_SECONDS
+        for shard in self.root.iterdir():
+            for entry in shard.iterdir():
+                if entry.stat().st_mtime < cutoff:
+                    entry.unlink(missing_ok=True)
+                    removed += 1
+        return removed
+
+
+class RenderQueue:
+    """Markdown collected while entries are built, rendered in one batch by `run`.
+
+    Each text names the `(dict, key)` slots that receive its HTML, so entries
+    keep the order they were built in however the batch is scheduled. Texts
+    found in the `RenderCache` are not rendered at all.
+    """
+
+    def __init__(self, cache: RenderCache) -> None:
+        self.cache = cache
+        self._jobs: list[tuple[str, tuple[tuple[dict[str, object], str], ...]]] = []
+        self.rendered = 0
+
+    def add(self, text: str, *targets: tuple[dict[str, object], str]) -> None:
+        self._jobs.append((text, targets))
+
+    def run(self, executor: Executor | None = None, workers: int = 1) -> None:
+        rendered: dict[str, str] = {}
+        misses: dict[str, str] = {}
+        for text, _ in self._jobs:
+            if text in rendered or text in misses:
+                continue
+            key = self.cache.key(text)
+            html = self.cache.get(key)
+            if html is None:
+                misses[text] = key
+            else:
+                rendered[text] = html
+        texts = list(misses)
+        for text, html in zip(texts, pool_map(markdown_to_html, texts, executor, workers), strict=True):
+            self.cache.put(misses[text], html)
+            rendered[text] = html
+        for text, targets in self._jobs:
+            for target, key in targets:
+                target[key] = rendered[text]
+        self.rendered += len(texts)
+        self._jobs.clear()
 
 
 def excerpt(text: str, limit: int = 220) -> str:
@@ -245,6 +826,7 @@ def doc_kind(path: Path, title: str) -> str:
 
 
 def build_doc_entry(
+    renders: RenderQueue,
     *,
     identifier: str,
     title: str,
@@ -255,8 +837,7 @@ def build_doc_entry(
     chapter_number: int | None = None,
     source_group: str | None = None,
 ) -> dict[str, object]:
-    html = markdown_to_html(text)
-    return {
+    entry: dict[str, object] = {
         "id": identifier,
         "slug": slugify(title),
         "title": title,
@@ -266,13 +847,15 @@ def build_doc_entry(
         "sourceGroup": source_group,
         "sourcePath": relative_label(source_path),
         "sourceFileName": source_path.name,
-        "html": html,
+        "html": None,
         "text": text,
         "excerpt": excerpt(text),
     }
+    renders.add(text, (entry, "html"))
+    return entry
 
 
-def parse_manuscript() -> list[dict[str, object]]:
+def parse_manuscript(renders: RenderQueue) -> list[dict[str, object]]:
     manuscript_path = FORK_ROOT / "MANUSCRIPT_FULL.md"
     text = manuscript_path.read_text(encoding="utf-8")
     matches = list(re.finditer(r"^##\s+Chapter\s+(\d+)\s+—\s+(.+?)\s*$", text, flags=re.MULTILINE))
@@ -286,6 +869,7 @@ def parse_manuscript() -> list[dict[str, object]]:
         title = f"Chapter {chapter_number:02d} — {chapter_title}"
         docs.append(
             build_doc_entry(
+                renders,
                 identifier=f"chapter-{chapter_number:02d}-{slugify(chapter_title)}",
                 title=title,
                 kind="chapter",
@@ -299,8 +883,27 @@ def parse_manuscript() -> list[dict[str, object]]:
     return docs
 
 
-def collect_docs() -> list[dict[str, object]]:
-    docs = parse_manuscript()
+def build_file_doc(path: Path, renders: RenderQueue) -> dict[str, object]:
+    try:
+        raw = path.read_text(encoding="utf-8")
+    except UnicodeDecodeError:
+        raw = path.read_text(encoding="utf-8", errors="ignore")
+    title = first_heading(raw) or path.stem.replace("_", " ")
+    return build_doc_entry(
+        renders,
+        identifier=f"doc-{slugify(path.stem)}-{hashlib.sha1(path.as_posix().encode()).hexdigest()[:6]}",
+        title=title,
+        kind=doc_kind(path, title),
+        text=raw,
+        source_path=path,
+        visible=path.suffix.lower() == ".md",
+        source_group="fork-tales",
+    )
+
+
+def collect_docs(manifest: BuildManifest, renders: RenderQueue, tree: SourceTree) -> list[dict[str, object]]:
+    """Doc entries in site order; entries rebuilt from changed sources get their HTML when `renders` runs."""
+    docs = list(manifest.derive(FORK_ROOT / "MANUSCRIPT_FULL.md", lambda: parse_manuscript(renders)))
 
     root_files = [
         FORK_ROOT / "LIVE_CHOIR.md",
@@ -308,31 +911,14 @@ def collect_docs() -> list[dict[str, object]]:
 
     doc_files: list[Path] = []
     for pattern in CURATED_DOC_PATTERNS:
-        doc_files.extend(sorted((FORK_ROOT / "docs").glob(pattern)))
+        doc_files.extend(tree.glob(FORK_ROOT / "docs", pattern))
     seen_paths: set[Path] = {FORK_ROOT / "MANUSCRIPT_FULL.md"}
 
     for path in root_files + doc_files:
-        if path in seen_paths or not path.exists() or not should_include_doc(path):
+        if path in seen_paths or tree.get(path) is None or not should_include_doc(path):
             continue
         seen_paths.add(path)
-        try:
-            raw = path.read_text(encoding="utf-8")
-        except UnicodeDecodeError:
-            raw = path.read_text(encoding="utf-8", errors="ignore")
-        title = first_heading(raw) or path.stem.replace("_", " ")
-        kind = doc_kind(path, title)
-        visible = path.suffix.lower() == ".md"
-        docs.append(
-            build_doc_entry(
-                identifier=f"doc-{slugify(path.stem)}-{hashlib.sha1(path.as_posix().encode()).hexdigest()[:6]}",
-                title=title,
-                kind=kind,
-                text=raw,
-                source_path=path,
-                visible=visible,
-                source_group="fork-tales",
-            )
-        )
+        docs.append(manifest.derive(path, lambda: build_file_doc(path, renders)))
 
     docs.sort(key=lambda item: (
         0 if item["kind"] == "chapter" else 1,
@@ -342,20 +928,11 @@ def collect_docs() -> list[dict[str, object]]:
     return docs
 
 
-def group_files_by_variant(root: Path) -> dict[str, list[Path]]:
-    groups: dict[str, list[Path]] = defaultdict(list)
-    for path in root.rglob("*"):
-        if not path.is_file():
-            continue
-        groups[normalize_variant_stem(path.stem)].append(path)
-    return groups
-
-
-def choose_primary_audio(paths: Iterable[Path]) -> Path | None:
-    candidates = [path for path in paths if path.suffix.lower() in AUDIO_EXTS]
+def choose_primary_audio(files: Iterable[SourceFile]) -> Path | None:
+    candidates = [file for file in files if file.suffix in AUDIO_EXTS]
     if not candidates:
         return None
-    return max(candidates, key=lambda path: (AUDIO_EXT_PRIORITY.get(path.suffix.lower(), 0), path.stat().st_size, path.name))
+    return max(candidates, key=lambda file: (AUDIO_EXT_PRIORITY.get(file.suffix, 0), file.stat.st_size, file.path.name)).path
 
 
 def parse_title_and_tags(sidecar_text: str, fallback_title: str) -> tuple[str, list[str]]:
@@ -380,17 +957,13 @@ def include_music_entry(root: Path, variant_key: str, parsed_title: str, sidecar
     return True
 
 
-def select_featured_images(copier: AssetCopier) -> list[dict[str, object]]:
+def select_featured_images(copier: AssetCopier, tree: SourceTree) -> list[dict[str, object]]:
     image_candidates: list[Path] = []
-    frag_root = FORK_ROOT / ".fork_Π_ημ_frags"
-    if frag_root.exists():
-        for path in frag_root.rglob("*"):
-            if path.is_file() and path.suffix.lower() in IMAGE_EXTS:
-                lower = path.name.lower()
-                if any(keyword in lower for keyword in FEATURED_IMAGE_KEYWORDS):
-                    image_candidates.append(path)
-    for path in sorted((FORK_ROOT / "artifacts").glob("*.png")):
-        image_candidates.append(path)
+    for file in tree.files(FORK_ROOT / ".fork_Π_ημ_frags", recursive=True, suffixes=IMAGE_EXTS):
+        lower = file.path.name.lower()
+        if any(keyword in lower for keyword in FEATURED_IMAGE_KEYWORDS):
+            image_candidates.append(file.path)
+    image_candidates.extend(tree.glob(FORK_ROOT / "artifacts", "*.png"))
 
     featured: list[dict[str, object]] = []
     seen: set[str] = set()
@@ -412,12 +985,17 @@ def select_featured_images(copier: AssetCopier) -> list[dict[str, object]]:
     return featured
 
 
-def build_music_entries(docs: list[dict[str, object]], copier: AssetCopier) -> list[dict[str, object]]:
+def build_music_entries(
+    docs: list[dict[str, object]],
+    copier: AssetCopier,
+    renders: RenderQueue,
+    tree: SourceTree,
+) -> list[dict[str, object]]:
     by_chapter = {doc.get("chapterNumber"): doc for doc in docs if doc.get("chapterNumber")}
     entries: list[dict[str, object]] = []
 
     # Narrative chapters from the repo.
-    for audio_path in sorted((FORK_ROOT / "narrative_audio").glob("*.mp3")):
+    for audio_path in tree.glob(FORK_ROOT / "narrative_audio", "*.mp3"):
         match = re.match(r"Chapter_(\d+)_(.+)", audio_path.stem)
         if match:
             chapter_number = int(match.group(1))
@@ -451,7 +1029,7 @@ def build_music_entries(docs: list[dict[str, object]], copier: AssetCopier) -> l
 
     # Part64 renders.
     part64_root = FORK_ROOT / "part64"
-    for audio_path in sorted(part64_root.glob("*.wav")):
+    for audio_path in tree.glob(part64_root, "*.wav"):
         title = audio_path.stem.replace("_", " ")
         entry_id = f"audio-{slugify(title)}-{hashlib.sha1(audio_path.as_posix().encode()).hexdigest()[:6]}"
         entries.append(
@@ -474,52 +1052,164 @@ def build_music_entries(docs: list[dict[str, object]], copier: AssetCopier) -> l
 
     # Curated music roots.
     for root in RELEVANT_MUSIC_DIRS:
-        if not root.exists():
-            continue
-        groups = group_files_by_variant(root)
+        groups = tree.variants(root)
         collection_title = root.name.replace("_", " ").title()
-        for variant_key, paths in sorted(groups.items(), key=lambda item: item[0].lower()):
-            primary = choose_primary_audio(paths)
+        for variant_key, files in sorted(groups.items(), key=lambda item: item[0].lower()):
+            primary = choose_primary_audio(files)
             if primary is None:
                 continue
             fallback_title = primary.stem.replace("_", " ")
-            sidecar_text_path = next((path for path in paths if path.suffix.lower() == ".txt"), None)
+            sidecar_text_path = next((file.path for file in files if file.suffix == ".txt"), None)
             sidecar_text = sidecar_text_path.read_text(encoding="utf-8", errors="ignore") if sidecar_text_path else ""
             parsed_title, tags = parse_title_and_tags(sidecar_text, fallback_title)
             if not include_music_entry(root, variant_key, parsed_title, sidecar_text):
                 continue
-            art_path = next((path for path in paths if path.suffix.lower() in IMAGE_EXTS), None)
+            art_path = next((file.path for file in files if file.suffix in IMAGE_EXTS), None)
             entry_id = f"audio-{slugify(parsed_title)}-{hashlib.sha1(primary.as_posix().encode()).hexdigest()[:6]}"
-            entries.append(
-                {
-                    "id": entry_id,
-                    "title": parsed_title,
-                    "collection": slugify(root.name),
-                    "collectionTitle": collection_title,
-                    "kind": "music",
-                    "mediaUrl": copier.copy(primary, f"audio/{slugify(root.name)}", preferred_slug=slugify(parsed_title)),
-                    "artUrl": copier.copy(art_path, f"images/{slugify(root.name)}", preferred_slug=slugify(parsed_title)) if art_path else None,
-                    "lyricsText": sidecar_text,
-                    "lyricsHtml": markdown_to_html(sidecar_text) if sidecar_text else "",
-                    "excerpt": excerpt(sidecar_text or f"{parsed_title} from {collection_title}"),
-                    "tags": tags,
-                    "sourcePath": relative_label(primary),
-                    "relatedDocIds": [],
-                }
-            )
+            entry: dict[str, object] = {
+                "id": entry_id,
+                "title": parsed_title,
+                "collection": slugify(root.name),
+                "collectionTitle": collection_title,
+                "kind": "music",
+                "mediaUrl": copier.copy(primary, f"audio/{slugify(root.name)}", preferred_slug=slugify(parsed_title)),
+                "artUrl": copier.copy(art_path, f"images/{slugify(root.name)}", preferred_slug=slugify(parsed_title)) if art_path else None,
+                "lyricsText": sidecar_text,
+                "lyricsHtml": "",
+                "excerpt": excerpt(sidecar_text or f"{parsed_title} from {collection_title}"),
+                "tags": tags,
+                "sourcePath": relative_label(primary),
+                "relatedDocIds": [],
+            }
+            if sidecar_text:
+                lyrics = copier.manifest.derive(sidecar_text_path, dict)
+                if "html" in lyrics:
+                    entry["lyricsHtml"] = lyrics["html"]
+                else:
+                    renders.add(sidecar_text, (lyrics, "html"), (entry, "lyricsHtml"))
+            entries.append(entry)
     return entries
 
 
-def build_playlists(audio_entries: list[dict[str, object]]) -> list[dict[str, object]]:
+def stream_settings_key() -> str:
+    settings = (STREAM_LAYOUT_VERSION, AUDIO_RENDITIONS_KBPS, FALLBACK_KBPS, HLS_SEGMENT_SECONDS)
+    return hashlib.sha1(repr(settings).encode("utf-8")).hexdigest()[:10]
+
+
+def hls_command(ffmpeg: str, source: Path, out_dir: Path) -> list[str]:
+    """One ffmpeg run: AAC HLS renditions under `<kbps>k/`, a master playlist, and a progressive fallback.
+
+    Short segments keep the first fetch small (about 32 KB at 64 kbps), so playback starts almost at once.
+    """
+    renditions = range(len(AUDIO_RENDITIONS_KBPS))
+    command = [ffmpeg, "-hide_banner", "-loglevel", "error", "-nostdin", "-y", "-threads", "1", "-i", str(source)]
+    for _ in renditions:
+        command += ["-map", "0:a:0"]
+    command += ["-c:a", "aac", "-ac", "2", "-ar", "44100"]
+    for index, kbps in zip(renditions, AUDIO_RENDITIONS_KBPS, strict=True):
+        command += [f"-b:a:{index}", f"{kbps}k"]
+    command += [
+        "-f", "hls",
+        "-hls_time", str(HLS_SEGMENT_SECONDS),
+        "-hls_playlist_type", "vod",
+        "-hls_flags", "independent_segments",
+        "-hls_segment_filename", str(out_dir / "%v" / "seg-%05d.ts"),
+        "-master_pl_name", "master.m3u8",
+        "-var_stream_map", " ".join(f"a:{index},name:{kbps}k" for index, kbps in zip(renditions, AUDIO_RENDITIONS_KBPS, strict=True)),
+        str(out_dir / "%v" / "index.m3u8"),
+    ]
+    command += ["-map", "0:a:0", "-c:a", "aac", "-ac", "2", "-b:a", f"{FALLBACK_KBPS}k", "-movflags", "+faststart", str(out_dir / "fallback.m4a")]
+    return command
+
+
+def transcode_stream(ffmpeg: str, source: Path, cache_dir: Path) -> str | None:
+    """Transcode into a scratch directory and rename it into the cache, so an interrupted run leaves no partial entry."""
+    scratch = cache_dir.with_name(f"{cache_dir.name}.tmp-{os.getpid()}")
+    shutil.rmtree(scratch, ignore_errors=True)
+    scratch.mkdir(parents=True)
+    try:
+        subprocess.run(hls_command(ffmpeg, source, scratch), check=True, capture_output=True, text=True)
+    except subprocess.CalledProcessError as exc:
+        shutil.rmtree(scratch, ignore_errors=True)
+        detail = exc.stderr.strip().splitlines()
+        return f"{source.name}: {detail[-1] if detail else exc}"
+    try:
+        scratch.rename(cache_dir)
+    except OSError:
+        # Another build finished the same transcode first.
+        shutil.rmtree(scratch, ignore_errors=True)
+    return None
+
+
+def publish_tree(source_dir: Path, dest_dir: Path) -> None:
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    for path in source_dir.rglob("*"):
+        target = dest_dir / path.relative_to(source_dir)
+        if path.is_dir():
+            target.mkdir(parents=True, exist_ok=True)
+            continue
+        target.unlink(missing_ok=True)
+        link_or_clone(path, target)
+
+
+def build_audio_streams(audio_entries: list[dict[str, object]], copier: AssetCopier) -> dict[str, int]:
+    """Replace progressive audio copies with segmented HLS renditions.
+
+    Transcodes are cached under `STREAM_CACHE_ROOT` by source hash and settings,
+    so unchanged tracks are never re-encoded. Without ffmpeg the build keeps the
+    original files. Browsers without native HLS play `mediaFallbackUrl`, a
+    faststart AAC file, since the site ships no JS HLS player. Streamed
+    tracks are discarded from the copier, so their originals are never
+    published to `dist/media`.
+    """
+    ffmpeg = shutil.which(FFMPEG)
+    if ffmpeg is None:
+        print(f"ffmpeg not found ({FFMPEG}); serving audio as progressive files")
+        return {"streams": 0, "transcoded": 0, "failed": 0}
+
+    settings_key = stream_settings_key()
+    by_media: dict[str, list[dict[str, object]]] = defaultdict(list)
+    for entry in audio_entries:
+        by_media[str(entry["mediaUrl"])].append(entry)
+    sources = [copier.asset(media_url).source for media_url in by_media]
+
+    STREAM_CACHE_ROOT.mkdir(parents=True, exist_ok=True)
+    # Each job is its own ffmpeg process, so threads only wait on children and the pool gives full process parallelism.
+    with ThreadPoolExecutor(max_workers=TRANSCODE_WORKERS) as pool:
+        digests = pool.map(copier.manifest.fingerprint, sources)
+        cache_dirs = {media_url: STREAM_CACHE_ROOT / f"{digest}-{settings_key}" for media_url, digest in zip(by_media, digests, strict=True)}
+        pending = [(source, cache_dir) for source, cache_dir in zip(sources, cache_dirs.values(), strict=True) if not cache_dir.exists()]
+        errors = [error for error in pool.map(lambda job: transcode_stream(ffmpeg, *job), pending) if error]
+    for error in errors:
+        print(f"transcode failed: {error}")
+
+    streams = 0
+    for media_url, entries in by_media.items():
+        cache_dir = cache_dirs[media_url]
+        if not (cache_dir / "master.m3u8").exists():
+            continue
+        stream_dir = STREAM_ROOT / (DIST_ROOT / media_url).relative_to(MEDIA_ROOT).with_suffix("")
+        stream_url = stream_dir.relative_to(DIST_ROOT).as_posix()
+        if not copier.manifest.output_current(stream_url, cache_dir.name):
+            shutil.rmtree(stream_dir, ignore_errors=True)
+            publish_tree(cache_dir, stream_dir)
+        copier.manifest.record_output(stream_url, cache_dir.name)
+        copier.discard(media_url)
+        for entry in entries:
+            entry["mediaUrl"] = (stream_dir / "master.m3u8").relative_to(DIST_ROOT).as_posix()
+            entry["mediaFallbackUrl"] = (stream_dir / "fallback.m4a").relative_to(DIST_ROOT).as_posix()
+        streams += 1
+    return {"streams": streams, "transcoded": len(pending) - len(errors), "failed": len(errors)}
+
+
+def build_playlists(audio_entries: list[dict[str, object]], tree: SourceTree) -> list[dict[str, object]]:
     audio_by_source = {entry["sourcePath"]: entry for entry in audio_entries}
     normalized_lookup: dict[str, list[str]] = defaultdict(list)
     for entry in audio_entries:
         normalized_lookup[normalize_variant_stem(Path(str(entry["sourcePath"])).stem)].append(str(entry["id"]))
 
     playlists: list[dict[str, object]] = []
-    if not PLAYLIST_DIR.exists():
-        return playlists
-    for path in sorted(PLAYLIST_DIR.glob("*.m3u")):
+    for path in tree.glob(PLAYLIST_DIR, "*.m3u"):
         item_ids: list[str] = []
         seen_ids: set[str] = set()
         for raw_line in path.read_text(encoding="utf-8", errors="ignore").splitlines():
@@ -549,9 +1239,11 @@ def build_playlists(audio_entries: list[dict[str, object]]) -> list[dict[str, ob
 
 
 def link_related_docs(audio_entries: list[dict[str, object]], docs: list[dict[str, object]]) -> None:
-    title_tokens: dict[str, set[str]] = {}
+    # Title token -> doc ids, so a track only counts overlaps with docs it shares a token with.
+    docs_by_token: dict[str, list[str]] = defaultdict(list)
     for doc in docs:
-        title_tokens[str(doc["id"])] = token_set(str(doc["title"]))
+        for token in token_set(str(doc["title"])):
+            docs_by_token[token].append(str(doc["id"]))
 
     for entry in audio_entries:
         if entry["relatedDocIds"]:
@@ -559,11 +1251,10 @@ def link_related_docs(audio_entries: list[dict[str, object]], docs: list[dict[st
         track_tokens = token_set(str(entry["title"]))
         if not track_tokens:
             continue
-        candidates: list[tuple[int, str]] = []
-        for doc in docs:
-            overlap = len(track_tokens & title_tokens[str(doc["id"])] )
-            if overlap >= 2:
-                candidates.append((overlap, str(doc["id"])))
+        overlaps: Counter[str] = Counter()
+        for token in track_tokens:
+            overlaps.update(docs_by_token.get(token, ()))
+        candidates = [(overlap, doc_id) for doc_id, overlap in overlaps.items() if overlap >= 2]
         candidates.sort(reverse=True)
         entry["relatedDocIds"] = [doc_id for _, doc_id in candidates[:3]]
 
@@ -572,55 +1263,457 @@ def token_set(text: str) -> set[str]:
     return {token for token in re.findall(r"[\w\-一-龯ぁ-ゟァ-ヿ]+", text.lower()) if len(token) > 2}
 
 
-def build_corpus(docs: list[dict[str, object]], audio_entries: list[dict[str, object]]) -> list[dict[str, object]]:
-    corpus: list[dict[str, object]] = []
-    for doc in docs:
-        source_text = str(doc["text"])
-        for index, chunk in enumerate(chunk_text(source_text)):
-            corpus.append(
-                {
-                    "id": f"chunk-{doc['id']}-{index}",
-                    "refId": doc["id"],
-                    "refType": "doc",
-                    "title": doc["title"],
-                    "kind": doc["kind"],
-                    "sourcePath": doc["sourcePath"],
-                    "text": chunk,
-                }
-            )
+def corpus_sources(docs: list[dict[str, object]], audio_entries: list[dict[str, object]]) -> list[tuple[str, dict[str, object], str]]:
+    """(refType, entry, text) for every entry the corpus is chunked from, in corpus order."""
+    sources: list[tuple[str, dict[str, object], str]] = [("doc", doc, str(doc["text"])) for doc in docs]
     for entry in audio_entries:
         base = [str(entry["title"]), str(entry["excerpt"])]
         if entry.get("lyricsText"):
             base.append(str(entry["lyricsText"]))
-        combined = "\n\n".join(part for part in base if part)
-        for index, chunk in enumerate(chunk_text(combined)):
-            corpus.append(
-                {
-                    "id": f"chunk-{entry['id']}-{index}",
-                    "refId": entry["id"],
-                    "refType": "audio",
-                    "title": entry["title"],
-                    "kind": entry["kind"],
-                    "sourcePath": entry["sourcePath"],
-                    "text": chunk,
-                }
-            )
-    return corpus
-
-
-def chunk_text(text: str) -> list[str]:
-    cleaned = collapse_whitespace(text)
-    if not cleaned:
-        return []
-    chunks: list[str] = []
-    start = 0
-    while start < len(cleaned):
-        end = min(len(cleaned), start + CHUNK_SIZE)
-        chunks.append(cleaned[start:end])
-        if end == len(cleaned):
+        sources.append(("audio", entry, "\n\n".join(part for part in base if part)))
+    return sources
+
+
+@dataclass
+class ChunkDuplicates:
+    """Corpus rows that nearly repeat an earlier row, and the refs each kept row collects from them."""
+
+    dropped: set[int]
+    # Kept row -> [refType, refId] of every entry whose chunk collapsed into it, its own first; only rows with several.
+    refs: dict[int, list[list[str]]]
+
+
+def find_duplicate_chunks(
+    docs: list[dict[str, object]],
+    audio_entries: list[dict[str, object]],
+    executor: Executor | None = None,
+    workers: int = 1,
+) -> ChunkDuplicates:
+    """Collapse each chunk into the first earlier kept chunk it nearly repeats.
+
+    Lyric variants across music roots and passages shared by the manuscript
+    and `docs/` otherwise index the same text several times. Only LSH band
+    keys are kept for every chunk; shingle sets are rebuilt for the few
+    sources with colliding chunks, to check the exact Jaccard similarity.
+    Rows are numbered in the order `build_corpus` yields chunks.
+    """
+    sources = corpus_sources(docs, audio_entries)
+    texts = [text for _, _, text in sources]
+    per_source = list(pool_map(chunk_band_keys, texts, executor, workers))
+    offsets = np.cumsum([0] + [len(keys) for keys in per_source])
+    duplicates = ChunkDuplicates(dropped=set(), refs={})
+    candidates = lsh_candidates(np.vstack(per_source)) if offsets[-1] else {}
+    if not candidates:
+        return duplicates
+
+    def source_of(row: int) -> int:
+        return int(np.searchsorted(offsets, row, side="right")) - 1
+
+    involved = set(candidates).union(*candidates.values())
+    colliding = sorted({source_of(row) for row in involved})
+    shingles: dict[int, np.ndarray] = {}
+    for source, shingled in zip(colliding, pool_map(chunk_shingle_sets, [texts[source] for source in colliding], executor, workers), strict=True):
+        for index, chunk_shingles in enumerate(shingled):
+            if int(offsets[source]) + index in involved:
+                shingles[int(offsets[source]) + index] = chunk_shingles
+
+    for row in sorted(candidates):
+        for earlier in candidates[row]:
+            if earlier in duplicates.dropped or jaccard(shingles[row], shingles[earlier]) < CORPUS_DUPLICATE_JACCARD:
+                continue
+            duplicates.dropped.add(row)
+            ref_type, entry, _ = sources[source_of(row)]
+            kept_type, kept_entry, _ = sources[source_of(earlier)]
+            refs = duplicates.refs.setdefault(earlier, [[kept_type, str(kept_entry["id"])]])
+            if [ref_type, str(entry["id"])] not in refs:
+                refs.append([ref_type, str(entry["id"])])
+            break
+    duplicates.refs = {kept: refs for kept, refs in duplicates.refs.items() if len(refs) > 1}
+    return duplicates
+
+
+def build_corpus(
+    docs: list[dict[str, object]],
+    audio_entries: list[dict[str, object]],
+    duplicates: ChunkDuplicates | None = None,
+    executor: Executor | None = None,
+    workers: int = 1,
+) -> Iterator[dict[str, object]]:
+    duplicates = duplicates or ChunkDuplicates(dropped=set(), refs={})
+    sources = corpus_sources(docs, audio_entries)
+    rows = itertools.count()
+    for (ref_type, entry, _), chunks in zip(sources, pool_map(chunk_text, [text for _, _, text in sources], executor, workers), strict=True):
+        for index, chunk in enumerate(chunks):
+            row = next(rows)
+            if row in duplicates.dropped:
+                continue
+            item: dict[str, object] = {
+                "id": f"chunk-{entry['id']}-{index}",
+                "refId": entry["id"],
+                "refType": ref_type,
+                "title": entry["title"],
+                "kind": entry["kind"],
+                "sourcePath": entry["sourcePath"],
+                "text": chunk.text,
+                "headings": list(chunk.headings),
+                "start": chunk.start,
+                "end": chunk.end,
+            }
+            if row in duplicates.refs:
+                item["refs"] = duplicates.refs[row]
+            yield item
+
+
+@dataclass(frozen=True)
+class Chunk:
+    """Whitespace-collapsed chunk text, the headings it sits under, and its `[start, end)` span in the source text."""
+
+    text: str
+    headings: tuple[str, ...]
+    start: int
+    end: int
+
+
+BLANK_LINES_RE = re.compile(r"\n(?:[ \t]*\n)+")
+HEADING_RE = re.compile(r"^[ \t]{0,3}(#{1,6})[ \t]+(.*?)(?:[ \t]+#+)?[ \t]*$", re.MULTILINE)
+FENCE_RE = re.compile(r"^[ \t]{0,3}(?:```|~~~)", re.MULTILINE)
+
+
+def trimmed_span(text: str, start: int, end: int) -> tuple[int, int] | None:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return (start, end) if start < end else None
+
+
+def markdown_blocks(text: str) -> Iterator[tuple[int, int, int, str]]:
+    """(start, end, heading level, heading title) of each block, with level 0 for paragraphs and stanzas.
+
+    Blocks are separated by blank lines. A heading line is a block of its own,
+    and a fenced code block stays one block across blank lines.
+    """
+    spans: list[tuple[int, int] | None] = []
+    position = 0
+    for match in BLANK_LINES_RE.finditer(text):
+        spans.append(trimmed_span(text, position, match.start()))
+        position = match.end()
+    spans.append(trimmed_span(text, position, len(text)))
+
+    fence_start: int | None = None
+    for span in spans:
+        if span is None:
+            continue
+        start, end = span
+        fences = len(FENCE_RE.findall(text, start, end))
+        if fence_start is not None or fences % 2:
+            if fence_start is None:
+                fence_start = start
+            elif fences % 2:
+                yield fence_start, end, 0, ""
+                fence_start = None
+            continue
+        if fences:
+            yield start, end, 0, ""
+            continue
+        cursor = start
+        for heading in HEADING_RE.finditer(text, start, end):
+            if (before := trimmed_span(text, cursor, heading.start())) is not None:
+                yield *before, 0, ""
+            yield heading.start(), heading.end(), len(heading.group(1)), collapse_whitespace(heading.group(2))
+            cursor = heading.end()
+        if (after := trimmed_span(text, cursor, end)) is not None:
+            yield *after, 0, ""
+    if fence_start is not None:
+        yield fence_start, spans[-1][1] if spans[-1] else len(text.rstrip()), 0, ""
+
+
+def split_words(text: str, start: int, end: int, size: int, max_chars: int) -> Iterator[tuple[int, int, int]]:
+    """Cut `text[start:end]` into pieces of at most `size` words and `max_chars` characters: (start, end, words).
+
+    A piece capped by characters ends at its last whitespace, or mid-run for
+    text written without spaces.
+    """
+    while True:
+        limit = min(end, start + max_chars)
+        window = text[start:limit]
+        words = window.split(None, size)
+        if len(words) > size:
+            cut = limit - len(words[-1])
+        elif limit == end or text[limit].isspace():
+            cut = limit
+        else:
+            cut = max(window.rfind(space) for space in " \t\n\u3000")
+            cut = start + cut if cut > 0 else limit
+        cut = start + len(text[start:cut].rstrip())
+        yield start, cut, len(text[start:cut].split())
+        rest = trimmed_span(text, cut, end)
+        if rest is None:
+            return
+        start = rest[0]
+
+
+WHITESPACE_RE = re.compile(r"\s")
+
+
+def overlap_tail(text: str, pieces: list[tuple[int, int, int]], overlap: int, floor: int) -> list[tuple[int, int, int]]:
+    """The trailing pieces holding the last `overlap` words that start at or after `floor`, the first trimmed to fit."""
+    tail: list[tuple[int, int, int]] = []
+    for start, end, words in reversed(pieces):
+        if overlap <= 0 or end <= floor:
             break
-        start = max(0, end - CHUNK_OVERLAP)
-    return chunks
+        if words > overlap:
+            start += len(text[start:end].rsplit(None, overlap)[0])
+        if start < floor:
+            start = floor
+            if not text[start - 1].isspace() and (space := WHITESPACE_RE.search(text, start, end)) is not None:
+                start = space.start()
+        span = trimmed_span(text, start, end)
+        if span is None:
+            break
+        start, end = span
+        words = len(text[start:end].split())
+        tail.append((start, end, words))
+        overlap -= words
+    return tail[::-1]
+
+
+def iter_chunks(
+    text: str,
+    budget: int = CHUNK_TOKENS,
+    overlap: int = CHUNK_OVERLAP_TOKENS,
+    max_chars: int = CHUNK_MAX_CHARS,
+    overlap_chars: int = CHUNK_OVERLAP_CHARS,
+) -> Iterator[Chunk]:
+    """Pack the text's markdown blocks into chunks of at most `budget` tokens and about `max_chars` characters.
+
+    A heading ends the chunk before it, so each chunk sits under one heading
+    path, and a section's first chunk starts with its heading. Within a section
+    each chunk repeats the last `overlap` tokens (at most `overlap_chars`
+    characters) of the one before. Blocks too long for one chunk are cut
+    between words, or by characters where the text has no spaces.
+    """
+    step = max(1, budget - overlap)
+    char_step = max(1, max_chars - overlap_chars)
+    path: list[tuple[int, str]] = []
+    pieces: list[tuple[int, int, int]] = []
+    carried = 0  # leading pieces repeated from the previous chunk
+    body = False  # pieces hold block text not yet in any chunk
+
+    def chunk() -> Chunk:
+        start, end = pieces[0][0], pieces[-1][1]
+        return Chunk(" ".join(text[start:end].split()), tuple(title for _, title in path), start, end)
+
+    for start, end, level, title in markdown_blocks(text):
+        if level:
+            if body:
+                yield chunk()
+                pieces = []
+            else:
+                del pieces[:carried]
+            carried, body = 0, False
+            path = [(depth, heading) for depth, heading in path if depth < level] + [(level, title)]
+            pieces.append((start, end, len(text[start:end].split())))
+            continue
+        for piece in split_words(text, start, end, step, char_step):
+            if body and (sum(words for _, _, words in pieces) + piece[2] > budget or piece[1] - pieces[0][0] > max_chars):
+                yield chunk()
+                # The carried tail is capped in characters too, and must leave room for the piece.
+                pieces = overlap_tail(text, pieces, overlap, max(pieces[-1][1] - overlap_chars, piece[1] - max_chars))
+                carried, body = len(pieces), False
+            pieces.append(piece)
+            body = True
+    if body or len(pieces) > carried:
+        yield chunk()
+
+
+def chunk_text(text: str) -> list[Chunk]:
+    """`iter_chunks` as a list, for the build pool."""
+    return list(iter_chunks(text))
+
+
+def shingle_hashes(text: str) -> np.ndarray:
+    """Sorted unique 32-bit hashes of the text's word 3-grams (its words, below three)."""
+    words = np.array([zlib.crc32(token.encode("utf-8")) for token in tokenize(text)], dtype=np.uint64)
+    count = len(words) - SHINGLE_WORDS + 1
+    if count <= 0:
+        return np.unique(words)
+    hashed = np.zeros(count, dtype=np.uint64)
+    for offset in range(SHINGLE_WORDS):
+        hashed = (hashed * HASH_PRIME + words[offset : offset + count]) & HASH_MASK
+    return np.unique(hashed)
+
+
+@functools.cache
+def minhash_permutations() -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(MINHASH_SEED)
+    multipliers = rng.integers(0, 2**64, MINHASH_PERMUTATIONS, dtype=np.uint64, endpoint=False) | np.uint64(1)
+    return multipliers, rng.integers(0, 2**64, MINHASH_PERMUTATIONS, dtype=np.uint64, endpoint=False)
+
+
+def minhash_band_keys(shingles: np.ndarray) -> np.ndarray:
+    """One 64-bit key per LSH band of the shingles' MinHash signature."""
+    if not len(shingles):
+        return np.zeros(MINHASH_BANDS, dtype=np.uint64)
+    # Multiply-add-shift hashing of 32-bit shingles; uint64 arithmetic wraps, which is the mod 2**64 it needs.
+    multipliers, increments = minhash_permutations()
+    signature = ((multipliers[:, None] * shingles[None, :] + increments[:, None]) >> np.uint64(32)).min(axis=1)
+    bands = signature.reshape(MINHASH_BANDS, -1)
+    keys = np.zeros(MINHASH_BANDS, dtype=np.uint64)
+    for column in bands.T:
+        keys = keys * np.uint64(HASH_PRIME) + column
+    return keys
+
+
+def chunk_band_keys(text: str) -> np.ndarray:
+    """LSH band keys of each of the text's chunks, one row per chunk; runs in the build pool."""
+    return np.array([minhash_band_keys(shingle_hashes(chunk.text)) for chunk in iter_chunks(text)], dtype=np.uint64).reshape(-1, MINHASH_BANDS)
+
+
+def chunk_shingle_sets(text: str) -> list[np.ndarray]:
+    return [shingle_hashes(chunk.text) for chunk in iter_chunks(text)]
+
+
+def lsh_candidates(keys: np.ndarray) -> dict[int, list[int]]:
+    """Earlier rows that share at least one band key with each row, for rows that have any."""
+    candidates: dict[int, set[int]] = defaultdict(set)
+    for column in keys.T:
+        # Stable, so rows with equal keys stay in row order.
+        order = np.argsort(column, kind="stable")
+        ranked = column[order]
+        starts = np.flatnonzero(np.r_[True, ranked[1:] != ranked[:-1]])
+        ends = np.r_[starts[1:], len(ranked)]
+        for start, end in zip(starts[ends - starts > 1], ends[ends - starts > 1]):
+            group = order[start:end].tolist()
+            for position in range(1, len(group)):
+                candidates[group[position]].update(group[:position])
+    return {row: sorted(earlier) for row, earlier in candidates.items()}
+
+
+def jaccard(left: np.ndarray, right: np.ndarray) -> float:
+    if not len(left) or not len(right):
+        return 0.0
+    shared = len(np.intersect1d(left, right, assume_unique=True))
+    return shared / (len(left) + len(right) - shared)
+
+
+class CorpusRows:
+    """What the dense vectors and related graph need from each corpus chunk, kept while the chunks stream to disk."""
+
+    def __init__(self) -> None:
+        self.ids: list[str] = []
+        # Every entry a chunk belongs to, several for a chunk that near-duplicates were collapsed into.
+        self.ref_ids: list[list[str]] = []
+        self.frequencies: list[np.ndarray] = []
+
+    def collect(self, chunks: Iterable[dict[str, object]]) -> Iterator[dict[str, object]]:
+        for chunk in chunks:
+            self.ids.append(str(chunk["id"]))
+            self.ref_ids.append([ref_id for _, ref_id in chunk.get("refs", [])] or [str(chunk["refId"])])
+            self.frequencies.append(term_frequencies(str(chunk["text"])))
+            yield chunk
+
+    def vectors(self) -> DenseVectors:
+        return DenseVectors.from_term_frequencies(self.ids, self.frequencies)
+
+
+def build_related_graph(
+    docs: list[dict[str, object]],
+    audio_entries: list[dict[str, object]],
+    playlists: list[dict[str, object]],
+    ref_ids: list[list[str]],
+    vectors: DenseVectors,
+) -> dict[str, list[dict[str, object]]]:
+    rows_by_ref: dict[str, list[int]] = defaultdict(list)
+    for row, chunk_refs in enumerate(ref_ids):
+        for ref_id in chunk_refs:
+            rows_by_ref[ref_id].append(row)
+
+    nodes: list[dict[str, object]] = []
+    centroids: dict[str, np.ndarray] = {}
+    for ref_type, items in (("doc", docs), ("audio", audio_entries)):
+        for item in items:
+            rows = rows_by_ref.get(str(item["id"]))
+            if not rows:
+                continue
+            centroids[str(item["id"])] = vectors.matrix[rows].mean(axis=0)
+            nodes.append({"id": item["id"], "refType": ref_type, "title": item["title"], "kind": item["kind"]})
+    node_vectors = [centroids[str(node["id"])] for node in nodes]
+    for playlist in playlists:
+        members = [centroids[item_id] for item_id in playlist["itemIds"] if item_id in centroids]
+        if not members:
+            continue
+        node_vectors.append(np.mean(members, axis=0))
+        nodes.append({"id": playlist["id"], "refType": "playlist", "title": playlist["title"], "kind": "playlist"})
+
+    graph: dict[str, list[dict[str, object]]] = {}
+    if len(nodes) < 2:
+        return graph
+    matrix = l2_normalize(np.vstack(node_vectors))
+    limit = min(RELATED_TOP_K, len(nodes) - 1)
+    for start in range(0, len(nodes), RELATED_BLOCK_ROWS):
+        scores = matrix[start : start + RELATED_BLOCK_ROWS] @ matrix.T
+        for offset, row in enumerate(scores):
+            row[start + offset] = -np.inf
+            best = np.argpartition(-row, limit - 1)[:limit]
+            best = best[np.argsort(-row[best], kind="stable")]
+            graph[str(nodes[start + offset]["id"])] = [
+                {**nodes[index], "score": round(float(row[index]), 4)} for index in best if row[index] > 0
+            ]
+    return graph
+
+
+def quantize_length(length: int) -> int:
+    """Log-scale a token count into one byte; the browser decodes 2 ** (q / 16) - 1."""
+    return min(255, round(math.log2(1 + length) * SEARCH_NORM_SCALE))
+
+
+def build_search_index(docs: list[dict[str, object]], audio_entries: list[dict[str, object]]) -> dict[str, object]:
+    """Compact inverted index over library items for keyword search in the browser.
+
+    Postings are flat `[docGap, tf, docGap, tf, ...]` lists with delta-encoded
+    doc numbers and term frequencies capped at one byte; document lengths are
+    stored as log-quantized bytes.
+    """
+    refs: list[list[str]] = []
+    norms: list[int] = []
+    postings: dict[str, list[tuple[int, int]]] = defaultdict(list)
+    items: list[tuple[str, dict[str, object], str]] = [
+        ("doc", doc, str(doc["text"])) for doc in docs if doc["visible"]
+    ]
+    for entry in audio_entries:
+        body = " ".join([str(entry.get("lyricsText") or entry["excerpt"]), str(entry["collectionTitle"]), *map(str, entry["tags"])])
+        items.append(("audio", entry, body))
+    for number, (ref_type, item, body) in enumerate(items):
+        counts: dict[str, int] = defaultdict(int)
+        for token in tokenize(str(item["title"])):
+            counts[token] += SEARCH_TITLE_WEIGHT
+        for token in tokenize(body):
+            counts[token] += 1
+        counts = {token: tf for token, tf in counts.items() if len(token) <= SEARCH_MAX_TERM_LENGTH}
+        refs.append([ref_type, str(item["id"])])
+        norms.append(quantize_length(sum(counts.values())))
+        for token, tf in counts.items():
+            postings[token].append((number, min(tf, SEARCH_MAX_TF)))
+
+    terms = sorted(postings)
+    encoded: list[list[int]] = []
+    for term in terms:
+        flat: list[int] = []
+        previous = 0
+        for number, tf in postings[term]:
+            flat.extend((number - previous, tf))
+            previous = number
+        encoded.append(flat)
+    return {
+        "version": SEARCH_INDEX_VERSION,
+        "normScale": SEARCH_NORM_SCALE,
+        "tokenPattern": TOKEN_PATTERN_JS,
+        "refs": refs,
+        "norms": norms,
+        "terms": terms,
+        "postings": encoded,
+    }
 
 
 def featured_selection(docs: list[dict[str, object]], audio_entries: list[dict[str, object]], gallery: list[dict[str, object]]) -> dict[str, object]:
@@ -654,8 +1747,52 @@ def featured_selection(docs: list[dict[str, object]], audio_entries: list[dict[s
     }
 
 
-def clean_dist() -> None:
-    if DIST_ROOT.exists():
+def iter_json(value: object, encoder: json.JSONEncoder, depth: int = 0) -> Iterator[str]:
+    """Encode `value` piece by piece, with the same output as `encoder.encode`.
+
+    Iterators, and dicts and lists in the top `JSON_STREAM_DEPTH` levels, are
+    written member by member. Array items are encoded whole, so the text of one
+    doc, chunk or posting list is held at a time instead of the whole file's.
+    """
+    newline = "\n" + " " * (encoder.indent * depth) if encoder.indent else ""
+    inner = "\n" + " " * (encoder.indent * (depth + 1)) if encoder.indent else ""
+    if isinstance(value, dict) and depth < JSON_STREAM_DEPTH:
+        yield "{"
+        separator = ""
+        for key, member in value.items():
+            yield separator + inner + encoder.encode(str(key)) + encoder.key_separator
+            yield from iter_json(member, encoder, depth + 1)
+            separator = encoder.item_separator
+        yield (newline if separator else "") + "}"
+    elif isinstance(value, Iterator) or (isinstance(value, list) and depth < JSON_STREAM_DEPTH):
+        yield "["
+        separator = ""
+        for member in value:
+            # encode() rather than iterencode(): only the one-shot path uses the C encoder.
+            text = encoder.encode(member)
+            yield separator + inner + (text.replace("\n", inner) if inner else text)
+            separator = encoder.item_separator
+        yield (newline if separator else "") + "]"
+    else:
+        text = encoder.encode(value)
+        yield text.replace("\n", newline) if newline else text
+
+
+def write_json(path: Path, value: object, *, pretty: bool = False) -> None:
+    encoder = json.JSONEncoder(
+        ensure_ascii=False,
+        indent=JSON_INDENT if pretty else None,
+        separators=(",", ": ") if pretty else (",", ":"),
+    )
+    scratch = path.with_name(f"{path.name}.tmp-{os.getpid()}")
+    with scratch.open("w", encoding="utf-8") as handle:
+        handle.writelines(iter_json(value, encoder))
+    scratch.replace(path)
+
+
+def prepare_dist(manifest: BuildManifest) -> None:
+    # Without a previous manifest nothing in dist/ is known to be current.
+    if not manifest.has_previous and DIST_ROOT.exists():
         shutil.rmtree(DIST_ROOT)
     DIST_ROOT.mkdir(parents=True, exist_ok=True)
     CONTENT_ROOT.mkdir(parents=True, exist_ok=True)
@@ -668,16 +1805,45 @@ def copy_shell_files() -> None:
 
 
 def build() -> None:
-    clean_dist()
+    tree = SourceTree()
+    hashes = HashCache(HASH_CACHE_PATH)
+    manifest = BuildManifest.load(BUILD_MANIFEST_PATH, hashes, tree)
+    prepare_dist(manifest)
     copy_shell_files()
-    copier = AssetCopier(MEDIA_ROOT)
-
-    docs = collect_docs()
-    audio_entries = build_music_entries(docs, copier)
-    link_related_docs(audio_entries, docs)
-    playlists = build_playlists(audio_entries)
-    gallery = select_featured_images(copier)
-    corpus = build_corpus(docs, audio_entries)
+    store = BlobStore(BLOB_ROOT, hashes)
+    copier = AssetCopier(MEDIA_ROOT, manifest, store)
+    renders = RenderQueue(RenderCache(RENDER_CACHE_ROOT))
+
+    # forkserver workers start from a clean process instead of forking one that already runs BLAS and I/O threads.
+    processes = ProcessPoolExecutor(max_workers=BUILD_WORKERS, mp_context=multiprocessing.get_context("forkserver"))
+    with processes, ThreadPoolExecutor(max_workers=IO_WORKERS) as threads:
+        docs = collect_docs(manifest, renders, tree)
+        # Narrative tracks copy their chapter's HTML, so docs render before the music entries are built.
+        renders.run(processes, BUILD_WORKERS)
+        audio_entries = build_music_entries(docs, copier, renders, tree)
+        renders.run(processes, BUILD_WORKERS)
+        stream_counts = build_audio_streams(audio_entries, copier)
+        link_related_docs(audio_entries, docs)
+        playlists = build_playlists(audio_entries, tree)
+        gallery = select_featured_images(copier, tree)
+        incremental = {
+            "rendered": renders.rendered,
+            "mediaWritten": copier.publish(threads),
+            "orphansRemoved": manifest.remove_orphans(),
+        }
+        incremental["renderCacheHits"] = renders.cache.hits
+        incremental["renderCachePruned"] = renders.cache.prune()
+        incremental["mediaLinked"] = store.linked
+        incremental["blobsPruned"] = store.prune(manifest.outputs.values())
+        incremental["sourcesHashed"] = hashes.hashed
+        incremental["directoriesRead"] = tree.directories_read
+        # Chunks go straight to disk; only their ids and term frequencies stay in memory.
+        duplicates = find_duplicate_chunks(docs, audio_entries, processes, BUILD_WORKERS)
+        corpus = CorpusRows()
+        chunks = build_corpus(docs, audio_entries, duplicates, processes, BUILD_WORKERS)
+        write_json(CONTENT_ROOT / "corpus.json", corpus.collect(chunks), pretty=BUILD_PRETTY)
+    vectors = corpus.vectors()
+    related = build_related_graph(docs, audio_entries, playlists, corpus.ref_ids, vectors)
     featured = featured_selection(docs, audio_entries, gallery)
 
     site_manifest = {
@@ -686,9 +1852,11 @@ def build() -> None:
             "docs": len(docs),
             "visibleDocs": sum(1 for doc in docs if doc["visible"]),
             "audio": len(audio_entries),
+            "audioStreams": stream_counts["streams"],
             "playlists": len(playlists),
             "gallery": len(gallery),
-            "corpusChunks": len(corpus),
+            "corpusChunks": len(corpus.ids),
+            "corpusChunksDropped": len(duplicates.dropped),
         },
         "roster": ROSTER,
         "prompts": PROMPTS,
@@ -699,14 +1867,18 @@ def build() -> None:
         "gallery": gallery,
     }
 
-    (CONTENT_ROOT / "library.json").write_text(json.dumps(site_manifest, indent=2, ensure_ascii=False), encoding="utf-8")
-    (CONTENT_ROOT / "corpus.json").write_text(json.dumps(corpus, indent=2, ensure_ascii=False), encoding="utf-8")
+    write_json(CONTENT_ROOT / "library.json", site_manifest, pretty=BUILD_PRETTY)
+    vectors.save(CONTENT_ROOT / "vectors.npz")
+    write_json(CONTENT_ROOT / "related.json", related)
+    # Built at the point of writing so the index is not held alongside everything written before it.
+    write_json(CONTENT_ROOT / "search-index.json", build_search_index(docs, audio_entries))
     (CONTENT_ROOT / "build.json").write_text(
         json.dumps(
             {
                 "generatedAt": site_manifest["generatedAt"],
                 "sourceRoots": [FORK_ROOT.as_posix(), *(path.as_posix() for path in RELEVANT_MUSIC_DIRS)],
                 "dist": DIST_ROOT.as_posix(),
+                "incremental": incremental,
             },
             indent=2,
             ensure_ascii=False,
@@ -714,7 +1886,9 @@ def build() -> None:
         encoding="utf-8",
     )
 
-    print(json.dumps(site_manifest["counts"], indent=2))
+    manifest.save(BUILD_MANIFEST_PATH)
+    hashes.save()
+    print(json.dumps({**site_manifest["counts"], "incremental": incremental}, indent=2))
 
 
 if __name__ == "__main__":
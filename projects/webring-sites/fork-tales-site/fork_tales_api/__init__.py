@@ -1,3 +1,6 @@
+from . import startup  # first, so startup timings include the app's own imports
 from .app import create_app
 
+startup.mark_imported()
+
 __all__ = ["create_app"]
@@ -1,31 +1,149 @@
 from __future__ import annotations
 
+import asyncio
+import logging
+import mimetypes
+import secrets
+import time
 from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, AsyncIterator, Literal
 
-from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 
-from .schemas import ChatRequest, ChatResponse, StatusResponse
-from .service import ForkTalesService
+from .capture import CaptureMiddleware, RotatingJsonlWriter
+from .metrics import CONTENT_TYPE_LATEST, MetricsMiddleware, ServiceMetrics
+from .schemas import ChatRequest, ChatResponse, RelatedResponse, StatusResponse
 from .settings import Settings
+from .sites import DEFAULT_SITE, SITE_SCOPE_KEY, SiteRegistry, SiteRouterMiddleware, SiteStaticFiles
+from .startup import StartupTimings, claim_import_seconds
+from .tracing import SPAN_KIND_SERVER, JsonlSpanExporter, Tracer
+
+if TYPE_CHECKING:
+    from .service import ForkTalesService
+
+logger = logging.getLogger(__name__)
+
+# HLS audio from build_site.build_audio_streams; system tables often map .ts to TypeScript or Qt sources.
+HLS_MEDIA_TYPES = {".m3u8": "application/vnd.apple.mpegurl", ".ts": "video/mp2t"}
+
+
+def ready_service(request: Request) -> ForkTalesService:
+    service: ForkTalesService | None = request.app.state.service
+    if service is None:
+        timings: StartupTimings = request.app.state.startup
+        detail = f"site failed to load: {timings.error}" if timings.error else "site index is still loading"
+        raise HTTPException(status_code=503, detail=detail, headers={"Retry-After": "1"})
+    return service
+
+
+@asynccontextmanager
+async def site_service(request: Request) -> AsyncIterator[ForkTalesService]:
+    """Service for the request's site; extra sites load on first use and stay leased until the handler returns."""
+    name = request.scope.get(SITE_SCOPE_KEY, DEFAULT_SITE)
+    if name == DEFAULT_SITE:
+        yield ready_service(request)
+        return
+    registry: SiteRegistry = request.app.state.sites
+    try:
+        site = await registry.acquire(name)
+    except Exception as exc:  # noqa: BLE001
+        logger.exception("fork tales site %s failed to load", name)
+        raise HTTPException(status_code=503, detail=f"site {name} failed to load: {type(exc).__name__}: {exc}") from exc
+    try:
+        yield site.service
+    finally:
+        await registry.release(site)
 
 
 def create_app() -> FastAPI:
+    started = time.perf_counter()
+    timings = StartupTimings(claim_import_seconds())
     settings = Settings()
     site_root = settings.site_root
     if not site_root.exists():
         raise RuntimeError(f"Static site root does not exist: {site_root}")
+    extra_sites = {name: root.resolve() for name, root in settings.fork_tales_sites.items()}
+    if DEFAULT_SITE in extra_sites:
+        raise RuntimeError(f"FORK_TALES_SITES cannot redefine the {DEFAULT_SITE!r} site; it is FORK_TALES_SITE_ROOT")
+    for name, root in extra_sites.items():
+        if not root.exists():
+            raise RuntimeError(f"Static site root for {name} does not exist: {root}")
+    for host, name in settings.fork_tales_site_hosts.items():
+        if name != DEFAULT_SITE and name not in extra_sites:
+            raise RuntimeError(f"FORK_TALES_SITE_HOSTS maps {host} to unknown site {name}")
+    metrics = ServiceMetrics()
+    capture_writer = None
+    if settings.fork_tales_capture_path:
+        capture_writer = RotatingJsonlWriter(
+            settings.fork_tales_capture_path,
+            max_bytes=settings.fork_tales_capture_max_bytes,
+            backups=settings.fork_tales_capture_backups,
+        )
+
+    def load_service(tracer: Tracer) -> ForkTalesService:
+        # The service module pulls in NumPy, rank_bm25 and httpx; keep them off the import path of the app.
+        with timings.phase("import_service"):
+            from .service import ForkTalesService
+        return ForkTalesService(settings, metrics, tracer, timings)
+
+    def load_extra_site(root: Path, tracer: Tracer) -> ForkTalesService:
+        from .service import ForkTalesService
+
+        return ForkTalesService(settings.model_copy(update={"fork_tales_site_root": root}), metrics, tracer)
+
+    def mark_ready(app: FastAPI, service: ForkTalesService) -> None:
+        app.state.service = service
+        service.publish_gauges()
+        timings.mark_ready()
+        for phase, seconds in timings.snapshot().items():
+            metrics.startup_seconds.labels(phase).set(seconds)
+        logger.info("fork tales api ready: %s", ", ".join(f"{name}={seconds:.3f}s" for name, seconds in timings.snapshot().items()))
+
+    async def load_in_background(app: FastAPI, tracer: Tracer) -> None:
+        try:
+            service = await asyncio.to_thread(load_service, tracer)
+        except Exception as exc:  # noqa: BLE001
+            logger.exception("fork tales site failed to load")
+            timings.mark_failed(exc)
+            return
+        mark_ready(app, service)
 
     @asynccontextmanager
     async def lifespan(app: FastAPI):
-        service = ForkTalesService(settings)
+        trace_path = settings.fork_tales_trace_path
+        tracer = Tracer(
+            JsonlSpanExporter(trace_path, "fork-tales-api") if trace_path else None,
+            settings.fork_tales_trace_sample_ratio,
+        )
         app.state.settings = settings
-        app.state.service = service
+        app.state.metrics = metrics
+        app.state.startup = timings
+        app.state.service = None
+        app.state.sites = SiteRegistry(
+            extra_sites,
+            lambda root: load_extra_site(root, tracer),
+            budget_bytes=settings.fork_tales_site_memory_budget_mb * 1024 * 1024,
+            metrics=metrics,
+        )
+        loader: asyncio.Task[None] | None = None
+        if settings.fork_tales_background_load:
+            loader = asyncio.create_task(load_in_background(app, tracer))
+        else:
+            mark_ready(app, load_service(tracer))
         try:
             yield
         finally:
-            await service.aclose()
+            if loader is not None:
+                # The load runs in a worker thread and cannot be interrupted; let it finish before closing.
+                await loader
+            if app.state.service is not None:
+                await app.state.service.aclose()
+            await app.state.sites.aclose()
+            tracer.close()
+            if capture_writer is not None:
+                capture_writer.close()
 
     app = FastAPI(
         title="Fork Tales API",
@@ -33,19 +151,96 @@ def create_app() -> FastAPI:
         lifespan=lifespan,
     )
 
+    if capture_writer is not None:
+        app.add_middleware(CaptureMiddleware, writer=capture_writer, sample_ratio=settings.fork_tales_capture_sample_ratio)
+
+    if settings.fork_tales_metrics_enabled:
+        app.add_middleware(MetricsMiddleware, metrics=metrics)
+
+        @app.get("/metrics", include_in_schema=False)
+        async def metrics_endpoint() -> Response:
+            return Response(content=metrics.render(), media_type=CONTENT_TYPE_LATEST)
+
+    if extra_sites:
+        app.add_middleware(SiteRouterMiddleware, sites=set(extra_sites), hosts=settings.fork_tales_site_hosts)
+
+    profile_lock = asyncio.Lock()
+
+    def require_admin(request: Request) -> None:
+        token = settings.fork_tales_admin_token
+        if not token:
+            raise HTTPException(status_code=404, detail="Not Found")
+        supplied = request.headers.get("authorization", "").removeprefix("Bearer ").strip()
+        if not secrets.compare_digest(supplied.encode(), token.encode()):
+            raise HTTPException(status_code=403, detail="admin token required")
+
+    @app.get("/debug/profile", include_in_schema=False, dependencies=[Depends(require_admin)])
+    async def debug_profile(
+        seconds: float = Query(5.0, gt=0),
+        format: Literal["collapsed", "speedscope"] = "collapsed",
+    ) -> Response:
+        if seconds > settings.fork_tales_profile_max_seconds:
+            raise HTTPException(status_code=422, detail=f"seconds must be <= {settings.fork_tales_profile_max_seconds}")
+        if profile_lock.locked():
+            raise HTTPException(status_code=409, detail="a profile is already running")
+        from .debug import StackSampler
+
+        async with profile_lock:
+            sampler = StackSampler(settings.fork_tales_profile_interval_seconds)
+            result = await asyncio.to_thread(sampler.run, seconds)
+        if format == "speedscope":
+            return JSONResponse(result.speedscope())
+        return PlainTextResponse(result.collapsed())
+
+    @app.get("/debug/memory", include_in_schema=False, dependencies=[Depends(require_admin)])
+    async def debug_memory(request: Request) -> dict[str, int]:
+        async with site_service(request) as service:
+            return await asyncio.to_thread(service.memory_breakdown)
+
     @app.get("/healthz")
     async def healthz() -> dict[str, bool]:
         return {"ok": True}
 
+    @app.get("/readyz")
+    async def readyz() -> JSONResponse:
+        body: dict[str, object] = {"ok": timings.ready, "phases": timings.snapshot()}
+        if timings.error:
+            body["error"] = timings.error
+        return JSONResponse(body, status_code=200 if timings.ready else 503)
+
     @app.get("/api/status", response_model=StatusResponse)
     async def status(request: Request) -> StatusResponse:
-        service: ForkTalesService = request.app.state.service
-        return service.status()
+        async with site_service(request) as service:
+            return service.status()
+
+    @app.get("/api/related/{item_id}", response_model=RelatedResponse)
+    async def related(item_id: str, request: Request) -> RelatedResponse:
+        async with site_service(request) as service:
+            response = service.related(item_id)
+        if response is None:
+            raise HTTPException(status_code=404, detail=f"no related items for {item_id}")
+        return response
 
     @app.post("/api/chat", response_model=ChatResponse)
-    async def chat(payload: ChatRequest, request: Request) -> ChatResponse:
-        service: ForkTalesService = request.app.state.service
-        return await service.chat(payload.message, payload.history)
+    async def chat(payload: ChatRequest, request: Request) -> Response:
+        async with site_service(request) as service:
+            with service.tracer.span("chat", kind=SPAN_KIND_SERVER, **{"http.route": "/api/chat"}) as span:
+                response = await service.chat(
+                    payload.message,
+                    payload.history,
+                    session_id=payload.sessionId,
+                    start_session=payload.session,
+                )
+                with metrics.stage("serialization"), service.tracer.span("serialize"):
+                    body = response.model_dump_json()
+                if span is not None:
+                    span.set_attribute("fallback", response.fallback)
+                    span.set_attribute("citations", len(response.citations))
+        headers = {"X-Trace-Id": span.trace_id} if span is not None else None
+        return Response(content=body, media_type="application/json", headers=headers)
 
-    app.mount("/", StaticFiles(directory=site_root, html=True), name="site")
+    for suffix, media_type in HLS_MEDIA_TYPES.items():
+        mimetypes.add_type(media_type, suffix)
+    app.mount("/", SiteStaticFiles({DEFAULT_SITE: site_root, **extra_sites}), name="site")
+    timings.record("create_app", time.perf_counter() - started)
     return app
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import hashlib
+import hmac
+import json
+import queue
+import random
+import re
+import secrets
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .metrics import route_path
+
+CAPTURE_ROUTE = "/api/chat"
+CAPTURE_VERSION = 1
+MAX_CAPTURED_RESPONSE_BYTES = 256 * 1024
+
+REDACTIONS = (
+    (re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+"), "<email>"),
+    (re.compile(r"https?://\S+"), "<url>"),
+    (re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}\b"), "<ip>"),
+    (re.compile(r"(?:\+?\d[\d ().-]{7,}\d)"), "<number>"),
+)
+
+
+def anonymize_text(text: str) -> str:
+    """Strip contact details and long digit runs; the wording of the query itself is kept for replay."""
+    for pattern, placeholder in REDACTIONS:
+        text = pattern.sub(placeholder, text)
+    return text
+
+
+def pseudonymize_session(session_id: object, key: bytes) -> str:
+    # Keyed per process, so turns of one conversation stay linked without the id being reversible.
+    return hmac.new(key, str(session_id).encode(), hashlib.sha256).hexdigest()[:16]
+
+
+def anonymize_request(payload: dict[str, Any], key: bytes) -> dict[str, Any]:
+    history = payload.get("history") if isinstance(payload.get("history"), list) else []
+    anonymized: dict[str, Any] = {
+        "message": anonymize_text(str(payload.get("message", ""))),
+        "history": [
+            {"role": turn.get("role"), "content": anonymize_text(str(turn.get("content", "")))}
+            for turn in history
+            if isinstance(turn, dict)
+        ],
+        "session": bool(payload.get("session", False)),
+    }
+    session_id = payload.get("sessionId")
+    if session_id:
+        anonymized["sessionId"] = pseudonymize_session(session_id, key)
+    return anonymized
+
+
+class RotatingJsonlWriter:
+    """Append JSON lines on a background thread, rolling `path` to `path.1` … `path.N` at `max_bytes`."""
+
+    def __init__(self, path: Path, *, max_bytes: int, backups: int) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._queue: queue.SimpleQueue[dict[str, Any] | None] = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._drain, name="fork-tales-capture-writer", daemon=True)
+        self._writer.start()
+
+    def write(self, record: dict[str, Any]) -> None:
+        self._queue.put(record)
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._writer.join(timeout=5)
+
+    def _rotate(self) -> None:
+        for index in range(self.backups - 1, 0, -1):
+            source = self.path.with_name(f"{self.path.name}.{index}")
+            if source.exists():
+                source.replace(self.path.with_name(f"{self.path.name}.{index + 1}"))
+        if self.backups > 0:
+            self.path.replace(self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink()
+
+    def _drain(self) -> None:
+        handle = self.path.open("a", encoding="utf-8")
+        try:
+            while True:
+                record = self._queue.get()
+                if record is None:
+                    return
+                handle.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+                if self._queue.empty():
+                    handle.flush()
+                if handle.tell() >= self.max_bytes:
+                    handle.close()
+                    self._rotate()
+                    handle = self.path.open("a", encoding="utf-8")
+        finally:
+            handle.close()
+
+
+class CaptureMiddleware:
+    """Record anonymized `/api/chat` requests with their timing and citations for later replay.
+
+    Pure ASGI like `MetricsMiddleware`; bodies are observed as they pass through, never re-read.
+    """
+
+    def __init__(self, app: ASGIApp, writer: RotatingJsonlWriter, sample_ratio: float = 1.0) -> None:
+        self.app = app
+        self.writer = writer
+        self.sample_ratio = sample_ratio
+        self._key = secrets.token_bytes(32)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or route_path(scope) != CAPTURE_ROUTE
+            or (self.sample_ratio < 1.0 and random.random() >= self.sample_ratio)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        request_body = bytearray()
+        response_body = bytearray()
+        status = 500
+
+        async def capture_receive() -> Message:
+            message = await receive()
+            if message["type"] == "http.request":
+                request_body.extend(message.get("body", b""))
+            return message
+
+        async def capture_send(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body" and len(response_body) < MAX_CAPTURED_RESPONSE_BYTES:
+                response_body.extend(message.get("body", b""))
+            await send(message)
+
+        timestamp = time.time()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, capture_receive, capture_send)
+        finally:
+            self._record(timestamp, (time.perf_counter() - started) * 1000, status, bytes(request_body), bytes(response_body))
+
+    def _record(self, timestamp: float, latency_ms: float, status: int, request_body: bytes, response_body: bytes) -> None:
+        try:
+            payload = json.loads(request_body)
+        except ValueError:
+            return
+        if not isinstance(payload, dict):
+            return
+        record: dict[str, Any] = {
+            "v": CAPTURE_VERSION,
+            "ts": round(timestamp, 6),
+            "latencyMs": round(latency_ms, 3),
+            "status": status,
+            "request": anonymize_request(payload, self._key),
+        }
+        if status == 200:
+            try:
+                response = json.loads(response_body)
+            except ValueError:
+                response = None
+            if isinstance(response, dict):
+                record["fallback"] = bool(response.get("fallback"))
+                record["citations"] = [citation.get("id") for citation in response.get("citations", []) if isinstance(citation, dict)]
+                if response.get("sessionId"):
+                    # The session the turn ran in: a conversation's first turn only has it in the response.
+                    record["sessionId"] = pseudonymize_session(response["sessionId"], self._key)
+        self.writer.write(record)
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import resource
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from types import CodeType, FrameType
+from typing import Any
+
+import numpy as np
+
+FrameKey = tuple[str, str, int]
+
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+
+@dataclass(frozen=True)
+class SampleSet:
+    interval: float
+    duration: float
+    samples: Counter[tuple[str, tuple[FrameKey, ...]]]
+
+    def collapsed(self) -> str:
+        """Brendan Gregg collapsed-stack text, one `thread;root;...;leaf count` line per stack."""
+        lines = []
+        for (thread, stack), count in sorted(self.samples.items(), key=lambda item: -item[1]):
+            frames = ";".join(f"{name} ({filename}:{line})" for name, filename, line in stack)
+            lines.append(f"{thread};{frames} {count}" if frames else f"{thread} {count}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self) -> dict[str, Any]:
+        frame_ids: dict[FrameKey, int] = {}
+        frames: list[dict[str, Any]] = []
+        per_thread: dict[str, tuple[list[list[int]], list[float]]] = {}
+        for (thread, stack), count in self.samples.items():
+            indexes = []
+            for key in stack:
+                if key not in frame_ids:
+                    frame_ids[key] = len(frames)
+                    frames.append({"name": key[0], "file": key[1], "line": key[2]})
+                indexes.append(frame_ids[key])
+            stacks, weights = per_thread.setdefault(thread, ([], []))
+            stacks.append(indexes)
+            weights.append(count * self.interval)
+        return {
+            "$schema": SPEEDSCOPE_SCHEMA,
+            "exporter": "fork-tales-api",
+            "name": "fork-tales-api profile",
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": thread,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": stacks,
+                    "weights": weights,
+                }
+                for thread, (stacks, weights) in sorted(per_thread.items())
+            ],
+        }
+
+
+class StackSampler:
+    """Statistical profiler that snapshots every thread's Python stack on a fixed interval.
+
+    It only reads `sys._current_frames()`, so the profiled code runs unmodified;
+    overhead is one stack walk per thread per tick in the sampler thread.
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self._keys: dict[CodeType, FrameKey] = {}
+
+    def run(self, seconds: float) -> SampleSet:
+        own = threading.get_ident()
+        samples: Counter[tuple[str, tuple[FrameKey, ...]]] = Counter()
+        started = time.perf_counter()
+        deadline = started + seconds
+        while time.perf_counter() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                samples[(names.get(ident, f"thread-{ident}"), self._stack(frame))] += 1
+            time.sleep(self.interval)
+        return SampleSet(interval=self.interval, duration=time.perf_counter() - started, samples=samples)
+
+    def _stack(self, frame: FrameType | None) -> tuple[FrameKey, ...]:
+        stack: list[FrameKey] = []
+        while frame is not None:
+            code = frame.f_code
+            key = self._keys.get(code)
+            if key is None:
+                key = (code.co_qualname, code.co_filename, code.co_firstlineno)
+                self._keys[code] = key
+            stack.append(key)
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+
+def deep_sizeof(value: Any, seen: set[int] | None = None) -> int:
+    """Approximate retained size of an object graph, counting shared objects once.
+
+    Pass the same `seen` set across calls to attribute shared objects to the
+    first component that reaches them.
+    """
+    seen = set() if seen is None else seen
+    pending = [value]
+    total = 0
+    while pending:
+        current = pending.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current)
+        if isinstance(current, (str, bytes, bytearray, int, float, bool, type(None), np.ndarray)):
+            continue
+        if isinstance(current, dict):
+            pending.extend(current.keys())
+            pending.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            pending.extend(current)
+        elif hasattr(current, "__dict__"):
+            pending.append(vars(current))
+        elif hasattr(current, "__slots__"):
+            pending.extend(getattr(current, slot) for slot in current.__slots__ if hasattr(current, slot))
+    return total
+
+
+def peak_rss_bytes() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
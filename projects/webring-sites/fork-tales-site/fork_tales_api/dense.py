@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+
+from .text import tokenize
+
+DENSE_DIM = 512
+NGRAM_RANGE = (3, 5)
+HASH_PRIME = 1_000_003
+HASH_MASK = 0xFFFFFFFF
+
+LSH_TABLES = 16
+LSH_BITS = 10
+LSH_SEED = 1729
+EXACT_SEARCH_LIMIT = 20_000
+
+
+def ngram_buckets(text: str, dim: int = DENSE_DIM) -> np.ndarray:
+    """Hash the character n-grams of the tokenized text into `dim` buckets.
+
+    Uses a polynomial rolling hash over code points so bucket ids are stable
+    across processes (Python's `hash()` is salted per interpreter).
+    """
+    normalized = " " + " ".join(tokenize(text)) + " "
+    codes = np.frombuffer(normalized.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    parts: list[np.ndarray] = []
+    for size in range(NGRAM_RANGE[0], NGRAM_RANGE[1] + 1):
+        count = len(codes) - size + 1
+        if count <= 0:
+            continue
+        hashed = np.full(count, size, dtype=np.uint64)
+        for offset in range(size):
+            hashed = (hashed * HASH_PRIME + codes[offset : offset + count]) & HASH_MASK
+        parts.append(hashed)
+    if not parts:
+        return np.zeros(0, dtype=np.int64)
+    return (np.concatenate(parts) % dim).astype(np.int64)
+
+
+def term_frequencies(text: str, dim: int = DENSE_DIM) -> np.ndarray:
+    buckets = ngram_buckets(text, dim)
+    counts = np.bincount(buckets, minlength=dim).astype(np.float32)
+    return np.log1p(counts, out=counts)
+
+
+def l2_normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+@dataclass(frozen=True)
+class DenseVectors:
+    """Hashed character n-gram TF-IDF vectors, one L2-normalized row per chunk."""
+
+    ids: list[str]
+    matrix: np.ndarray
+    idf: np.ndarray
+
+    @classmethod
+    def fit(cls, ids: Iterable[str], texts: Iterable[str], dim: int = DENSE_DIM) -> "DenseVectors":
+        return cls.from_term_frequencies(ids, (term_frequencies(text, dim) for text in texts), dim)
+
+    @classmethod
+    def from_term_frequencies(cls, ids: Iterable[str], frequencies: Iterable[np.ndarray], dim: int = DENSE_DIM) -> "DenseVectors":
+        """Fit from rows already computed with `term_frequencies`, for callers that drop each text once it is counted."""
+        id_list = list(ids)
+        rows = list(frequencies)
+        tf = np.vstack(rows) if rows else np.zeros((0, dim), dtype=np.float32)
+        df = np.count_nonzero(tf, axis=0).astype(np.float32)
+        idf = (np.log((1.0 + len(rows)) / (1.0 + df)) + 1.0).astype(np.float32)
+        matrix = l2_normalize(tf * idf).astype(np.float32)
+        return cls(ids=id_list, matrix=matrix, idf=idf)
+
+    @property
+    def dim(self) -> int:
+        return int(self.idf.shape[0])
+
+    def embed(self, text: str) -> np.ndarray:
+        return l2_normalize(term_frequencies(text, self.dim) * self.idf)
+
+    def save(self, path: Path) -> None:
+        with path.open("wb") as handle:
+            np.savez(
+                handle,
+                ids=np.array(self.ids, dtype=str),
+                matrix=self.matrix.astype(np.float16),
+                idf=self.idf,
+            )
+
+    @classmethod
+    def load(cls, path: Path) -> "DenseVectors":
+        with np.load(path, allow_pickle=False) as payload:
+            return cls(
+                ids=[str(item) for item in payload["ids"]],
+                matrix=payload["matrix"].astype(np.float32),
+                idf=payload["idf"].astype(np.float32),
+            )
+
+
+class LSHIndex:
+    """Random-hyperplane LSH over centered unit vectors with single-bit multi-probe.
+
+    Below `EXACT_SEARCH_LIMIT` rows a full matrix-vector product is cheaper than
+    probing, so the index degrades to exact cosine search.
+    """
+
+    def __init__(
+        self,
+        matrix: np.ndarray,
+        *,
+        tables: int = LSH_TABLES,
+        bits: int = LSH_BITS,
+        seed: int = LSH_SEED,
+        exact_limit: int = EXACT_SEARCH_LIMIT,
+    ) -> None:
+        self.matrix = matrix
+        self.exact = matrix.shape[0] <= exact_limit
+        self.buckets: list[dict[int, np.ndarray]] = []
+        if self.exact:
+            return
+        rng = np.random.default_rng(seed)
+        self.center = matrix.mean(axis=0)
+        self.planes = rng.standard_normal((matrix.shape[1], tables * bits)).astype(np.float32)
+        self.weights = (1 << np.arange(bits, dtype=np.int64))
+        self.tables = tables
+        self.bits = bits
+        signatures = self._signatures(matrix)
+        for table in range(tables):
+            keys = signatures[:, table]
+            order = np.argsort(keys, kind="stable")
+            sorted_keys = keys[order]
+            unique, starts = np.unique(sorted_keys, return_index=True)
+            ends = np.append(starts[1:], len(sorted_keys))
+            self.buckets.append(
+                {int(key): order[start:end] for key, start, end in zip(unique, starts, ends, strict=True)}
+            )
+
+    def _signatures(self, vectors: np.ndarray) -> np.ndarray:
+        projected = (vectors - self.center) @ self.planes > 0
+        projected = projected.reshape(vectors.shape[0], self.tables, self.bits)
+        return projected.astype(np.int64) @ self.weights
+
+    def candidates(self, query: np.ndarray) -> np.ndarray:
+        keys = self._signatures(query[None, :])[0]
+        found: list[np.ndarray] = []
+        for table, key in enumerate(keys):
+            bucket = self.buckets[table]
+            key = int(key)
+            for probe in (key, *(key ^ (1 << bit) for bit in range(self.bits))):
+                rows = bucket.get(probe)
+                if rows is not None:
+                    found.append(rows)
+        if not found:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate(found))
+
+    def search(self, query: np.ndarray, top_k: int, min_score: float = 0.0, *, exact: bool = False) -> list[tuple[int, float]]:
+        """Top-k rows by cosine; `exact=True` scans every row even when buckets exist."""
+        if self.matrix.shape[0] == 0:
+            return []
+        rows = np.arange(self.matrix.shape[0]) if self.exact or exact else self.candidates(query)
+        if rows.size == 0:
+            return []
+        scores = self.matrix[rows] @ query
+        limit = min(top_k, rows.size)
+        best = np.argpartition(-scores, limit - 1)[:limit]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(int(rows[index]), float(scores[index])) for index in best if scores[index] > min_score]
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, ProcessCollector, generate_latest
+from prometheus_client.exposition import CONTENT_TYPE_LATEST
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+CHAT_STAGES = ("retrieval", "citations", "prompt", "provider", "serialization")
+OVERLAP_BUCKETS = (0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99, 1.0)
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TRACKED_ROUTES = ("/healthz", "/readyz", "/metrics", "/api/status", "/api/chat", "/api/related")
+
+__all__ = ["CONTENT_TYPE_LATEST", "MetricsMiddleware", "ServiceMetrics"]
+
+
+class ServiceMetrics:
+    """Prometheus instruments for one app instance, kept on a private registry."""
+
+    def __init__(self) -> None:
+        self.registry = CollectorRegistry(auto_describe=True)
+        ProcessCollector(registry=self.registry)
+        self.chat_stage_seconds = Histogram(
+            "fork_tales_chat_stage_seconds",
+            "Time spent in each stage of ForkTalesService.chat.",
+            ["stage"],
+            buckets=STAGE_BUCKETS,
+            registry=self.registry,
+        )
+        self._stages = {stage: self.chat_stage_seconds.labels(stage) for stage in CHAT_STAGES}
+        self.chat_responses = Counter(
+            "fork_tales_chat_responses_total",
+            "Chat responses by answer source.",
+            ["source"],
+            registry=self.registry,
+        )
+        self.provider_responses = Counter(
+            "fork_tales_provider_responses_total",
+            "Provider chat-completions calls by HTTP status (or 'error' for transport failures).",
+            ["status"],
+            registry=self.registry,
+        )
+        self.fallbacks = Counter(
+            "fork_tales_chat_fallbacks_total",
+            "Chat answers stitched locally instead of by the provider.",
+            ["reason"],
+            registry=self.registry,
+        )
+        self.cache_lookups = Counter(
+            "fork_tales_cache_lookups_total",
+            "In-process cache lookups by cache and result.",
+            ["cache", "result"],
+            registry=self.registry,
+        )
+        self.index_chunks = Gauge("fork_tales_index_chunks", "Chunks held by the corpus index.", registry=self.registry)
+        self.index_vector_bytes = Gauge(
+            "fork_tales_index_vector_bytes",
+            "Bytes held by the dense vector matrix.",
+            registry=self.registry,
+        )
+        self.shadow_seconds = Histogram(
+            "fork_tales_shadow_search_seconds",
+            "Search latency of the shadow retrieval engine.",
+            ["engine"],
+            buckets=STAGE_BUCKETS,
+            registry=self.registry,
+        )
+        self.shadow_overlap = Histogram(
+            "fork_tales_shadow_overlap",
+            "Agreement between live and shadow result lists.",
+            ["engine", "measure"],
+            buckets=OVERLAP_BUCKETS,
+            registry=self.registry,
+        )
+        self.shadow_runs = Counter(
+            "fork_tales_shadow_runs_total",
+            "Shadow searches by outcome ('ok', 'error', or 'dropped' when the backlog is full).",
+            ["engine", "result"],
+            registry=self.registry,
+        )
+        self.startup_seconds = Gauge(
+            "fork_tales_startup_phase_seconds",
+            "Seconds spent in each startup phase of the most recent start.",
+            ["phase"],
+            registry=self.registry,
+        )
+        self.sites_loaded = Gauge("fork_tales_sites_loaded", "Extra sites currently resident.", registry=self.registry)
+        self.sites_resident_bytes = Gauge(
+            "fork_tales_sites_resident_bytes",
+            "Estimated memory held by resident extra sites.",
+            registry=self.registry,
+        )
+        self.site_loads = Counter(
+            "fork_tales_site_loads_total",
+            "Lazy site loads by result.",
+            ["result"],
+            registry=self.registry,
+        )
+        self.site_evictions = Counter(
+            "fork_tales_site_evictions_total",
+            "Extra sites evicted to stay under the memory budget.",
+            registry=self.registry,
+        )
+        self.sessions = Gauge("fork_tales_sessions", "Live conversation sessions.", registry=self.registry)
+        self.http_in_flight = Gauge(
+            "fork_tales_http_requests_in_flight",
+            "HTTP requests currently being handled.",
+            ["route"],
+            registry=self.registry,
+        )
+        self.http_seconds = Histogram(
+            "fork_tales_http_request_seconds",
+            "End-to-end HTTP request latency.",
+            ["route", "method"],
+            buckets=STAGE_BUCKETS,
+            registry=self.registry,
+        )
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._stages[name].observe(time.perf_counter() - started)
+
+    def cache_lookup(self, cache: str, hit: bool) -> None:
+        self.cache_lookups.labels(cache, "hit" if hit else "miss").inc()
+
+    def render(self) -> bytes:
+        return generate_latest(self.registry)
+
+
+def route_path(scope: Scope) -> str:
+    """Path relative to `root_path`, so `/sites/<name>/api/chat` is labelled like `/api/chat`."""
+    path: str = scope["path"]
+    root_path: str = scope.get("root_path", "")
+    if root_path and path.startswith(root_path + "/"):
+        return path[len(root_path) :]
+    return path
+
+
+def route_label(path: str) -> str:
+    for route in TRACKED_ROUTES:
+        if path == route or path.startswith(route + "/"):
+            return route
+    return "static"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware so static file streaming is not buffered through BaseHTTPMiddleware."""
+
+    def __init__(self, app: ASGIApp, metrics: ServiceMetrics) -> None:
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route = route_label(route_path(scope))
+        in_flight = self.metrics.http_in_flight.labels(route)
+        started = time.perf_counter()
+        in_flight.inc()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            in_flight.dec()
+            self.metrics.http_seconds.labels(route, scope["method"]).observe(time.perf_counter() - started)
+
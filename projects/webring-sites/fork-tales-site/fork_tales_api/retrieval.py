@@ -1,16 +1,30 @@
 from __future__ import annotations
 
-import re
 from dataclasses import dataclass
 from typing import Any
 
 from rank_bm25 import BM25Okapi
 
-TOKEN_RE = re.compile(r"[\w\-一-龯ぁ-ゟァ-ヿ]+", re.UNICODE)
+from .dense import DenseVectors, LSHIndex
+from .text import TOKEN_RE, tokenize, tokenize_spans
 
+__all__ = ["RETRIEVAL_ENGINES", "TOKEN_RE", "CorpusIndex", "IndexedChunk", "Snippet", "tokenize"]
 
-def tokenize(text: str) -> list[str]:
-    return [token.lower() for token in TOKEN_RE.findall(text) if len(token) > 1]
+RETRIEVAL_ENGINES = ("hybrid", "lexical", "dense", "hybrid-exact")
+DENSE_ENGINES = frozenset({"dense", "hybrid-exact"})
+RRF_K = 60
+DENSE_MIN_SCORE = 0.12
+# Character-trigram cosines of off-topic queries reach about 0.5 on English prose, so a hybrid search whose
+# lexical ranking is empty only keeps near-verbatim dense hits; anything weaker is left to the fallback.
+DENSE_ONLY_MIN_SCORE = 0.55
+CARRY_WEIGHT = 0.5
+SNIPPET_CHARS = 280
+PREFIX_MATCH_MIN = 4
+ELLIPSIS = "…"
+SNIPPET_STOPWORDS = frozenset(
+    "the and for are but not you all any can had her was one our out has him his how its who did does what when "
+    "where which why with this that from they them then than have into your about there their would could should".split()
+)
 
 
 @dataclass(frozen=True)
@@ -21,46 +35,177 @@ class IndexedChunk:
     title_tokens: set[str]
     lower_title: str
     lower_text: str
+    offsets: tuple[tuple[int, int], ...] = ()
+
+
+@dataclass(frozen=True)
+class Snippet:
+    text: str
+    highlights: list[tuple[int, int]]
 
 
 class CorpusIndex:
-    def __init__(self, chunks: list[dict[str, Any]]) -> None:
+    def __init__(self, chunks: list[dict[str, Any]], vectors: DenseVectors | None = None, *, dense: bool = True) -> None:
         self.records: list[IndexedChunk] = []
+        self._positions: dict[str, int] = {}
         token_matrix: list[list[str]] = []
         for chunk in chunks:
             text = str(chunk.get("text", ""))
             title = str(chunk.get("title", ""))
-            tokens = tokenize(text)
+            spans = tokenize_spans(text)
+            tokens = [token for token, _, _ in spans]
             token_matrix.append(tokens or ["_"])
-            self.records.append(
-                IndexedChunk(
-                    raw=chunk,
-                    tokens=tokens,
-                    token_set=set(tokens),
-                    title_tokens=set(tokenize(title)),
-                    lower_title=title.lower(),
-                    lower_text=text.lower(),
-                )
+            record = IndexedChunk(
+                raw=chunk,
+                tokens=tokens,
+                token_set=set(tokens),
+                title_tokens=set(tokenize(title)),
+                lower_title=title.lower(),
+                lower_text=text.lower(),
+                offsets=tuple((start, end) for _, start, end in spans),
             )
+            self._positions[str(chunk.get("id"))] = len(self.records)
+            self.records.append(record)
         self.bm25 = BM25Okapi(token_matrix or [["_"]])
+        self.vectors: DenseVectors | None = None
+        self.ann: LSHIndex | None = None
+        if dense:
+            ids = [str(chunk.get("id")) for chunk in chunks]
+            if vectors is None or vectors.ids != ids:
+                vectors = DenseVectors.fit(ids, (str(chunk.get("text", "")) for chunk in chunks))
+            self.vectors = vectors
+            self.ann = LSHIndex(vectors.matrix)
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 8,
+        carry: list[dict[str, Any]] | None = None,
+        *,
+        engine: str = "hybrid",
+    ) -> list[dict[str, Any]]:
+        """Rank chunks for `query`.
 
-    def search(self, query: str, top_k: int = 8) -> list[dict[str, Any]]:
+        `carry` is a previous result list (e.g. the last turn of a conversation);
+        its chunks stay in the candidate pool at reduced weight so follow-up
+        questions keep their context without a wider search.
+
+        `engine` picks the rankings that are fused (see `RETRIEVAL_ENGINES`);
+        `hybrid` quietly drops to lexical-only when the index has no vectors.
+        """
+        if engine not in RETRIEVAL_ENGINES:
+            raise ValueError(f"unknown retrieval engine: {engine}")
+        if engine in DENSE_ENGINES and self.ann is None:
+            raise ValueError(f"retrieval engine {engine!r} needs dense vectors")
         query_tokens = tokenize(query)
         if not query_tokens:
             return []
 
+        depth = max(top_k * 4, 32)
+        rankings: list[list[int]] = []
+        weights: list[float] = []
+        if engine != "dense":
+            rankings.append(self._lexical_ranking(query, query_tokens)[:depth])
+            weights.append(1.0)
+        if engine != "lexical" and self.ann is not None and self.vectors is not None:
+            exact = engine == "hybrid-exact"
+            min_score = DENSE_ONLY_MIN_SCORE if engine != "dense" and not rankings[0] else DENSE_MIN_SCORE
+            rankings.append([position for position, _ in self.ann.search(self.vectors.embed(query), depth, min_score, exact=exact)])
+            weights.append(1.0)
+        carried = [self._positions[str(chunk.get("id"))] for chunk in carry or [] if str(chunk.get("id")) in self._positions]
+        if carried:
+            rankings.append(carried)
+            weights.append(CARRY_WEIGHT)
+        if len(rankings) == 1:
+            return [self.records[position].raw for position in rankings[0][:top_k]]
+        fused = reciprocal_rank_fusion(*rankings, weights=weights)
+        return [self.records[position].raw for position in fused[:top_k]]
+
+    def snippet(self, chunk: dict[str, Any], query: str, width: int = SNIPPET_CHARS) -> Snippet:
+        """Return the densest `width`-character window of query matches in a chunk.
+
+        Highlight offsets are relative to the returned snippet text.
+        """
+        text = str(chunk.get("text", ""))
+        position = self._positions.get(str(chunk.get("id")))
+        record = self.records[position] if position is not None else None
+        query_tokens = {token for token in tokenize(query) if len(token) > 2 and token not in SNIPPET_STOPWORDS}
+        matches: list[tuple[int, int]] = []
+        if record is not None and query_tokens:
+            matches = [
+                span
+                for token, span in zip(record.tokens, record.offsets, strict=True)
+                if token_matches(token, query_tokens)
+            ]
+        if len(text) <= width:
+            return Snippet(text=text, highlights=matches)
+        if not matches:
+            return clip_snippet(text, 0, width, [])
+
+        best_start, best_count, best_terms = 0, 0, 0
+        end_index = 0
+        for start_index, (start, _) in enumerate(matches):
+            end_index = max(end_index, start_index)
+            while end_index + 1 < len(matches) and matches[end_index + 1][1] - start <= width:
+                end_index += 1
+            window = matches[start_index : end_index + 1]
+            terms = len({text[a:b].lower() for a, b in window})
+            if (terms, len(window)) > (best_terms, best_count):
+                best_start, best_count, best_terms = start_index, len(window), terms
+        window = matches[best_start : best_start + best_count]
+        slack = max(0, width - (window[-1][1] - window[0][0]))
+        start = max(0, min(window[0][0] - slack // 2, len(text) - width))
+        return clip_snippet(text, start, start + width, window)
+
+    def _lexical_ranking(self, query: str, query_tokens: list[str]) -> list[int]:
         phrase = query.lower().strip()
+        query_set = set(query_tokens)
         scores = self.bm25.get_scores(query_tokens)
-        ranked: list[tuple[float, dict[str, Any]]] = []
-        for score, record in zip(scores, self.records, strict=True):
+        ranked: list[tuple[float, int]] = []
+        for position, (score, record) in enumerate(zip(scores, self.records, strict=True)):
             total = float(score)
             if phrase and phrase in record.lower_title:
                 total += 6.5
             elif phrase and phrase in record.lower_text:
                 total += 3.0
-            total += 0.15 * len(set(query_tokens) & record.token_set)
-            total += 0.2 * len(set(query_tokens) & record.title_tokens)
+            total += 0.15 * len(query_set & record.token_set)
+            total += 0.2 * len(query_set & record.title_tokens)
             if total > 0:
-                ranked.append((total, record.raw))
+                ranked.append((total, position))
         ranked.sort(key=lambda item: item[0], reverse=True)
-        return [raw for _, raw in ranked[:top_k]]
+        return [position for _, position in ranked]
+
+
+def token_matches(token: str, query_tokens: set[str]) -> bool:
+    if token in query_tokens:
+        return True
+    return any(len(query) >= PREFIX_MATCH_MIN and token.startswith(query) for query in query_tokens)
+
+
+def clip_snippet(text: str, start: int, end: int, highlights: list[tuple[int, int]]) -> Snippet:
+    """Trim a window to word boundaries and shift highlights to snippet-relative offsets."""
+    if start > 0:
+        boundary = text.find(" ", start, highlights[0][0] if highlights else end)
+        if boundary != -1:
+            start = boundary + 1
+    if end < len(text):
+        boundary = text.rfind(" ", highlights[-1][1] if highlights else start, end)
+        if boundary > start:
+            end = boundary
+    prefix = ELLIPSIS if start > 0 else ""
+    suffix = ELLIPSIS if end < len(text) else ""
+    shift = len(prefix) - start
+    kept = [(a + shift, b + shift) for a, b in highlights if a >= start and b <= end]
+    return Snippet(text=prefix + text[start:end] + suffix, highlights=kept)
+
+
+def reciprocal_rank_fusion(*rankings: list[int], k: int = RRF_K, weights: list[float] | None = None) -> list[int]:
+    """Fuse ranked position lists; ties keep the order of the earliest ranking."""
+    scores: dict[int, float] = {}
+    first_seen: dict[int, tuple[int, int]] = {}
+    for ranking_index, ranking in enumerate(rankings):
+        weight = weights[ranking_index] if weights else 1.0
+        for rank, position in enumerate(ranking):
+            scores[position] = scores.get(position, 0.0) + weight / (k + rank + 1)
+            first_seen.setdefault(position, (ranking_index, rank))
+    return sorted(scores, key=lambda position: (-scores[position], first_seen[position]))
@@ -24,6 +24,8 @@ class ChatHistoryTurn(BaseModel):
 class ChatRequest(BaseModel):
     message: str
     history: list[ChatHistoryTurn] = Field(default_factory=list)
+    session: bool = False
+    sessionId: str | None = None
 
     @field_validator("message")
     @classmethod
@@ -40,9 +42,12 @@ class Citation(BaseModel):
     kind: str | None = None
     title: str
     excerpt: str | None = None
+    highlights: list[tuple[int, int]] = Field(default_factory=list)
     sourcePath: str | None = None
     mediaUrl: str | None = None
     relatedDocIds: list[str] = Field(default_factory=list)
+    # Other entries carrying the same passage, collapsed into this citation's chunk at build time.
+    alsoIn: list[str] = Field(default_factory=list)
 
 
 class ChatResponse(BaseModel):
@@ -50,6 +55,23 @@ class ChatResponse(BaseModel):
     answer: str
     citations: list[Citation] = Field(default_factory=list)
     fallback: bool = False
+    sessionId: str | None = None
+    # The request's sessionId was unknown here; without history in the request there is no answer either.
+    sessionExpired: bool = False
+
+
+class RelatedItem(BaseModel):
+    id: str
+    refType: Literal["doc", "audio", "playlist"]
+    title: str
+    kind: str | None = None
+    score: float
+
+
+class RelatedResponse(BaseModel):
+    ok: bool = True
+    id: str
+    items: list[RelatedItem] = Field(default_factory=list)
 
 
 class StatusResponse(BaseModel):
@@ -7,9 +7,16 @@ from typing import Any
 
 import httpx
 
-from .retrieval import CorpusIndex
-from .schemas import ChatHistoryTurn, ChatResponse, Citation, StatusResponse
+from .debug import deep_sizeof, peak_rss_bytes
+from .dense import DenseVectors
+from .metrics import ServiceMetrics
+from .retrieval import RETRIEVAL_ENGINES, CorpusIndex
+from .schemas import ChatHistoryTurn, ChatResponse, Citation, RelatedItem, RelatedResponse, StatusResponse
+from .sessions import ConversationSession, SessionStore
 from .settings import Settings
+from .shadow import ShadowEvaluator
+from .startup import StartupTimings
+from .tracing import SPAN_KIND_CLIENT, Tracer
 
 logger = logging.getLogger(__name__)
 
@@ -31,18 +38,62 @@ class SiteContentError(RuntimeError):
 
 
 class ForkTalesService:
-    def __init__(self, settings: Settings) -> None:
+    def __init__(
+        self,
+        settings: Settings,
+        metrics: ServiceMetrics | None = None,
+        tracer: Tracer | None = None,
+        timings: StartupTimings | None = None,
+    ) -> None:
         self.settings = settings
+        self.metrics = metrics or ServiceMetrics()
+        self.tracer = tracer or Tracer(None, 0.0)
+        timings = timings or StartupTimings()
         self._site_root = settings.site_root
-        self._library = self._load_json(self.settings.content_root / "library.json")
-        self._corpus = self._load_json(self.settings.content_root / "corpus.json")
-        self._index = CorpusIndex(self._corpus)
+        with timings.phase("load_library"):
+            self._library = self._load_json(self.settings.content_root / "library.json")
+        with timings.phase("load_corpus"):
+            self._corpus = self._load_json(self.settings.content_root / "corpus.json")
+        shadow_engine = self.settings.fork_tales_shadow_engine
+        if shadow_engine is not None and shadow_engine not in RETRIEVAL_ENGINES:
+            raise ValueError(f"FORK_TALES_SHADOW_ENGINE must be one of {', '.join(RETRIEVAL_ENGINES)}")
+        self._engine = "hybrid" if self.settings.fork_tales_dense_enabled else "lexical"
+        dense = self.settings.fork_tales_dense_enabled or shadow_engine not in (None, "lexical")
+        with timings.phase("load_vectors"):
+            vectors = self._load_vectors(self.settings.content_root / "vectors.npz") if dense else None
+        with timings.phase("build_index"):
+            self._index = CorpusIndex(self._corpus, vectors, dense=dense)
+        self._shadow: ShadowEvaluator | None = None
+        if shadow_engine is not None and shadow_engine != self._engine and self.settings.fork_tales_shadow_fraction > 0:
+            self._shadow = ShadowEvaluator(
+                self._index,
+                shadow_engine,
+                fraction=self.settings.fork_tales_shadow_fraction,
+                top_k=self.settings.fork_tales_search_top_k,
+                max_pending=self.settings.fork_tales_shadow_max_pending,
+                metrics=self.metrics,
+            )
         self._docs_by_id = {item["id"]: item for item in self._library.get("docs", [])}
         self._audio_by_id = {item["id"]: item for item in self._library.get("audio", [])}
+        with timings.phase("load_related"):
+            self._related = self._load_related(self.settings.content_root / "related.json")
+        self._sessions = SessionStore(
+            max_sessions=self.settings.fork_tales_session_max,
+            ttl_seconds=self.settings.fork_tales_session_ttl_seconds,
+            max_turns=self.settings.fork_tales_max_history_turns,
+        )
         self._http = httpx.AsyncClient(timeout=self.settings.fork_tales_timeout_seconds)
 
+    def publish_gauges(self) -> None:
+        """Point the index and session gauges at this service; only the default site publishes."""
+        self.metrics.index_chunks.set(len(self._index.records))
+        self.metrics.index_vector_bytes.set(self._index.vectors.matrix.nbytes if self._index.vectors is not None else 0)
+        self.metrics.sessions.set_function(lambda: len(self._sessions))
+
     async def aclose(self) -> None:
         await self._http.aclose()
+        if self._shadow is not None:
+            self._shadow.close()
 
     def status(self) -> StatusResponse:
         return StatusResponse(
@@ -53,67 +104,177 @@ class ForkTalesService:
             generatedAt=self._library.get("generatedAt"),
         )
 
-    async def chat(self, message: str, history: list[ChatHistoryTurn]) -> ChatResponse:
-        chunks = self._index.search(message, top_k=self.settings.fork_tales_search_top_k)
-        citations = self._citations_from_chunks(chunks)
+    def related(self, item_id: str) -> RelatedResponse | None:
+        items = self._related.get(item_id)
+        self.metrics.cache_lookup("related", items is not None)
+        if items is None:
+            return None
+        return RelatedResponse(id=item_id, items=items)
+
+    def memory_breakdown(self) -> dict[str, int]:
+        seen: set[int] = set()
+        components = {
+            "library": self._library,
+            "corpus": self._corpus,
+            "index": self._index,
+            "related": self._related,
+            "sessions": self._sessions.snapshot(),
+        }
+        breakdown = {name: deep_sizeof(value, seen) for name, value in components.items()}
+        breakdown["peakRss"] = peak_rss_bytes()
+        return breakdown
+
+    async def chat(
+        self,
+        message: str,
+        history: list[ChatHistoryTurn],
+        *,
+        session_id: str | None = None,
+        start_session: bool = False,
+    ) -> ChatResponse:
+        session, expired = self._resolve_session(session_id, start_session, history)
+        if expired and session is None:
+            # Nothing to rebuild the conversation from, so the client resends its own history instead.
+            return ChatResponse(answer="", sessionExpired=True)
+        if session is not None:
+            history = session.history
+        carry = session.chunks if session is not None else None
+        with self.metrics.stage("retrieval"), self.tracer.span("search", carried=len(carry or [])) as span:
+            chunks = self._index.search(message, top_k=self.settings.fork_tales_search_top_k, carry=carry, engine=self._engine)
+            if span is not None:
+                span.set_attribute("chunks", len(chunks))
+        if self._shadow is not None:
+            self._shadow.submit(message, carry, chunks)
+        with self.metrics.stage("citations"), self.tracer.span("citations"):
+            citations = self._citations_from_chunks(chunks, message)
+        response = await self._answer(message, citations, history)
+        self.metrics.chat_responses.labels("fallback" if response.fallback else "live").inc()
+        if session is not None:
+            self._sessions.record_turn(session, message, response.answer, chunks)
+            response.sessionId = session.id
+        response.sessionExpired = expired
+        return response
+
+    async def _answer(self, message: str, citations: list[Citation], history: list[ChatHistoryTurn]) -> ChatResponse:
         if self.settings.provider_configured:
             try:
                 answer = await self._chat_live(message, citations, history)
                 return ChatResponse(answer=answer, citations=citations, fallback=False)
             except Exception as exc:  # noqa: BLE001
                 logger.exception("fork tales provider request failed")
+                self.metrics.fallbacks.labels("provider_error").inc()
                 answer = self._fallback_answer(message=message, citations=citations, error=str(exc))
                 return ChatResponse(answer=answer, citations=citations, fallback=True)
+        self.metrics.fallbacks.labels("offline").inc()
         return ChatResponse(answer=self._fallback_answer(message=message, citations=citations, error=None), citations=citations, fallback=True)
 
+    def _resolve_session(
+        self,
+        session_id: str | None,
+        start_session: bool,
+        history: list[ChatHistoryTurn],
+    ) -> tuple[ConversationSession | None, bool]:
+        """The turn's session and whether `session_id` named one this process no longer has.
+
+        Sessions live in this process only, so an id also misses after a
+        restart or on another worker. A missed id continues in a fresh session
+        seeded from the history the client sent, or in none if it sent none.
+        """
+        if session_id:
+            session = self._sessions.get(session_id)
+            self.metrics.cache_lookup("session", session is not None)
+            if session is not None:
+                return session, False
+            return (self._sessions.create(history) if history else None), True
+        if start_session:
+            return self._sessions.create(history), False
+        return None, False
+
     def _load_json(self, path: Path) -> dict[str, Any] | list[dict[str, Any]]:
         if not path.exists():
             raise SiteContentError(f"Missing site content: {path}")
         return json.loads(path.read_text(encoding="utf-8"))
 
-    def _citations_from_chunks(self, chunks: list[dict[str, Any]]) -> list[Citation]:
+    def _load_related(self, path: Path) -> dict[str, list[RelatedItem]]:
+        if not path.exists():
+            return {}
+        graph = self._load_json(path)
+        return {item_id: [RelatedItem.model_validate(item) for item in items] for item_id, items in graph.items()}
+
+    def _load_vectors(self, path: Path) -> DenseVectors | None:
+        if not path.exists():
+            return None
+        try:
+            return DenseVectors.load(path)
+        except (OSError, ValueError, KeyError):
+            logger.warning("ignoring unreadable dense vectors at %s; rebuilding in memory", path)
+            return None
+
+    def _citations_from_chunks(self, chunks: list[dict[str, Any]], query: str) -> list[Citation]:
         citations: list[Citation] = []
         seen: set[str] = set()
         for chunk in chunks:
-            ref_id = str(chunk.get("refId"))
-            if ref_id in seen:
-                continue
-            seen.add(ref_id)
-            ref_type = str(chunk.get("refType"))
-            source = self._docs_by_id.get(ref_id) if ref_type == "doc" else self._audio_by_id.get(ref_id)
-            if not source:
+            # The build collapses near-duplicate chunks into one that lists every entry it came from;
+            # the first is cited and the rest are named on it, so one passage is one citation.
+            sources: list[tuple[str, str, dict[str, Any]]] = []
+            for ref_type, ref_id in chunk.get("refs") or [(chunk.get("refType"), chunk.get("refId"))]:
+                ref_id, ref_type = str(ref_id), str(ref_type)
+                if ref_id in seen:
+                    continue
+                seen.add(ref_id)
+                source = self._docs_by_id.get(ref_id) if ref_type == "doc" else self._audio_by_id.get(ref_id)
+                if source:
+                    sources.append((ref_type, ref_id, source))
+            if not sources:
                 continue
+            ref_type, ref_id, source = sources[0]
+            snippet = self._index.snippet(chunk, query, self.settings.fork_tales_snippet_chars)
             citations.append(
                 Citation(
                     id=ref_id,
                     refType=ref_type if ref_type == "audio" else "doc",
                     kind=source.get("kind"),
                     title=str(source.get("title", ref_id)),
-                    excerpt=chunk.get("text"),
+                    excerpt=snippet.text,
+                    highlights=snippet.highlights,
                     sourcePath=source.get("sourcePath"),
                     mediaUrl=source.get("mediaUrl"),
                     relatedDocIds=list(source.get("relatedDocIds", [])),
+                    alsoIn=[other_id for _, other_id, _ in sources[1:]],
                 )
             )
             if len(citations) >= 6:
-                break
+                return citations
         return citations
 
     async def _chat_live(self, message: str, citations: list[Citation], history: list[ChatHistoryTurn]) -> str:
-        payload = {
-            "model": self.settings.fork_tales_model,
-            "temperature": self.settings.fork_tales_temperature,
-            "max_tokens": self.settings.fork_tales_max_tokens,
-            "messages": self._build_messages(message, citations, history),
-        }
-        response = await self._http.post(
-            self.settings.chat_completions_url,
-            json=payload,
-            headers={
+        with self.tracer.span("chat_live", model=self.settings.fork_tales_model):
+            return await self._chat_live_request(message, citations, history)
+
+    async def _chat_live_request(self, message: str, citations: list[Citation], history: list[ChatHistoryTurn]) -> str:
+        with self.metrics.stage("prompt"):
+            payload = {
+                "model": self.settings.fork_tales_model,
+                "temperature": self.settings.fork_tales_temperature,
+                "max_tokens": self.settings.fork_tales_max_tokens,
+                "messages": self._build_messages(message, citations, history),
+            }
+        url = self.settings.chat_completions_url
+        with self.metrics.stage("provider"), self.tracer.span("POST chat.completions", kind=SPAN_KIND_CLIENT, **{"http.url": url}) as span:
+            headers = {
                 "Authorization": f"Bearer {self.settings.provider_api_key}",
                 "Content-Type": "application/json",
-            },
-        )
+            }
+            if span is not None:
+                headers["traceparent"] = span.traceparent
+            try:
+                response = await self._http.post(url, json=payload, headers=headers)
+            except httpx.HTTPError:
+                self.metrics.provider_responses.labels("error").inc()
+                raise
+            if span is not None:
+                span.set_attribute("http.status_code", response.status_code)
+        self.metrics.provider_responses.labels(str(response.status_code)).inc()
         if response.status_code >= 400:
             raise RuntimeError(f"provider HTTP {response.status_code}: {response.text}")
         raw = response.json()
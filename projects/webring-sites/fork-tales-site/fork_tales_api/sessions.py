@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from .schemas import ChatHistoryTurn
+
+
+@dataclass
+class ConversationSession:
+    id: str
+    expires_at: float
+    history: list[ChatHistoryTurn] = field(default_factory=list)
+    chunks: list[dict[str, Any]] = field(default_factory=list)
+
+
+class SessionStore:
+    """Size-bounded, TTL-evicted in-memory conversation store.
+
+    Sessions are kept in LRU order; every access refreshes the TTL and moves the
+    session to the back, so eviction under pressure drops the idlest sessions.
+    A lock guards the order so other threads can take a `snapshot()`.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_sessions: int,
+        ttl_seconds: float,
+        max_turns: int,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_turns = max_turns
+        self._clock = clock
+        self._sessions: OrderedDict[str, ConversationSession] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id: str) -> ConversationSession | None:
+        now = self._clock()
+        with self._lock:
+            self._evict_expired(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            session.expires_at = now + self.ttl_seconds
+            self._sessions.move_to_end(session_id)
+        return session
+
+    def create(self, history: list[ChatHistoryTurn] | None = None) -> ConversationSession:
+        now = self._clock()
+        session = ConversationSession(
+            id=secrets.token_urlsafe(16),
+            expires_at=now + self.ttl_seconds,
+            history=list(history or [])[-self.max_turns :],
+        )
+        with self._lock:
+            self._evict_expired(now)
+            while len(self._sessions) >= self.max_sessions:
+                self._sessions.popitem(last=False)
+            self._sessions[session.id] = session
+        return session
+
+    def snapshot(self) -> list[ConversationSession]:
+        """The live sessions in LRU order, copied so they can be walked off the event loop."""
+        with self._lock:
+            return list(self._sessions.values())
+
+    def record_turn(self, session: ConversationSession, message: str, answer: str, chunks: list[dict[str, Any]]) -> None:
+        session.history = [
+            *session.history,
+            ChatHistoryTurn(role="user", content=message),
+            ChatHistoryTurn(role="assistant", content=answer),
+        ][-self.max_turns :]
+        session.chunks = chunks
+
+    def _evict_expired(self, now: float) -> None:
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if oldest.expires_at > now:
+                break
+            self._sessions.popitem(last=False)
@@ -34,10 +34,31 @@ class Settings(BaseSettings):
     )
 
     fork_tales_site_root: Path = PROJECT_ROOT / "dist"
+    fork_tales_background_load: bool = False
+    fork_tales_sites: dict[str, Path] = {}
+    fork_tales_site_hosts: dict[str, str] = {}
+    fork_tales_site_memory_budget_mb: int = 1024
     fork_tales_model: str = "glm-5-turbo"
     fork_tales_timeout_seconds: float = 45.0
     fork_tales_search_top_k: int = 8
+    fork_tales_dense_enabled: bool = True
+    fork_tales_shadow_engine: str | None = None
+    fork_tales_shadow_fraction: float = 0.0
+    fork_tales_shadow_max_pending: int = 4
+    fork_tales_snippet_chars: int = 280
     fork_tales_max_history_turns: int = 6
+    fork_tales_session_max: int = 2048
+    fork_tales_session_ttl_seconds: float = 1800.0
+    fork_tales_metrics_enabled: bool = True
+    fork_tales_admin_token: str | None = None
+    fork_tales_trace_path: Path | None = None
+    fork_tales_trace_sample_ratio: float = 1.0
+    fork_tales_capture_path: Path | None = None
+    fork_tales_capture_sample_ratio: float = 1.0
+    fork_tales_capture_max_bytes: int = 64 * 1024 * 1024
+    fork_tales_capture_backups: int = 5
+    fork_tales_profile_interval_seconds: float = 0.005
+    fork_tales_profile_max_seconds: int = 60
     fork_tales_temperature: float = 0.88
     fork_tales_max_tokens: int = 650
 
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from .metrics import ServiceMetrics
+from .retrieval import CorpusIndex
+
+logger = logging.getLogger(__name__)
+
+RBO_PERSISTENCE = 0.9
+
+
+def jaccard(left: list[str], right: list[str]) -> float:
+    a, b = set(left), set(right)
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def rank_biased_overlap(left: list[str], right: list[str], p: float = RBO_PERSISTENCE) -> float:
+    """Extrapolated RBO (Webber et al. 2010, eq. 32), which also covers lists of different lengths.
+
+    Top ranks weigh most; identical lists score 1.0 and disjoint lists 0.0.
+    Past the end of the shorter list its agreement is assumed to hold, so a
+    list that is a prefix of the other also scores 1.0.
+    """
+    short, long = sorted((left, right), key=len)
+    s, l = len(short), len(long)
+    if s == 0:
+        return 1.0 if l == 0 else 0.0
+    seen_short: set[str] = set()
+    seen_long: set[str] = set()
+    overlap = 0
+    overlap_at_s = 0
+    weighted = 0.0
+    for d in range(1, l + 1):
+        a = short[d - 1] if d <= s else None
+        b = long[d - 1]
+        if a == b:
+            overlap += 1
+        else:
+            overlap += a is not None and a in seen_long
+            overlap += b in seen_short
+        if a is not None:
+            seen_short.add(a)
+        seen_long.add(b)
+        if d == s:
+            overlap_at_s = overlap
+        weighted += (overlap / d) * p**d
+        if d > s:
+            # The short list's unseen items are credited at its observed agreement.
+            weighted += overlap_at_s * (d - s) / (s * d) * p**d
+    return ((overlap - overlap_at_s) / l + overlap_at_s / s) * p**l + (1 - p) / p * weighted
+
+
+class ShadowEvaluator:
+    """Re-run a sampled fraction of live searches through a candidate engine and record how it compares.
+
+    Shadow searches run on one worker thread with a bounded backlog, so a slow
+    candidate sheds samples (counted as `dropped`) instead of queueing work
+    behind live traffic. Nothing here can change a live response.
+    """
+
+    def __init__(
+        self,
+        index: CorpusIndex,
+        engine: str,
+        *,
+        fraction: float,
+        top_k: int,
+        max_pending: int,
+        metrics: ServiceMetrics,
+    ) -> None:
+        self.index = index
+        self.engine = engine
+        self.fraction = fraction
+        self.top_k = top_k
+        self.max_pending = max_pending
+        self.metrics = metrics
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fork-tales-shadow")
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, query: str, carry: list[dict[str, Any]] | None, live: list[dict[str, Any]]) -> asyncio.Future[None] | None:
+        if self.fraction <= 0 or (self.fraction < 1.0 and random.random() >= self.fraction):
+            return None
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.metrics.shadow_runs.labels(self.engine, "dropped").inc()
+                return None
+            self._pending += 1
+        live_ids = [str(chunk.get("id")) for chunk in live]
+        return asyncio.get_running_loop().run_in_executor(self._executor, self._evaluate, query, carry, live_ids)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _evaluate(self, query: str, carry: list[dict[str, Any]] | None, live_ids: list[str]) -> None:
+        try:
+            started = time.perf_counter()
+            shadow = self.index.search(query, top_k=self.top_k, carry=carry, engine=self.engine)
+            self.metrics.shadow_seconds.labels(self.engine).observe(time.perf_counter() - started)
+            shadow_ids = [str(chunk.get("id")) for chunk in shadow]
+            self.metrics.shadow_overlap.labels(self.engine, "jaccard").observe(jaccard(live_ids, shadow_ids))
+            self.metrics.shadow_overlap.labels(self.engine, "rbo").observe(rank_biased_overlap(live_ids, shadow_ids))
+            self.metrics.shadow_runs.labels(self.engine, "ok").inc()
+        except Exception:  # noqa: BLE001
+            logger.exception("shadow search with engine %s failed", self.engine)
+            self.metrics.shadow_runs.labels(self.engine, "error").inc()
+        finally:
+            with self._lock:
+                self._pending -= 1
@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import resource
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable
+
+from fastapi.staticfiles import StaticFiles
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .metrics import ServiceMetrics
+
+if TYPE_CHECKING:
+    from .service import ForkTalesService
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SITE = "default"
+SITE_PREFIX = "/sites/"
+SITE_SCOPE_KEY = "fork_tales.site"
+CONTENT_FILES = ("library.json", "corpus.json", "vectors.npz", "related.json")
+
+
+def current_rss_bytes() -> int:
+    try:
+        pages = int(Path("/proc/self/statm").read_text().split()[1])
+    except (OSError, IndexError, ValueError):
+        return 0
+    return pages * resource.getpagesize()
+
+
+def content_bytes(site_root: Path) -> int:
+    total = 0
+    for name in CONTENT_FILES:
+        try:
+            total += (site_root / "content" / name).stat().st_size
+        except OSError:
+            continue
+    return total
+
+
+@dataclass(eq=False)
+class LoadedSite:
+    name: str
+    service: ForkTalesService
+    retained_bytes: int
+    leases: int = 0
+    evicted: bool = False
+
+
+class SiteRegistry:
+    """Services for the extra sites, loaded on first request and evicted least-recently-used over a memory budget.
+
+    Retained size is the RSS growth across a site's load (loads are serialized so
+    the delta belongs to one site), floored at the size of its content files.
+    An evicted site is closed once its last in-flight request releases it.
+    """
+
+    def __init__(
+        self,
+        roots: dict[str, Path],
+        load: Callable[[Path], ForkTalesService],
+        *,
+        budget_bytes: int,
+        metrics: ServiceMetrics,
+    ) -> None:
+        self.roots = roots
+        self.budget_bytes = budget_bytes
+        self.metrics = metrics
+        self._load = load
+        self._sites: OrderedDict[str, LoadedSite] = OrderedDict()
+        self._load_lock = asyncio.Lock()
+        metrics.sites_loaded.set_function(lambda: len(self._sites))
+        metrics.sites_resident_bytes.set_function(lambda: self.resident_bytes)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self.roots
+
+    @property
+    def resident_bytes(self) -> int:
+        return sum(site.retained_bytes for site in self._sites.values())
+
+    def loaded(self) -> list[str]:
+        return list(self._sites)
+
+    async def acquire(self, name: str) -> LoadedSite:
+        site = self._sites.get(name)
+        if site is None:
+            if name not in self.roots:
+                raise KeyError(name)
+            async with self._load_lock:
+                site = self._sites.get(name)
+                if site is None:
+                    try:
+                        site = await asyncio.to_thread(self._load_site, name)
+                    except Exception:
+                        self.metrics.site_loads.labels("error").inc()
+                        raise
+                    self.metrics.site_loads.labels("ok").inc()
+                    self._sites[name] = site
+                    await self._evict_over_budget(keep=name)
+        self._sites.move_to_end(name)
+        site.leases += 1
+        return site
+
+    async def release(self, site: LoadedSite) -> None:
+        site.leases -= 1
+        if site.evicted and site.leases == 0:
+            await site.service.aclose()
+
+    async def aclose(self) -> None:
+        sites = list(self._sites.values())
+        self._sites.clear()
+        for site in sites:
+            await site.service.aclose()
+
+    def _load_site(self, name: str) -> LoadedSite:
+        root = self.roots[name]
+        before = current_rss_bytes()
+        service = self._load(root)
+        retained = max(current_rss_bytes() - before, content_bytes(service.settings.site_root))
+        logger.info("loaded site %s from %s (~%d MiB)", name, root, retained // (1024 * 1024))
+        return LoadedSite(name=name, service=service, retained_bytes=retained)
+
+    async def _evict_over_budget(self, keep: str) -> None:
+        while self.resident_bytes > self.budget_bytes:
+            victim = next((name for name in self._sites if name != keep), None)
+            if victim is None:
+                break
+            site = self._sites.pop(victim)
+            site.evicted = True
+            self.metrics.site_evictions.inc()
+            logger.info("evicted site %s (~%d MiB)", victim, site.retained_bytes // (1024 * 1024))
+            if site.leases == 0:
+                await site.service.aclose()
+
+
+class SiteRouterMiddleware:
+    """Tag each request with the site it belongs to, by `/sites/<name>/` prefix or by Host header.
+
+    A prefix match moves the prefix into `root_path`, so routing and static
+    files see the same paths as on the default site.
+    """
+
+    def __init__(self, app: ASGIApp, sites: set[str], hosts: dict[str, str]) -> None:
+        self.app = app
+        self.sites = sites
+        self.hosts = {host.lower(): site for host, site in hosts.items()}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        scope = dict(scope)
+        site = DEFAULT_SITE
+        path: str = scope["path"]
+        root_path: str = scope.get("root_path", "")
+        local = path[len(root_path) :] if root_path and path.startswith(root_path) else path
+        if local.startswith(SITE_PREFIX):
+            name = local[len(SITE_PREFIX) :].split("/", 1)[0]
+            if name in self.sites:
+                site = name
+                scope["root_path"] = f"{root_path}{SITE_PREFIX}{name}"
+        if site == DEFAULT_SITE:
+            for key, value in scope["headers"]:
+                if key == b"host":
+                    site = self.hosts.get(value.decode("latin-1").lower().partition(":")[0], DEFAULT_SITE)
+                    break
+        scope[SITE_SCOPE_KEY] = site
+        await self.app(scope, receive, send)
+
+
+class SiteStaticFiles:
+    """Serve each site's static shell from its own root."""
+
+    def __init__(self, roots: dict[str, Path]) -> None:
+        self._apps = {name: StaticFiles(directory=root, html=True) for name, root in roots.items()}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self._apps[scope.get(SITE_SCOPE_KEY, DEFAULT_SITE)](scope, receive, send)
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+# Taken when the package is first imported, so the import cost of the app itself is reported too.
+PACKAGE_IMPORTED_AT = time.perf_counter()
+_import_seconds: float | None = None
+_import_claimed = False
+
+
+def mark_imported() -> None:
+    """Close the import phase; called once the app module has finished importing."""
+    global _import_seconds
+    if _import_seconds is None:
+        _import_seconds = time.perf_counter() - PACKAGE_IMPORTED_AT
+
+
+def claim_import_seconds() -> float:
+    """The package's import time for the first app created in this process; apps created later paid none."""
+    global _import_claimed
+    if _import_claimed or _import_seconds is None:
+        return 0.0
+    _import_claimed = True
+    return _import_seconds
+
+
+class StartupTimings:
+    """Wall-clock seconds per startup phase, in the order the phases ran."""
+
+    def __init__(self, import_seconds: float = 0.0) -> None:
+        # `total` runs from the start of this app's import, or from its `create_app` when the import was paid earlier.
+        self.started = time.perf_counter() - import_seconds
+        self.phases: dict[str, float] = {"import": round(import_seconds, 6)}
+        self.error: str | None = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.phases[name] = round(self.phases.get(name, 0.0) + seconds, 6)
+
+    def mark_ready(self) -> None:
+        self.record("total", time.perf_counter() - self.started)
+        self._ready.set()
+
+    def mark_failed(self, error: BaseException) -> None:
+        self.error = f"{type(error).__name__}: {error}"
+
+    def snapshot(self) -> dict[str, float]:
+        with self._lock:
+            return dict(self.phases)
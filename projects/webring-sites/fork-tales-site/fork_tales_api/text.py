@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+import re
+
+TOKEN_RE = re.compile(r"[\w\-一-龯ぁ-ゟァ-ヿ]+", re.UNICODE)
+# TOKEN_RE for JavaScript's `u` flag: Python's `\w` is exactly `[\p{L}\p{N}_]`. The build ships it in
+# search-index.json so the browser splits queries the way the index was built.
+TOKEN_PATTERN_JS = r"[\p{L}\p{N}_\-一-龯ぁ-ゟァ-ヿ]+"
+
+
+def tokenize(text: str) -> list[str]:
+    return [token.lower() for token in TOKEN_RE.findall(text) if len(token) > 1]
+
+
+def tokenize_spans(text: str) -> list[tuple[str, int, int]]:
+    return [
+        (match.group(0).lower(), match.start(), match.end())
+        for match in TOKEN_RE.finditer(text)
+        if match.end() - match.start() > 1
+    ]
@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import json
+import queue
+import random
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Iterator
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+SCOPE_NAME = "fork_tales_api"
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "status", "status_message")
+
+    def __init__(self, trace_id: str, parent_id: str | None, name: str, kind: int, attributes: dict[str, Any]) -> None:
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.status = STATUS_OK
+        self.status_message = ""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_otlp(self) -> dict[str, Any]:
+        payload: dict[str, Any] = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [otlp_attribute(key, value) for key, value in self.attributes.items()],
+            "status": {"code": self.status, **({"message": self.status_message} if self.status_message else {})},
+        }
+        if self.parent_id:
+            payload["parentSpanId"] = self.parent_id
+        return payload
+
+
+class _Trace:
+    __slots__ = ("spans",)
+
+    def __init__(self) -> None:
+        self.spans: list[Span] = []
+
+
+_UNSAMPLED = object()
+_current: ContextVar[tuple[_Trace, Span] | object | None] = ContextVar("fork_tales_span", default=None)
+
+
+def otlp_attribute(key: str, value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        wrapped = {"boolValue": value}
+    elif isinstance(value, int):
+        wrapped = {"intValue": str(value)}
+    elif isinstance(value, float):
+        wrapped = {"doubleValue": value}
+    else:
+        wrapped = {"stringValue": str(value)}
+    return {"key": key, "value": wrapped}
+
+
+class JsonlSpanExporter:
+    """Append one OTLP/JSON `ExportTraceServiceRequest` per finished trace to a local file.
+
+    Writes happen on a daemon thread so request handlers only pay for a queue put.
+    """
+
+    def __init__(self, path: Path, service_name: str) -> None:
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._resource = {"attributes": [otlp_attribute("service.name", service_name)]}
+        self._queue: queue.SimpleQueue[list[Span] | None] = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._drain, name="fork-tales-trace-writer", daemon=True)
+        self._writer.start()
+
+    def export(self, spans: list[Span]) -> None:
+        self._queue.put(spans)
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._writer.join(timeout=5)
+
+    def _drain(self) -> None:
+        with self.path.open("a", encoding="utf-8") as handle:
+            while True:
+                spans = self._queue.get()
+                if spans is None:
+                    return
+                record = {
+                    "resourceSpans": [
+                        {
+                            "resource": self._resource,
+                            "scopeSpans": [{"scope": {"name": SCOPE_NAME}, "spans": [span.to_otlp() for span in spans]}],
+                        }
+                    ]
+                }
+                handle.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+                if self._queue.empty():
+                    handle.flush()
+
+
+class Tracer:
+    """Minimal OpenTelemetry-shaped tracer with head sampling at the root span.
+
+    Children of an unsampled root are no-ops, so untraced requests pay one
+    context-variable lookup per span.
+    """
+
+    def __init__(self, exporter: JsonlSpanExporter | None, sample_ratio: float) -> None:
+        self.exporter = exporter
+        self.sample_ratio = sample_ratio
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None and self.sample_ratio > 0
+
+    @contextmanager
+    def span(self, name: str, *, kind: int = SPAN_KIND_INTERNAL, **attributes: Any) -> Iterator[Span | None]:
+        current = _current.get()
+        if current is _UNSAMPLED:
+            yield None
+            return
+        if current is None and not self._sample():
+            token = _current.set(_UNSAMPLED)
+            try:
+                yield None
+            finally:
+                _current.reset(token)
+            return
+
+        if current is None:
+            trace, parent_id, trace_id = _Trace(), None, secrets.token_hex(16)
+        else:
+            trace, parent = current  # type: ignore[misc]
+            parent_id, trace_id = parent.span_id, parent.trace_id
+        span = Span(trace_id, parent_id, name, kind, attributes)
+        token = _current.set((trace, span))
+        try:
+            yield span
+        except BaseException as exc:
+            span.status = STATUS_ERROR
+            span.status_message = f"{type(exc).__name__}: {exc}"
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            _current.reset(token)
+            trace.spans.append(span)
+            if parent_id is None and self.exporter is not None:
+                self.exporter.export(trace.spans)
+
+    def close(self) -> None:
+        if self.exporter is not None:
+            self.exporter.close()
+
+    def _sample(self) -> bool:
+        return self.enabled and (self.sample_ratio >= 1.0 or random.random() < self.sample_ratio)
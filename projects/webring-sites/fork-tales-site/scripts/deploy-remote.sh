@@ -70,6 +70,7 @@ sync_payload() {
     --exclude '/__pycache__/' \
     --exclude '/.pytest_cache/' \
     --exclude '/dist/' \
+    --exclude '/.build-cache/' \
     --exclude '/.env' \
     --exclude '/*.log' \
     "$ROOT_DIR/" "$REMOTE:$REMOTE_DEPLOY_PATH/"
@@ -192,16 +193,19 @@ DEPLOY_SERVICE_NAME="$3"
 DEPLOY_HEALTH_TIMEOUT_SECONDS="$4"
 cd "$DEPLOY_PATH"
 deadline=$(( $(date +%s) + DEPLOY_HEALTH_TIMEOUT_SECONDS ))
+# The container healthcheck only probes /healthz; the deploy also waits for the index to load.
+ready_probe="import urllib.request; urllib.request.urlopen('http://127.0.0.1:8080/readyz', timeout=5)"
 while true; do
   container_id="$(docker compose --project-name "$DEPLOY_COMPOSE_PROJECT_NAME" -f compose.yaml ps -q "$DEPLOY_SERVICE_NAME")"
   if [[ -n "$container_id" ]]; then
     health="$(docker inspect --format '{{if .State.Health}}{{.State.Health.Status}}{{else}}{{.State.Status}}{{end}}' "$container_id" 2>/dev/null || true)"
-    if [[ "$health" == "healthy" || "$health" == "running" ]]; then
+    if [[ "$health" == "healthy" || "$health" == "running" ]] &&
+      docker compose --project-name "$DEPLOY_COMPOSE_PROJECT_NAME" -f compose.yaml exec -T "$DEPLOY_SERVICE_NAME" python -c "$ready_probe" >/dev/null 2>&1; then
       exit 0
     fi
   fi
   if (( $(date +%s) >= deadline )); then
-    echo "fork tales remote deploy health check timed out" >&2
+    echo "fork tales remote deploy health/readiness check timed out" >&2
     docker compose --project-name "$DEPLOY_COMPOSE_PROJECT_NAME" -f compose.yaml ps >&2 || true
     docker compose --project-name "$DEPLOY_COMPOSE_PROJECT_NAME" -f compose.yaml logs --tail=200 >&2 || true
     exit 1
@@ -8,7 +8,11 @@ const state = {
   currentFilter: 'all',
   currentPlaylistId: 'all',
   search: '',
+  searchHits: new Set(),
+  searchIndex: null,
+  searchIndexPromise: null,
   chatHistory: [],
+  sessionId: null,
   latestCitations: [],
   ambientTimer: null,
   audioAnalyser: null,
@@ -56,6 +60,8 @@ const elements = {
 };
 
 const ctx = elements.visualizer.getContext('2d');
+// fork_tales_api.text.TOKEN_PATTERN_JS; search-index.json carries the build's own copy as `tokenPattern`.
+const SEARCH_TOKEN_PATTERN = '[\\p{L}\\p{N}_\\-一-龯ぁ-ゟァ-ヿ]+';
 
 function prettyKind(kind) {
   return String(kind || 'signal').replace(/-/g, ' ');
@@ -70,6 +76,18 @@ function escapeHtml(value) {
     .replaceAll("'", '&#39;');
 }
 
+function highlightExcerpt(text, highlights) {
+  const value = String(text || '');
+  let cursor = 0;
+  let html = '';
+  for (const [start, end] of highlights || []) {
+    if (start < cursor || end > value.length) continue;
+    html += `${escapeHtml(value.slice(cursor, start))}<mark>${escapeHtml(value.slice(start, end))}</mark>`;
+    cursor = end;
+  }
+  return html + escapeHtml(value.slice(cursor));
+}
+
 function summarizePath(path) {
   const parts = String(path || '').split('/');
   return parts.slice(-3).join('/');
@@ -92,6 +110,101 @@ async function loadLibrary() {
   }
 }
 
+function tokenizeQuery(text, tokenRe) {
+  // Like the Python tokenizer: match before lowercasing and count code points, not UTF-16 units.
+  return (String(text || '').match(tokenRe) || [])
+    .filter((token) => [...token].length > 1)
+    .map((token) => token.toLowerCase());
+}
+
+function decodeSearchIndex(raw) {
+  const lengths = Float32Array.from(raw.norms, (quantized) => 2 ** (quantized / raw.normScale) - 1);
+  const totalLength = lengths.reduce((sum, value) => sum + value, 0);
+  return {
+    refs: raw.refs,
+    postings: raw.postings,
+    tokenRe: new RegExp(raw.tokenPattern || SEARCH_TOKEN_PATTERN, 'gu'),
+    termIndex: new Map(raw.terms.map((term, index) => [term, index])),
+    lengths,
+    avgLength: totalLength / Math.max(1, lengths.length),
+  };
+}
+
+async function loadSearchIndex() {
+  if (state.searchIndex) return state.searchIndex;
+  if (!state.searchIndexPromise) {
+    state.searchIndexPromise = fetch('content/search-index.json')
+      .then((response) => {
+        if (!response.ok) throw new Error(`search index load failed: ${response.status}`);
+        return response.json();
+      })
+      .then(decodeSearchIndex)
+      .catch((error) => {
+        state.searchIndexPromise = null;
+        throw error;
+      });
+  }
+  state.searchIndex = await state.searchIndexPromise;
+  return state.searchIndex;
+}
+
+function searchOffline(index, query, limit = 12) {
+  const scores = new Map();
+  const total = index.refs.length;
+  for (const token of new Set(tokenizeQuery(query, index.tokenRe))) {
+    const termId = index.termIndex.get(token);
+    if (termId === undefined) continue;
+    const postings = index.postings[termId];
+    const df = postings.length / 2;
+    const idf = Math.log(1 + (total - df + 0.5) / (df + 0.5));
+    let doc = 0;
+    for (let cursor = 0; cursor < postings.length; cursor += 2) {
+      doc += postings[cursor];
+      const tf = postings[cursor + 1];
+      const norm = 0.25 + 0.75 * (index.lengths[doc] / index.avgLength);
+      scores.set(doc, (scores.get(doc) || 0) + (idf * tf * 2.2) / (tf + 1.2 * norm));
+    }
+  }
+  return [...scores.entries()]
+    .sort((left, right) => right[1] - left[1])
+    .slice(0, limit)
+    .map(([doc, score]) => ({ refType: index.refs[doc][0], id: index.refs[doc][1], score }));
+}
+
+async function refreshSearchHits() {
+  const query = state.search;
+  if (!query) {
+    state.searchHits = new Set();
+    return;
+  }
+  try {
+    const index = await loadSearchIndex();
+    if (query !== state.search) return;
+    state.searchHits = new Set(searchOffline(index, query, 64).map((hit) => hit.id));
+    renderLists();
+  } catch (error) {
+    console.warn(error);
+  }
+}
+
+async function offlineCitations(query) {
+  const index = await loadSearchIndex();
+  return searchOffline(index, query, 6)
+    .map((hit) => {
+      const item = hit.refType === 'audio' ? state.audioById.get(hit.id) : state.docsById.get(hit.id);
+      if (!item) return null;
+      return {
+        id: item.id,
+        refType: hit.refType,
+        kind: item.kind,
+        title: item.title,
+        excerpt: item.excerpt,
+        sourcePath: item.sourcePath,
+      };
+    })
+    .filter(Boolean);
+}
+
 function initStats() {
   const counts = state.library.counts || {};
   const stats = [
@@ -163,7 +276,7 @@ function matchesDocFilter(doc) {
   if (state.currentFilter !== 'all' && doc.kind !== state.currentFilter) return false;
   if (!state.search) return true;
   const haystack = `${doc.title}\n${doc.excerpt}\n${doc.sourcePath}`.toLowerCase();
-  return haystack.includes(state.search);
+  return haystack.includes(state.search) || state.searchHits.has(doc.id);
 }
 
 function matchesTrackFilter(track) {
@@ -173,7 +286,7 @@ function matchesTrackFilter(track) {
   }
   if (!state.search) return true;
   const haystack = `${track.title}\n${track.excerpt}\n${track.collectionTitle}\n${(track.tags || []).join(' ')}`.toLowerCase();
-  return haystack.includes(state.search);
+  return haystack.includes(state.search) || state.searchHits.has(track.id);
 }
 
 function renderLists() {
@@ -226,6 +339,14 @@ function selectDoc(docId, scroll = false) {
   }
 }
 
+function playableMediaUrl(track) {
+  // HLS plays natively in Safari and most mobile browsers; elsewhere use the progressive fallback rendition.
+  if (track.mediaFallbackUrl && !elements.audioPlayer.canPlayType('application/vnd.apple.mpegurl')) {
+    return track.mediaFallbackUrl;
+  }
+  return track.mediaUrl;
+}
+
 function selectTrack(trackId, autoplay = false) {
   const track = state.audioById.get(trackId);
   if (!track) return;
@@ -233,7 +354,7 @@ function selectTrack(trackId, autoplay = false) {
   elements.trackCollection.textContent = track.collectionTitle || track.collection;
   elements.trackTitle.textContent = track.title;
   elements.trackExcerpt.textContent = track.excerpt || 'Signal held in playable form.';
-  elements.audioPlayer.src = track.mediaUrl;
+  elements.audioPlayer.src = playableMediaUrl(track);
   elements.audioPlayer.dataset.trackId = track.id;
   if (track.artUrl) {
     elements.coverArt.src = track.artUrl;
@@ -370,16 +491,14 @@ async function submitChat(message) {
   pushChatBubble('user', message);
   state.chatHistory.push({ role: 'user', content: message });
   setChatStatus('seeking thread...');
+  const opening = { message, history: state.chatHistory.slice(-7, -1), session: true };
   try {
-    const response = await fetch('/api/chat', {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ message, history: state.chatHistory.slice(-6) }),
-    });
-    if (!response.ok) {
-      throw new Error(`chat failed: ${response.status}`);
+    let payload = await postChat(state.sessionId ? { message, sessionId: state.sessionId } : opening);
+    if (payload.sessionExpired && !payload.answer) {
+      // The server no longer has the session (expired, restarted, or another worker): resend the local history.
+      payload = await postChat(opening);
     }
-    const payload = await response.json();
+    state.sessionId = payload.sessionId || null;
     const answer = payload.answer || 'The thread returned silence.';
     pushChatBubble('assistant', answer, payload.fallback ? 'fallback splice' : 'live oracle');
     state.chatHistory.push({ role: 'assistant', content: answer });
@@ -394,9 +513,43 @@ async function submitChat(message) {
     }
     setChatStatus(payload.fallback ? 'fallback splice' : 'thread returned');
   } catch (error) {
+    await answerOffline(message, error);
+  }
+}
+
+async function postChat(body) {
+  const response = await fetch('api/chat', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(body),
+  });
+  if (!response.ok) {
+    throw new Error(`chat failed: ${response.status}`);
+  }
+  return response.json();
+}
+
+async function answerOffline(message, error) {
+  let citations = [];
+  try {
+    citations = await offlineCitations(message);
+  } catch (indexError) {
+    console.warn(indexError);
+  }
+  if (!citations.length) {
     pushChatBubble('assistant', `The line broke: ${error.message}`);
     setChatStatus('link unstable');
+    return;
   }
+  const lines = citations.map((citation) => `- ${citation.title}`).join('\n');
+  pushChatBubble(
+    'assistant',
+    `The line broke (${error.message}), but the local archive still answers. Closest shards:\n${lines}`,
+    'offline splice',
+  );
+  state.latestCitations = citations;
+  renderCitations();
+  setChatStatus('offline splice');
 }
 
 function renderCitations() {
@@ -408,12 +561,19 @@ function renderCitations() {
     button.innerHTML = `
       <strong>${escapeHtml(citation.title)}</strong><br />
       <span>${escapeHtml(prettyKind(citation.kind))} · ${escapeHtml(summarizePath(citation.sourcePath))}</span>
+      ${citation.excerpt ? `<span class="citation-excerpt">${highlightExcerpt(citation.excerpt, citation.highlights)}</span>` : ''}
+      ${citation.alsoIn && citation.alsoIn.length ? `<span class="citation-also">also in ${escapeHtml(citation.alsoIn.map(entryTitle).join(', '))}</span>` : ''}
     `;
     button.addEventListener('click', () => openCitation(citation));
     elements.citationDock.append(button);
   }
 }
 
+function entryTitle(id) {
+  const entry = state.docsById.get(id) || state.audioById.get(id);
+  return entry ? entry.title : id;
+}
+
 function openCitation(citation) {
   if (citation.refType === 'audio' && citation.id) {
     selectTrack(citation.id, true);
@@ -534,6 +694,7 @@ function bindEvents() {
   elements.searchInput.addEventListener('input', (event) => {
     state.search = event.target.value.trim().toLowerCase();
     renderLists();
+    refreshSearchHits();
   });
 
   elements.chatForm.addEventListener('submit', async (event) => {
@@ -546,6 +707,7 @@ function bindEvents() {
 
   elements.clearChat.addEventListener('click', () => {
     state.chatHistory = [];
+    state.sessionId = null;
     state.latestCitations = [];
     elements.chatLog.innerHTML = '';
     elements.citationDock.innerHTML = '';
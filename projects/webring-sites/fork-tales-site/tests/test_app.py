@@ -1,12 +1,23 @@
 from __future__ import annotations
 
 import json
+import time
 from pathlib import Path
+from types import SimpleNamespace
 
+import httpx
+import pytest
 from fastapi.testclient import TestClient
 
+from bench.replay import load_capture, replay
+from fork_tales_api import debug
 from fork_tales_api.app import create_app
+from fork_tales_api.dense import DenseVectors, LSHIndex
+from fork_tales_api.retrieval import CorpusIndex
+from fork_tales_api.schemas import ChatHistoryTurn
+from fork_tales_api.sessions import SessionStore
 from fork_tales_api.settings import normalize_chat_url
+from fork_tales_api.shadow import rank_biased_overlap
 
 
 def write_fixture_site(root: Path) -> None:
@@ -74,7 +85,12 @@ def write_fixture_site(root: Path) -> None:
         },
     ]
     (content / "library.json").write_text(json.dumps(library), encoding="utf-8")
+    related = {
+        "doc-1": [{"id": "audio-1", "refType": "audio", "title": "Witness Choir", "kind": "track", "score": 0.61}],
+        "audio-1": [{"id": "doc-1", "refType": "doc", "title": "Gates of Truth", "kind": "chapter", "score": 0.61}],
+    }
     (content / "corpus.json").write_text(json.dumps(corpus), encoding="utf-8")
+    (content / "related.json").write_text(json.dumps(related), encoding="utf-8")
 
 
 def test_normalize_chat_url_handles_zai() -> None:
@@ -104,6 +120,364 @@ def test_status_and_chat_fallback(tmp_path: Path, monkeypatch) -> None:
         assert chat_payload["ok"] is True
         assert chat_payload["fallback"] is True
         assert chat_payload["citations"][0]["title"] == "Gates of Truth"
+        lead = chat_payload["citations"][0]
+        assert [lead["excerpt"][start:end] for start, end in lead["highlights"]] == ["gate"]
+
+
+def test_chat_session_keeps_history_server_side(tmp_path: Path, monkeypatch) -> None:
+    write_fixture_site(tmp_path)
+    monkeypatch.setenv("FORK_TALES_SITE_ROOT", str(tmp_path))
+    monkeypatch.setenv("ZAI_API_KEY", "")
+    monkeypatch.setenv("ZAI_BASE_URL", "")
+    app = create_app()
+    with TestClient(app) as client:
+        first = client.post("/api/chat", json={"message": "What does the gate do?", "session": True}).json()
+        session_id = first["sessionId"]
+        assert session_id
+
+        second = client.post("/api/chat", json={"message": "and the witnesses?", "sessionId": session_id}).json()
+        assert second["sessionId"] == session_id
+        session = app.state.service._sessions.get(session_id)
+        assert [turn.role for turn in session.history] == ["user", "assistant", "user", "assistant"]
+        assert {chunk["refId"] for chunk in session.chunks} == {"doc-1", "audio-1"}
+
+        stateless = client.post("/api/chat", json={"message": "What does the gate do?"}).json()
+        assert stateless["sessionId"] is None
+
+
+def test_unknown_session_is_reported_so_the_client_can_resend_history(tmp_path: Path, monkeypatch) -> None:
+    write_fixture_site(tmp_path)
+    monkeypatch.setenv("FORK_TALES_SITE_ROOT", str(tmp_path))
+    monkeypatch.setenv("ZAI_API_KEY", "")
+    monkeypatch.setenv("ZAI_BASE_URL", "")
+    app = create_app()
+    with TestClient(app) as client:
+        bare = client.post("/api/chat", json={"message": "and the witnesses?", "sessionId": "gone"}).json()
+        assert bare["sessionExpired"] is True
+        assert bare["answer"] == ""
+        assert bare["sessionId"] is None
+
+        history = [{"role": "user", "content": "What does the gate do?"}, {"role": "assistant", "content": "It hums."}]
+        seeded = client.post(
+            "/api/chat", json={"message": "and the witnesses?", "sessionId": "gone", "history": history}
+        ).json()
+        assert seeded["sessionExpired"] is True
+        assert seeded["answer"]
+        session = app.state.service._sessions.get(seeded["sessionId"])
+        assert [turn.content for turn in session.history[:2]] == ["What does the gate do?", "It hums."]
+
+        resumed = client.post("/api/chat", json={"message": "and the gate?", "sessionId": seeded["sessionId"]}).json()
+        assert resumed["sessionExpired"] is False
+
+
+def test_session_store_evicts_by_ttl_and_size() -> None:
+    now = [0.0]
+    store = SessionStore(max_sessions=2, ttl_seconds=10, max_turns=2, clock=lambda: now[0])
+    first = store.create([ChatHistoryTurn(role="user", content=f"turn {index}") for index in range(5)])
+    assert [turn.content for turn in first.history] == ["turn 3", "turn 4"]
+
+    second = store.create()
+    now[0] = 5.0
+    assert store.get(first.id) is first
+    store.create()
+    assert store.get(second.id) is None
+    assert len(store) == 2
+
+    now[0] = 30.0
+    assert store.get(first.id) is None
+    assert len(store) == 0
+
+
+def test_session_snapshot_is_a_copy_in_lru_order() -> None:
+    store = SessionStore(max_sessions=4, ttl_seconds=10, max_turns=2)
+    first, second = store.create(), store.create()
+    store.get(first.id)
+    snapshot = store.snapshot()
+    assert snapshot == [second, first]
+    store.create()
+    assert snapshot == [second, first]
+
+
+def test_peak_rss_is_reported_in_bytes_on_linux_and_macos(monkeypatch) -> None:
+    monkeypatch.setattr(debug.resource, "getrusage", lambda who: SimpleNamespace(ru_maxrss=2048))
+    monkeypatch.setattr(debug.sys, "platform", "linux")
+    assert debug.peak_rss_bytes() == 2048 * 1024
+    monkeypatch.setattr(debug.sys, "platform", "darwin")
+    assert debug.peak_rss_bytes() == 2048
+
+
+def test_metrics_expose_chat_stages(tmp_path: Path, monkeypatch) -> None:
+    write_fixture_site(tmp_path)
+    monkeypatch.setenv("FORK_TALES_SITE_ROOT", str(tmp_path))
+    monkeypatch.setenv("ZAI_API_KEY", "")
+    monkeypatch.setenv("ZAI_BASE_URL", "")
+    app = create_app()
+    with TestClient(app) as client:
+        client.post("/api/chat", json={"message": "What does the gate do?"})
+        body = client.get("/metrics").text
+        assert 'fork_tales_chat_stage_seconds_count{stage="retrieval"} 1.0' in body
+        assert 'fork_tales_chat_stage_seconds_count{stage="serialization"} 1.0' in body
+        assert 'fork_tales_chat_fallbacks_total{reason="offline"} 1.0' in body
+        assert "fork_tales_index_chunks 2.0" in body
+        assert 'fork_tales_http_request_seconds_count{method="POST",route="/api/chat"} 1.0' in body
+
+
+def test_debug_endpoints_require_admin_token(tmp_path: Path, monkeypatch) -> None:
+    write_fixture_site(tmp_path)
+    monkeypatch.setenv("FORK_TALES_SITE_ROOT", str(tmp_path))
+    monkeypatch.setenv("FORK_TALES_ADMIN_TOKEN", "sekrit")
+    app = create_app()
+    with TestClient(app) as client:
+        assert client.get("/debug/memory").status_code == 403
+        headers = {"Authorization": "Bearer sekrit"}
+
+        memory = client.get("/debug/memory", headers=headers).json()
+        assert memory["index"] > 0 and memory["corpus"] > 0
+
+        collapsed = client.get("/debug/profile", params={"seconds": 0.05}, headers=headers)
+        assert collapsed.status_code == 200
+        assert collapsed.text.strip()
+
+        speedscope = client.get("/debug/profile", params={"seconds": 0.05, "format": "speedscope"}, headers=headers).json()
+        assert speedscope["profiles"] and speedscope["shared"]["frames"]
+
+
+def test_chat_trace_spans_written_to_jsonl(tmp_path: Path, monkeypatch) -> None:
+    site = tmp_path / "site"
+    write_fixture_site(site)
+    trace_path = tmp_path / "traces" / "spans.jsonl"
+    monkeypatch.setenv("FORK_TALES_SITE_ROOT", str(site))
+    monkeypatch.setenv("FORK_TALES_TRACE_PATH", str(trace_path))
+    monkeypatch.setenv("ZAI_BASE_URL", "http://provider.test/api/paas/v4")
+    monkeypatch.setenv("ZAI_API_KEY", "test-key")
+    seen_headers: list[str] = []
+
+    def provider(request: httpx.Request) -> httpx.Response:
+        seen_headers.append(request.headers.get("traceparent", ""))
+        return httpx.Response(200, json={"choices": [{"message": {"content": "The gate hums."}}]})
+
+    app = create_app()
+    with TestClient(app) as client:
+        app.state.service._http = httpx.AsyncClient(transport=httpx.MockTransport(provider))
+        response = client.post("/api/chat", json={"message": "What does the gate do?"})
+        assert response.json()["fallback"] is False
+        trace_id = response.headers["X-Trace-Id"]
+
+    spans = json.loads(trace_path.read_text(encoding="utf-8").splitlines()[0])["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    by_name = {span["name"]: span for span in spans}
+    assert set(by_name) == {"chat", "search", "citations", "chat_live", "POST chat.completions", "serialize"}
+    assert {span["traceId"] for span in spans} == {trace_id}
+    assert "parentSpanId" not in by_name["chat"]
+    assert by_name["POST chat.completions"]["parentSpanId"] == by_name["chat_live"]["spanId"]
+    assert by_name["chat_live"]["parentSpanId"] == by_name["chat"]["spanId"]
+    assert seen_headers == [f"00-{trace_id}-{by_name['POST chat.completions']['spanId']}-01"]
+
+
+def test_capture_records_anonymized_chat_requests(tmp_path: Path, monkeypatch) -> None:
+    site = tmp_path / "site"
+    write_fixture_site(site)
+    capture_path = tmp_path / "capture" / "chat.jsonl"
+    monkeypatch.setenv("FORK_TALES_SITE_ROOT", str(site))
+    monkeypatch.setenv("FORK_TALES_CAPTURE_PATH", str(capture_path))
+    monkeypatch.setenv("FORK_TALES_CAPTURE_MAX_BYTES", "1")
+    monkeypatch.setenv("ZAI_API_KEY", "")
+    monkeypatch.setenv("ZAI_BASE_URL", "")
+    app = create_app()
+    with TestClient(app) as client:
+        first = client.post("/api/chat", json={"message": "Mail me at reader@example.com about the gate", "session": True}).json()
+        client.post("/api/chat", json={"message": "And the witness?", "sessionId": first["sessionId"]})
+        client.get("/api/status")
+
+    rotated = [capture_path.with_name("chat.jsonl.2"), capture_path.with_name("chat.jsonl.1")]
+    records = [json.loads(path.read_text(encoding="utf-8")) for path in rotated]
+    assert records[0]["request"]["message"] == "Mail me at <email> about the gate"
+    assert records[0]["citations"] == [citation["id"] for citation in first["citations"]]
+    assert records[0]["status"] == 200 and records[0]["latencyMs"] > 0
+    assert records[1]["request"]["sessionId"] != first["sessionId"]
+    assert len(records[1]["request"]["sessionId"]) == 16
+
+
+def test_replay_keeps_a_captured_session_together(tmp_path: Path, monkeypatch) -> None:
+    site = tmp_path / "site"
+    write_fixture_site(site)
+    capture_path = tmp_path / "capture" / "chat.jsonl"
+    monkeypatch.setenv("FORK_TALES_SITE_ROOT", str(site))
+    monkeypatch.setenv("FORK_TALES_CAPTURE_PATH", str(capture_path))
+    monkeypatch.setenv("ZAI_API_KEY", "")
+    monkeypatch.setenv("ZAI_BASE_URL", "")
+    with TestClient(create_app()) as client:
+        first = client.post("/api/chat", json={"message": "What does the gate do?", "session": True}).json()
+        for message in ("And the witness?", "Who sings at the gate?"):
+            client.post("/api/chat", json={"message": message, "sessionId": first["sessionId"]})
+
+    records = load_capture([capture_path])
+    assert "sessionId" not in records[0]["request"]
+    assert len({record["sessionId"] for record in records}) == 1
+
+    monkeypatch.delenv("FORK_TALES_CAPTURE_PATH")
+    app = create_app()
+    with TestClient(app) as client:
+        runs = client.portal.call(replay, records, ["http://replay"], None, 10.0, httpx.ASGITransport(app=app))
+        sessions = app.state.service._sessions
+        assert len(sessions) == 1
+        assert len(sessions.get(runs[0].sessions[records[0]["sessionId"]]).history) == 6
+    assert runs[0].statuses == {"200": 3}
+
+
+def test_shadow_engine_records_overlap_without_touching_response(tmp_path: Path, monkeypatch) -> None:
+    write_fixture_site(tmp_path)
+    monkeypatch.setenv("FORK_TALES_SITE_ROOT", str(tmp_path))
+    monkeypatch.setenv("FORK_TALES_SHADOW_ENGINE", "hybrid-exact")
+    monkeypatch.setenv("FORK_TALES_SHADOW_FRACTION", "1.0")
+    monkeypatch.setenv("ZAI_API_KEY", "")
+    monkeypatch.setenv("ZAI_BASE_URL", "")
+    app = create_app()
+    with TestClient(app) as client:
+        response = client.post("/api/chat", json={"message": "What does the gate do?"})
+        assert response.status_code == 200
+        body = ""
+        for _ in range(100):
+            body = client.get("/metrics").text
+            if 'fork_tales_shadow_runs_total{engine="hybrid-exact",result="ok"} 1.0' in body:
+                break
+            time.sleep(0.02)
+        assert 'fork_tales_shadow_runs_total{engine="hybrid-exact",result="ok"} 1.0' in body
+        assert 'fork_tales_shadow_overlap_sum{engine="hybrid-exact",measure="rbo"} 1.0' in body
+        assert 'fork_tales_shadow_search_seconds_count{engine="hybrid-exact"} 1.0' in body
+
+
+def test_rank_biased_overlap_weights_top_ranks() -> None:
+    assert rank_biased_overlap(["a", "b", "c"], ["a", "b", "c"]) == 1.0
+    assert rank_biased_overlap(["a", "b", "c"], ["x", "y", "z"]) == 0.0
+    swapped_top = rank_biased_overlap(["a", "b", "c", "d"], ["b", "a", "c", "d"])
+    swapped_tail = rank_biased_overlap(["a", "b", "c", "d"], ["a", "b", "d", "c"])
+    assert swapped_top < swapped_tail < 1.0
+
+
+def test_rank_biased_overlap_extrapolates_uneven_lists() -> None:
+    assert rank_biased_overlap(["a", "b"], ["a", "b", "c", "d"]) == pytest.approx(1.0)
+    # Webber et al. eq. 32 worked by hand: sum term 1.6695 * (1 - p) / p plus the tail (0 / 3 + 1 / 2) * p ** 3.
+    assert rank_biased_overlap(["a", "x"], ["a", "b", "c"]) == pytest.approx(0.55)
+    assert rank_biased_overlap(["a", "b", "c"], ["a", "x"]) == rank_biased_overlap(["a", "x"], ["a", "b", "c"])
+    assert rank_biased_overlap([], ["a"]) == 0.0
+
+
+def test_background_load_reports_readiness_and_phases(tmp_path: Path, monkeypatch) -> None:
+    write_fixture_site(tmp_path)
+    monkeypatch.setenv("FORK_TALES_SITE_ROOT", str(tmp_path))
+    monkeypatch.setenv("FORK_TALES_BACKGROUND_LOAD", "true")
+    app = create_app()
+    with TestClient(app) as client:
+        assert client.get("/healthz").json() == {"ok": True}
+        ready = client.get("/readyz")
+        for _ in range(200):
+            if ready.status_code == 200:
+                break
+            time.sleep(0.01)
+            ready = client.get("/readyz")
+        assert ready.status_code == 200
+        phases = ready.json()["phases"]
+        assert {"import", "create_app", "import_service", "load_corpus", "build_index", "total"} <= set(phases)
+        assert client.get("/api/status").json()["ok"] is True
+        assert 'fork_tales_startup_phase_seconds{phase="build_index"}' in client.get("/metrics").text
+
+
+def test_background_load_failure_keeps_static_site_up(tmp_path: Path, monkeypatch) -> None:
+    write_fixture_site(tmp_path)
+    (tmp_path / "content" / "corpus.json").unlink()
+    monkeypatch.setenv("FORK_TALES_SITE_ROOT", str(tmp_path))
+    monkeypatch.setenv("FORK_TALES_BACKGROUND_LOAD", "true")
+    app = create_app()
+    with TestClient(app) as client:
+        ready = client.get("/readyz")
+        for _ in range(200):
+            if "error" in ready.json():
+                break
+            time.sleep(0.01)
+            ready = client.get("/readyz")
+        assert ready.status_code == 503
+        assert "SiteContentError" in ready.json()["error"]
+        chat = client.post("/api/chat", json={"message": "gate"})
+        assert chat.status_code == 503
+        assert chat.headers["retry-after"] == "1"
+        assert client.get("/").status_code == 200
+
+
+def test_extra_sites_load_lazily_by_prefix_or_host_and_evict(tmp_path: Path, monkeypatch) -> None:
+    roots = {name: tmp_path / name for name in ("main", "echo", "drift")}
+    for name, root in roots.items():
+        write_fixture_site(root)
+        library_path = root / "content" / "library.json"
+        library = json.loads(library_path.read_text(encoding="utf-8"))
+        library["generatedAt"] = name
+        library_path.write_text(json.dumps(library), encoding="utf-8")
+        (root / "index.html").write_text(f"<h1>{name}</h1>", encoding="utf-8")
+    monkeypatch.setenv("FORK_TALES_SITE_ROOT", str(roots["main"]))
+    monkeypatch.setenv("FORK_TALES_SITES", json.dumps({"echo": str(roots["echo"]), "drift": str(roots["drift"])}))
+    monkeypatch.setenv("FORK_TALES_SITE_HOSTS", json.dumps({"echo.example": "echo"}))
+    monkeypatch.setenv("FORK_TALES_SITE_MEMORY_BUDGET_MB", "0")
+    app = create_app()
+    with TestClient(app) as client:
+        assert app.state.sites.loaded() == []
+        assert client.get("/api/status").json()["generatedAt"] == "main"
+        assert client.get("/sites/echo/api/status").json()["generatedAt"] == "echo"
+        assert client.get("/api/status", headers={"Host": "echo.example:8080"}).json()["generatedAt"] == "echo"
+        assert app.state.sites.loaded() == ["echo"]
+
+        chat = client.post("/sites/drift/api/chat", json={"message": "What does the gate do?"})
+        assert chat.status_code == 200
+        assert app.state.sites.loaded() == ["drift"]
+        assert client.get("/sites/drift/").text == "<h1>drift</h1>"
+        assert client.get("/", headers={"Host": "echo.example"}).text == "<h1>echo</h1>"
+        assert client.get("/sites/nowhere/api/status").status_code == 404
+
+        body = client.get("/metrics").text
+        assert 'fork_tales_site_loads_total{result="ok"} 2.0' in body
+        assert "fork_tales_site_evictions_total 1.0" in body
+        assert 'fork_tales_http_request_seconds_count{method="POST",route="/api/chat"} 1.0' in body
+
+
+def test_related_lookup(tmp_path: Path, monkeypatch) -> None:
+    write_fixture_site(tmp_path)
+    monkeypatch.setenv("FORK_TALES_SITE_ROOT", str(tmp_path))
+    app = create_app()
+    with TestClient(app) as client:
+        response = client.get("/api/related/doc-1")
+        assert response.status_code == 200
+        assert [item["id"] for item in response.json()["items"]] == ["audio-1"]
+
+        missing = client.get("/api/related/nope")
+        assert missing.status_code == 404
+
+
+def test_collapsed_chunk_is_one_citation_naming_its_other_refs(tmp_path: Path, monkeypatch) -> None:
+    write_fixture_site(tmp_path)
+    corpus_path = tmp_path / "content" / "corpus.json"
+    corpus = json.loads(corpus_path.read_text(encoding="utf-8"))[:1]
+    corpus[0]["refs"] = [["doc", "doc-1"], ["audio", "audio-1"]]
+    # A second, unrelated chunk keeps BM25 idf positive, as in any real corpus.
+    corpus.append({**corpus[0], "id": "chunk-doc-1-1", "refs": None, "text": "Static drifts across the quiet wire."})
+    corpus_path.write_text(json.dumps(corpus), encoding="utf-8")
+    monkeypatch.setenv("FORK_TALES_SITE_ROOT", str(tmp_path))
+    monkeypatch.setenv("ZAI_API_KEY", "")
+    monkeypatch.setenv("ZAI_BASE_URL", "")
+    app = create_app()
+    with TestClient(app) as client:
+        chat = client.post("/api/chat", json={"message": "What does the gate do?"}).json()
+        assert [(citation["refType"], citation["id"], citation["alsoIn"]) for citation in chat["citations"]] == [("doc", "doc-1", ["audio-1"])]
+
+
+def test_unrelated_query_takes_the_thin_slice_fallback(tmp_path: Path, monkeypatch) -> None:
+    write_fixture_site(tmp_path)
+    monkeypatch.setenv("FORK_TALES_SITE_ROOT", str(tmp_path))
+    monkeypatch.setenv("ZAI_API_KEY", "")
+    monkeypatch.setenv("ZAI_BASE_URL", "")
+    app = create_app()
+    with TestClient(app) as client:
+        chat = client.post("/api/chat", json={"message": "banana smoothie recipe"}).json()
+        assert chat["citations"] == []
+        assert "too thin" in chat["answer"]
+        assert client.post("/api/chat", json={"message": "What does the gate do?"}).json()["citations"]
 
 
 def test_static_shell_serves(tmp_path: Path, monkeypatch) -> None:
@@ -114,3 +488,54 @@ def test_static_shell_serves(tmp_path: Path, monkeypatch) -> None:
         response = client.get("/")
         assert response.status_code == 200
         assert "fork//tales" in response.text.lower()
+        assert client.get("/debug/memory").status_code == 404
+
+
+def test_hls_streams_serve_with_their_media_types(tmp_path: Path, monkeypatch) -> None:
+    write_fixture_site(tmp_path)
+    streams = tmp_path / "media" / "streams" / "witness"
+    streams.mkdir(parents=True)
+    (streams / "master.m3u8").write_text("#EXTM3U\n", encoding="utf-8")
+    (streams / "segment_000.ts").write_bytes(b"\x47" * 188)
+    monkeypatch.setenv("FORK_TALES_SITE_ROOT", str(tmp_path))
+    with TestClient(create_app()) as client:
+        playlist = client.get("/media/streams/witness/master.m3u8")
+        assert playlist.headers["content-type"].startswith("application/vnd.apple.mpegurl")
+        assert client.get("/media/streams/witness/segment_000.ts").headers["content-type"] == "video/mp2t"
+
+
+def test_hybrid_search_recovers_inflected_terms() -> None:
+    index = CorpusIndex(
+        [
+            {"id": "chunk-a", "title": "Harbor", "text": "The lanterns flicker over the harbor."},
+            {"id": "chunk-b", "title": "Gate", "text": "The gate hums at midnight."},
+        ]
+    )
+    results = index.search("lantern")
+    assert [chunk["id"] for chunk in results] == ["chunk-a"]
+
+
+def test_snippet_picks_densest_window() -> None:
+    filler = "static drifts across the quiet wire. " * 20
+    text = filler + "The lantern gate opens; the gate keeps its lantern lit. " + filler
+    chunk = {"id": "chunk-long", "title": "Long", "text": text}
+    index = CorpusIndex([chunk], dense=False)
+
+    snippet = index.snippet(chunk, "lantern gate", width=120)
+    assert len(snippet.text) <= 122
+    assert snippet.text.startswith("…") and snippet.text.endswith("…")
+    matched = [snippet.text[start:end].lower() for start, end in snippet.highlights]
+    assert matched == ["lantern", "gate", "gate", "lantern"]
+
+
+def test_lsh_index_finds_exact_row(tmp_path: Path) -> None:
+    texts = [f"signal {index} witness thread lantern gate variant{index * 7919 % 1000}" for index in range(300)]
+    vectors = DenseVectors.fit([str(index) for index in range(len(texts))], texts)
+    vectors.save(tmp_path / "vectors.npz")
+    loaded = DenseVectors.load(tmp_path / "vectors.npz")
+    assert loaded.ids == vectors.ids
+
+    for ann in (LSHIndex(loaded.matrix), LSHIndex(loaded.matrix, exact_limit=0)):
+        position, score = ann.search(loaded.embed(texts[42]), top_k=1)[0]
+        assert position == 42
+        assert score > 0.99
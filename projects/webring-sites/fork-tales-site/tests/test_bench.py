@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import json
+import time
+
+from fastapi.testclient import TestClient
+
+from bench.loadtest import LoadResult, percentile, summarize
+from bench.stub_provider import STUB_ANSWER, LatencyModel, StubConfig, create_stub_app
+from bench.synthetic_corpus import CJK_RANGES, SyntheticVocabulary
+
+
+def is_cjk(word: str) -> bool:
+    return any(start <= ord(word[0]) <= end for start, end in CJK_RANGES)
+
+
+def test_synthetic_vocabulary_keeps_its_size_and_cjk_ratio() -> None:
+    vocabulary = SyntheticVocabulary(50_000, 0.08, seed=3)
+
+    assert len(set(vocabulary.words)) == 50_000
+    assert sum(is_cjk(word) for word in vocabulary.words) == 4_000
+    tokens = vocabulary.sample(100_000)
+    assert abs(sum(is_cjk(word) for word in tokens) / len(tokens) - 0.08) < 0.005
+
+
+def test_stub_provider_injects_latency_and_errors() -> None:
+    with TestClient(create_stub_app(StubConfig(latency_ms=50, latency_dist="fixed"))) as client:
+        started = time.perf_counter()
+        response = client.post("/v1/chat/completions", json={"model": "glm", "messages": []})
+        assert time.perf_counter() - started >= 0.05
+        assert response.json()["choices"][0]["message"]["content"] == STUB_ANSWER
+        assert response.json()["model"] == "glm"
+        assert client.post("/v1/embeddings", json={}).status_code == 404
+
+    with TestClient(create_stub_app(StubConfig(latency_ms=0, latency_dist="fixed", error_rate=1.0, error_status=503))) as client:
+        assert client.post("/chat/completions", json={}).status_code == 503
+        assert client.get("/stats").json() == {"requests": 1, "errors": 1, "hangs": 0, "streams": 0}
+
+
+def test_stub_provider_latency_model_keeps_the_requested_mean() -> None:
+    for dist in ("uniform", "exponential", "lognormal"):
+        model = LatencyModel(StubConfig(latency_ms=200, latency_dist=dist, seed=5))
+        samples = [model.sample_seconds() for _ in range(20_000)]
+        assert abs(sum(samples) / len(samples) - 0.2) < 0.01, dist
+
+
+def test_stub_provider_streams_the_answer_as_sse_chunks() -> None:
+    with TestClient(create_stub_app(StubConfig(latency_ms=0, latency_dist="fixed", stream_chunk_ms=0))) as client:
+        response = client.post("/v1/chat/completions", json={"model": "glm", "stream": True})
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [line.removeprefix("data: ") for line in response.text.splitlines() if line]
+    assert events[-1] == "[DONE]"
+    chunks = [json.loads(event) for event in events[:-1]]
+    assert "".join(chunk["choices"][0]["delta"]["content"] for chunk in chunks) == STUB_ANSWER + " "
+    assert {chunk["object"] for chunk in chunks} == {"chat.completion.chunk"}
+
+
+def test_percentile_handles_empty_and_single_samples() -> None:
+    assert percentile([], 0.99) == 0.0
+    assert percentile([7.0], 0.5) == percentile([7.0], 0.99) == 7.0
+    values = [float(value) for value in range(1, 101)]
+    assert (percentile(values, 0.5), percentile(values, 0.9), percentile(values, 1.0)) == (51.0, 90.0, 100.0)
+
+
+def test_summarize_reports_rates_and_saturation() -> None:
+    empty = summarize(LoadResult(), rps=10, duration=1)
+    assert empty["requests"] == 0
+    assert empty["achievedRps"] == empty["errorRate"] == empty["fallbackRate"] == 0.0
+    assert empty["latencyMs"] == {"p50": 0.0, "p90": 0.0, "p99": 0.0, "max": 0.0}
+
+    single = summarize(LoadResult(latencies=[12.5], statuses={"200": 1}, elapsed=0.5), rps=2, duration=0.5)
+    assert single["latencyMs"] == {"p50": 12.5, "p90": 12.5, "p99": 12.5, "max": 12.5}
+    assert (single["achievedRps"], single["errorRate"]) == (2.0, 0.0)
+
+    result = LoadResult(
+        latencies=[10.0, 20.0, 30.0, 40.0],
+        statuses={"200": 2, "503": 1, "ReadTimeout": 1},
+        fallbacks=1,
+        client_in_flight=[1, 3, 2],
+        server_in_flight=[1.0, 2.0],
+        elapsed=2.0,
+    )
+    summary = summarize(result, rps=2, duration=2)
+    assert (summary["errorRate"], summary["fallbackRate"]) == (0.5, 0.5)
+    assert summary["saturation"] == {
+        "clientInFlightMax": 3,
+        "serverChatInFlightMax": 2.0,
+        "serverChatInFlightMean": 1.5,
+        "scheduleLagP99Ms": 0.0,
+    }
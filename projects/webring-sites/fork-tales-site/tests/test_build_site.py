@@ -0,0 +1,539 @@
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import sys
+import time
+import unicodedata
+from pathlib import Path
+
+import build_site
+from fastapi.testclient import TestClient
+from fork_tales_api.app import create_app
+from fork_tales_api.text import TOKEN_PATTERN_JS, TOKEN_RE
+
+
+def make_doc(identifier: str, title: str, text: str) -> dict[str, object]:
+    return {"id": identifier, "title": title, "kind": "chapter", "visible": True, "text": text}
+
+
+def make_track(identifier: str, title: str, lyrics: str) -> dict[str, object]:
+    return {
+        "id": identifier,
+        "title": title,
+        "kind": "music",
+        "excerpt": lyrics[:40],
+        "lyricsText": lyrics,
+        "collectionTitle": "Choir Deck",
+        "tags": ["witness"],
+    }
+
+
+def test_search_index_postings_are_delta_encoded() -> None:
+    docs = [
+        make_doc("doc-1", "Gates of Truth", "The gate hums at midnight."),
+        make_doc("doc-2", "Harbor", "Lanterns over the harbor."),
+    ]
+    audio = [make_track("audio-1", "Witness Choir", "Witness the gate. The gate.")]
+    index = build_site.build_search_index(docs, audio)
+
+    assert index["refs"] == [["doc", "doc-1"], ["doc", "doc-2"], ["audio", "audio-1"]]
+    postings = index["postings"][index["terms"].index("gate")]
+    numbers, frequencies, current = [], [], 0
+    for gap, tf in zip(postings[::2], postings[1::2], strict=True):
+        current += gap
+        numbers.append(current)
+        frequencies.append(tf)
+    assert numbers == [0, 2]
+    assert frequencies == [1, 2]
+    assert all(0 <= norm <= 255 for norm in index["norms"])
+    assert index["tokenPattern"] == TOKEN_PATTERN_JS
+
+
+def test_browser_token_pattern_matches_the_python_tokenizer() -> None:
+    # Both patterns are one repeated character class, so agreeing on every code point makes them identical.
+    kana = [(0x4E00, 0x9FAF), (0x3041, 0x309F), (0x30A1, 0x30FF)]
+    for code in range(sys.maxunicode + 1):
+        char = chr(code)
+        in_js_class = unicodedata.category(char)[0] in "LN" or char in "_-" or any(a <= code <= b for a, b in kana)
+        assert bool(TOKEN_RE.fullmatch(char)) == in_js_class, hex(code)
+    assert TOKEN_PATTERN_JS == TOKEN_RE.pattern.replace(r"\w", r"\p{L}\p{N}_")
+
+
+def test_hls_command_maps_every_rendition(tmp_path: Path) -> None:
+    command = build_site.hls_command("ffmpeg", tmp_path / "song.wav", tmp_path / "out")
+    assert command.count("-map") == len(build_site.AUDIO_RENDITIONS_KBPS) + 1
+    stream_map = command[command.index("-var_stream_map") + 1]
+    assert stream_map == "a:0,name:64k a:1,name:128k a:2,name:192k"
+    assert command[command.index("-hls_time") + 1] == str(build_site.HLS_SEGMENT_SECONDS)
+    assert command[-1] == str(tmp_path / "out" / "fallback.m4a")
+
+
+def use_build_roots(tmp_path: Path, monkeypatch) -> tuple[Path, Path]:
+    """Point every build path at `tmp_path`; returns (fork root, music root)."""
+    fork, music, dist = tmp_path / "fork", tmp_path / "music", tmp_path / "dist"
+    cache = tmp_path / "cache"
+    for name, value in {
+        "FORK_ROOT": fork,
+        "MUSIC_ROOT": music,
+        "RELEVANT_MUSIC_DIRS": [music / "operators"],
+        "PLAYLIST_DIR": music / "playlists",
+        "DIST_ROOT": dist,
+        "CONTENT_ROOT": dist / "content",
+        "MEDIA_ROOT": dist / "media",
+        "STREAM_ROOT": dist / "media" / "streams",
+        "STREAM_CACHE_ROOT": cache / "streams",
+        "BUILD_MANIFEST_PATH": cache / "build-manifest.json",
+        "BLOB_ROOT": cache / "blobs",
+        "HASH_CACHE_PATH": cache / "file-hashes.json",
+        "RENDER_CACHE_ROOT": cache / "renders",
+        "FFMPEG": "definitely-not-ffmpeg",
+    }.items():
+        monkeypatch.setattr(build_site, name, value)
+    return fork, music
+
+
+def test_audio_streams_publish_cached_transcodes(tmp_path: Path, monkeypatch) -> None:
+    use_build_roots(tmp_path, monkeypatch)
+    media = build_site.MEDIA_ROOT
+    # Every transcode is already cached, so the executable is only checked for existence.
+    monkeypatch.setattr(build_site, "FFMPEG", sys.executable)
+
+    source = tmp_path / "witness.wav"
+    source.write_bytes(b"RIFF fake wav")
+    cached = build_site.STREAM_CACHE_ROOT / f"{build_site.file_sha256(source)}-{build_site.stream_settings_key()}"
+    (cached / "64k").mkdir(parents=True)
+    (cached / "master.m3u8").write_text("#EXTM3U\n", encoding="utf-8")
+    (cached / "64k" / "index.m3u8").write_text("#EXTM3U\n", encoding="utf-8")
+    (cached / "fallback.m4a").write_bytes(b"aac")
+
+    hashes = build_site.HashCache(build_site.HASH_CACHE_PATH)
+    copier = build_site.AssetCopier(media, build_site.BuildManifest(hashes, build_site.SourceTree()), build_site.BlobStore(build_site.BLOB_ROOT, hashes))
+    media_url = copier.copy(source, "audio/operators")
+    entries = [{"id": "a", "mediaUrl": media_url}, {"id": "b", "mediaUrl": media_url}]
+    counts = build_site.build_audio_streams(entries, copier)
+
+    assert counts == {"streams": 1, "transcoded": 0, "failed": 0}
+    assert {entry["mediaUrl"] for entry in entries} == {"media/streams/audio/operators/witness/master.m3u8"}
+    assert entries[0]["mediaFallbackUrl"] == "media/streams/audio/operators/witness/fallback.m4a"
+    assert (media / "streams" / "audio" / "operators" / "witness" / "64k" / "index.m3u8").exists()
+    assert copier.publish() == 0
+    assert not (media / "audio" / "operators" / "witness.wav").exists()
+
+
+def test_audio_streams_keep_progressive_files_without_ffmpeg(tmp_path: Path, monkeypatch) -> None:
+    use_build_roots(tmp_path, monkeypatch)
+    entries = [{"id": "a", "mediaUrl": "media/audio/x.mp3"}]
+    hashes = build_site.HashCache(build_site.HASH_CACHE_PATH)
+    copier = build_site.AssetCopier(build_site.MEDIA_ROOT, build_site.BuildManifest(hashes, build_site.SourceTree()), build_site.BlobStore(build_site.BLOB_ROOT, hashes))
+    assert build_site.build_audio_streams(entries, copier)["streams"] == 0
+    assert entries == [{"id": "a", "mediaUrl": "media/audio/x.mp3"}]
+
+
+def age_files(*roots: Path) -> None:
+    """Backdate fixtures past the racy window, as sources are on a real rebuild."""
+    past = time.time_ns() - 60 * 1_000_000_000
+    for root in roots:
+        for path in root.rglob("*"):
+            os.utime(path, ns=(past, past))
+
+
+def test_rebuild_reuses_unchanged_sources_and_removes_orphans(tmp_path: Path, monkeypatch) -> None:
+    fork, music = use_build_roots(tmp_path, monkeypatch)
+    (fork / "docs").mkdir(parents=True)
+    (fork / "MANUSCRIPT_FULL.md").write_text("## Chapter 1 — Gate Rising\n\nThe gate hums.\n", encoding="utf-8")
+    (fork / "LIVE_CHOIR.md").write_text("# Live Choir\n\nWitness the gate.\n", encoding="utf-8")
+    operators = music / "operators"
+    operators.mkdir(parents=True)
+    (operators / "Witness Choir.mp3").write_bytes(b"ID3 witness")
+    (operators / "Witness Choir.txt").write_text("Title: Witness Choir\n\nWitness the gate\n", encoding="utf-8")
+    (operators / "Lantern Lullaby.mp3").write_bytes(b"ID3 lantern")
+    age_files(fork, music)
+
+    build_site.build()
+    library = json.loads((build_site.CONTENT_ROOT / "library.json").read_text(encoding="utf-8"))
+    witness = build_site.DIST_ROOT / "media" / "audio" / "operators" / "witness-choir.mp3"
+    lantern = build_site.DIST_ROOT / "media" / "audio" / "operators" / "lantern-lullaby.mp3"
+    assert witness.exists() and lantern.exists()
+    published = witness.stat().st_mtime_ns, witness.stat().st_ino
+
+    (operators / "Lantern Lullaby.mp3").unlink()
+    build_site.build()
+
+    rebuilt = json.loads((build_site.CONTENT_ROOT / "library.json").read_text(encoding="utf-8"))
+    assert rebuilt["docs"] == library["docs"]
+    assert (witness.stat().st_mtime_ns, witness.stat().st_ino) == published
+    assert not lantern.exists()
+    assert json.loads((build_site.CONTENT_ROOT / "build.json").read_text(encoding="utf-8"))["incremental"] == {
+        "rendered": 0,
+        "mediaWritten": 0,
+        "orphansRemoved": 1,
+        "renderCacheHits": 0,
+        "renderCachePruned": 0,
+        "mediaLinked": 0,
+        "blobsPruned": 1,
+        "sourcesHashed": 0,
+        "directoriesRead": 8,
+    }
+
+    (fork / "LIVE_CHOIR.md").write_text("# Live Choir\n\nWitness the thread.\n", encoding="utf-8")
+    build_site.build()
+    assert json.loads((build_site.CONTENT_ROOT / "build.json").read_text(encoding="utf-8"))["incremental"]["rendered"] == 1
+
+
+def test_editing_the_build_script_rebuilds_cached_entries(tmp_path: Path, monkeypatch) -> None:
+    fork, music = use_build_roots(tmp_path, monkeypatch)
+    fork.mkdir()
+    (fork / "MANUSCRIPT_FULL.md").write_text("## Chapter 1 — Gate Rising\n\nThe gate hums.\n", encoding="utf-8")
+    (music / "operators").mkdir(parents=True)
+    age_files(fork, music)
+    build_site.build()
+    build_site.build()
+    incremental = json.loads((build_site.CONTENT_ROOT / "build.json").read_text(encoding="utf-8"))["incremental"]
+    assert (incremental["rendered"], incremental["renderCacheHits"]) == (0, 0)
+
+    edited = tmp_path / "build_site.py"
+    edited.write_text(Path(build_site.__file__).read_text(encoding="utf-8") + "\n# excerpt rules changed\n", encoding="utf-8")
+    monkeypatch.setattr(build_site, "__file__", str(edited))
+    build_site.render_key.cache_clear()
+    try:
+        build_site.build()
+    finally:
+        build_site.render_key.cache_clear()
+    # The entry is derived again; its markdown is unchanged, so the HTML still comes from the render cache.
+    incremental = json.loads((build_site.CONTENT_ROOT / "build.json").read_text(encoding="utf-8"))["incremental"]
+    assert (incremental["rendered"], incremental["renderCacheHits"]) == (0, 1)
+
+
+def test_parallel_build_matches_serial_build(tmp_path: Path, monkeypatch) -> None:
+    fork, music = use_build_roots(tmp_path, monkeypatch)
+    (fork / "docs").mkdir(parents=True)
+    chapters = "\n".join(f"## Chapter {n} — Gate {n}\n\n" + "The gate hums at midnight. " * 80 for n in range(1, 9))
+    (fork / "MANUSCRIPT_FULL.md").write_text(chapters, encoding="utf-8")
+    (fork / "LIVE_CHOIR.md").write_text("# Live Choir\n\n*Witness* the gate.\n", encoding="utf-8")
+    operators = music / "operators"
+    operators.mkdir(parents=True)
+    for name in ("Witness Choir", "Lantern Lullaby", "Mycelial Witness"):
+        (operators / f"{name}.mp3").write_bytes(f"ID3 {name}".encode())
+        (operators / f"{name}.txt").write_text(f"Title: {name}\n\n**{name}** at the gate\n", encoding="utf-8")
+
+    outputs = []
+    for workers in (1, 3):
+        monkeypatch.setattr(build_site, "BUILD_WORKERS", workers)
+        monkeypatch.setattr(build_site, "IO_WORKERS", workers)
+        shutil.rmtree(tmp_path / "dist", ignore_errors=True)
+        shutil.rmtree(tmp_path / "cache", ignore_errors=True)
+        build_site.build()
+        library = json.loads((build_site.CONTENT_ROOT / "library.json").read_text(encoding="utf-8"))
+        library.pop("generatedAt")
+        outputs.append((library, (build_site.CONTENT_ROOT / "corpus.json").read_bytes()))
+
+    assert outputs[0] == outputs[1]
+    assert all(doc["html"] for doc in outputs[0][0]["docs"])
+    assert all(track["lyricsHtml"] for track in outputs[0][0]["audio"])
+
+
+def test_identical_media_is_stored_once(tmp_path: Path, monkeypatch) -> None:
+    use_build_roots(tmp_path, monkeypatch)
+    first, second = tmp_path / "take one.wav", tmp_path / "take two.wav"
+    first.write_bytes(b"RIFF same take")
+    second.write_bytes(b"RIFF same take")
+    hashes = build_site.HashCache(build_site.HASH_CACHE_PATH)
+    store = build_site.BlobStore(build_site.BLOB_ROOT, hashes)
+    copier = build_site.AssetCopier(build_site.MEDIA_ROOT, build_site.BuildManifest(hashes, build_site.SourceTree()), store)
+    urls = [copier.copy(first, "audio/a"), copier.copy(second, "audio/b")]
+
+    assert copier.publish() == 2
+    published = [build_site.DIST_ROOT / url for url in urls]
+    blob = store.path(build_site.file_sha256(first))
+    assert {path.stat().st_ino for path in published} == {blob.stat().st_ino}
+    assert store.linked == 1
+
+    assert store.prune([build_site.file_sha256(first)]) == 0
+    assert store.prune([]) == 1
+    assert not blob.exists()
+    assert first.exists()
+
+
+def test_published_media_shares_the_source_inode(tmp_path: Path, monkeypatch) -> None:
+    use_build_roots(tmp_path, monkeypatch)
+    source = tmp_path / "witness.wav"
+    source.write_bytes(b"RIFF witness")
+    hashes = build_site.HashCache(build_site.HASH_CACHE_PATH)
+    store = build_site.BlobStore(build_site.BLOB_ROOT, hashes)
+    copier = build_site.AssetCopier(build_site.MEDIA_ROOT, build_site.BuildManifest(hashes, build_site.SourceTree()), store)
+    url = copier.copy(source, "audio/operators")
+
+    assert copier.publish() == 1
+    assert (build_site.DIST_ROOT / url).stat().st_ino == source.stat().st_ino
+    assert source.stat().st_nlink == 3
+
+    # An in-place edit reaches the blob through the shared inode, so it must not be reused for the old content.
+    digest = build_site.file_sha256(source)
+    source.write_bytes(b"RIFF witness, retaken")
+    copy = tmp_path / "witness copy.wav"
+    copy.write_bytes(b"RIFF witness")
+    store.publish(copy, digest, build_site.MEDIA_ROOT / "copy.wav")
+    assert (build_site.MEDIA_ROOT / "copy.wav").read_bytes() == b"RIFF witness"
+    assert store.path(digest).stat().st_ino == copy.stat().st_ino
+
+
+def test_retagging_a_source_in_place_leaves_identical_tracks_alone(tmp_path: Path, monkeypatch) -> None:
+    fork, music = use_build_roots(tmp_path, monkeypatch)
+    fork.mkdir()
+    (fork / "MANUSCRIPT_FULL.md").write_text("## Chapter 1 — Gate Rising\n\nThe gate hums.\n", encoding="utf-8")
+    operators = music / "operators"
+    operators.mkdir(parents=True)
+    for name in ("Witness Choir", "Lantern Lullaby"):
+        (operators / f"{name}.mp3").write_bytes(b"ID3 original")
+    age_files(fork, music)
+    build_site.build()
+    media = build_site.MEDIA_ROOT / "audio" / "operators"
+    assert {path.read_bytes() for path in media.iterdir()} == {b"ID3 original"}
+
+    # Whichever source the shared blob links to, retag it in place.
+    retagged = next(path for path in operators.iterdir() if path.stat().st_nlink > 1)
+    with retagged.open("r+b") as handle:
+        handle.write(b"ID3 RETAGGED")
+    age_files(fork, music)
+    build_site.build()
+    outputs = {path.name: path.read_bytes() for path in media.iterdir()}
+    expected = {build_site.slugify(path.stem) + ".mp3": path.read_bytes() for path in operators.iterdir()}
+    assert outputs == expected
+    assert sorted(expected.values()) == [b"ID3 RETAGGED", b"ID3 original"]
+
+
+def test_blobs_of_copied_outputs_survive_pruning(tmp_path: Path, monkeypatch) -> None:
+    fork, music = use_build_roots(tmp_path, monkeypatch)
+    fork.mkdir()
+    (fork / "MANUSCRIPT_FULL.md").write_text("## Chapter 1 — Gate Rising\n\nThe gate hums.\n", encoding="utf-8")
+    (music / "operators").mkdir(parents=True)
+    (music / "operators" / "Witness Choir.mp3").write_bytes(b"ID3 witness")
+    age_files(fork, music)
+    # As across filesystems: every link fails, so blobs and outputs are copies sharing no inode.
+    monkeypatch.setattr(build_site.os, "link", lambda source, target: build_site.clone_file(Path(source), Path(target)))
+    build_site.build()
+    build_site.build()
+    incremental = json.loads((build_site.CONTENT_ROOT / "build.json").read_text(encoding="utf-8"))["incremental"]
+    assert incremental["blobsPruned"] == 0
+    assert len(list(build_site.BLOB_ROOT.glob("*/*"))) == 1
+
+
+def test_source_tree_walks_like_rglob_without_following_directory_links(tmp_path: Path) -> None:
+    root, outside = tmp_path / "music", tmp_path / "elsewhere"
+    (root / "operators" / "live").mkdir(parents=True)
+    (root / "drafts").mkdir()
+    outside.mkdir()
+    for path in (
+        root / "Song.mp3",
+        root / "Song(1).WAV",
+        root / "notes.txt",
+        root / "operators" / "Song (2).mp3",
+        root / "operators" / "Gate.mp3",
+        root / "operators" / "live" / "Gate(3).flac",
+        root / "drafts" / "Lantern….mp3",
+        outside / "Hidden.mp3",
+    ):
+        path.write_bytes(path.name.encode())
+    (root / "linked").symlink_to(outside, target_is_directory=True)
+    (root / "operators" / "alias.mp3").symlink_to(root / "Song.mp3")
+
+    tree = build_site.SourceTree()
+    walked = [file.path for file in tree.files(root, recursive=True)]
+    assert walked == [path for path in root.rglob("*") if path.is_file()]
+    assert outside / "Hidden.mp3" not in walked and root / "linked" / "Hidden.mp3" not in walked
+    assert [file.path for file in tree.files(root, recursive=True, suffixes=[".WAV", ".flac"])] == [
+        root / "Song(1).WAV",
+        root / "operators" / "live" / "Gate(3).flac",
+    ]
+
+    variants = {stem: sorted(file.path.relative_to(root).as_posix() for file in files) for stem, files in tree.variants(root).items()}
+    assert variants == {
+        "Song": ["Song(1).WAV", "Song.mp3", "operators/Song (2).mp3"],
+        "notes": ["notes.txt"],
+        "Gate": ["operators/Gate.mp3", "operators/live/Gate(3).flac"],
+        "alias": ["operators/alias.mp3"],
+        "Lantern...": ["drafts/Lantern….mp3"],
+    }
+    assert tree.variants(root) is tree.variants(root)
+    assert tree.directories_read == 4
+
+
+def test_hash_cache_persists_settled_files_and_merges_concurrent_saves(tmp_path: Path, monkeypatch) -> None:
+    cache_path = tmp_path / "file-hashes.json"
+    settled, fresh, other = tmp_path / "settled.wav", tmp_path / "fresh.wav", tmp_path / "other.wav"
+    for path in (settled, fresh, other):
+        path.write_bytes(path.name.encode())
+    age_files(tmp_path)
+    fresh.write_bytes(b"just written")
+
+    first, second = build_site.HashCache(cache_path), build_site.HashCache(cache_path)
+    assert first.sha256(settled) == build_site.file_sha256(settled)
+    first.sha256(fresh)
+    second.sha256(other)
+    first.save()
+    second.save()
+
+    hashed: list[Path] = []
+    monkeypatch.setattr(build_site, "file_sha256", lambda path: hashed.append(path) or "recomputed")
+    reloaded = build_site.HashCache(cache_path)
+    assert reloaded.sha256(settled) != "recomputed"
+    assert reloaded.sha256(other) != "recomputed"
+    assert reloaded.sha256(fresh) == "recomputed"
+    assert hashed == [fresh]
+
+
+def test_streamed_json_matches_json_dumps(tmp_path: Path) -> None:
+    docs = [{"id": "ημ", "tags": ["a", "b"], "meta": {"n": [1, {}]}}, {"id": "x", "tags": []}]
+    expected = {"counts": {"docs": 2}, "docs": docs, "audio": [], "gallery": {"by": {"x": [[1, 2]]}}}
+    path = tmp_path / "library.json"
+    for pretty, reference in ((False, {"separators": (",", ":")}), (True, {"indent": 2})):
+        build_site.write_json(path, {**expected, "docs": (doc for doc in docs), "audio": iter([])}, pretty=pretty)
+        assert path.read_text(encoding="utf-8") == json.dumps(expected, ensure_ascii=False, **reference)
+    assert [item.name for item in tmp_path.iterdir()] == ["library.json"]
+
+
+def test_related_docs_rank_by_shared_title_tokens() -> None:
+    docs = [
+        {"id": "doc-a", "title": "Witness Choir Gate"},
+        {"id": "doc-b", "title": "Witness Choir"},
+        {"id": "doc-c", "title": "Choir of the Gate Witness"},
+        {"id": "doc-d", "title": "Lantern Harbor"},
+        {"id": "doc-e", "title": "Gate Witness"},
+    ]
+    audio = [
+        {"title": "Witness the Choir at the Gate", "relatedDocIds": []},
+        {"title": "Lantern", "relatedDocIds": []},
+        {"title": "Harbor Lantern", "relatedDocIds": ["doc-a"]},
+    ]
+    build_site.link_related_docs(audio, docs)
+    # Ties on overlap fall back to the higher doc id, as before.
+    assert [entry["relatedDocIds"] for entry in audio] == [["doc-c", "doc-a", "doc-e"], [], ["doc-a"]]
+
+
+def test_related_graph_ranks_neighbours_and_never_lists_a_node_itself() -> None:
+    texts = {
+        "doc-gate": "The gate hums at midnight while the witnesses wait by the gate.",
+        "doc-harbor": "Lanterns drift across the harbor when the tide turns at dawn.",
+        "doc-hidden": "No chunk ever points at this doc.",
+        "audio-gate": "Witness the gate, the gate hums, the witnesses sing at midnight.",
+        "audio-harbor": "Harbor lanterns on the tide, drifting lanterns at dawn.",
+    }
+    chunk_refs = [["doc-gate"], ["doc-harbor"], ["audio-gate"], ["audio-harbor", "doc-harbor"]]
+    vectors = build_site.DenseVectors.fit([str(row) for row in range(len(chunk_refs))], [texts[refs[0]] for refs in chunk_refs])
+    docs = [{"id": ref_id, "title": ref_id, "kind": "chapter"} for ref_id in ("doc-gate", "doc-harbor", "doc-hidden")]
+    audio = [{"id": ref_id, "title": ref_id, "kind": "music"} for ref_id in ("audio-gate", "audio-harbor")]
+    playlists = [{"id": "playlist-night", "title": "Night", "itemIds": ["audio-gate", "missing-track"]}]
+
+    graph = build_site.build_related_graph(docs, audio, playlists, chunk_refs, vectors)
+
+    assert set(graph) == {"doc-gate", "doc-harbor", "audio-gate", "audio-harbor", "playlist-night"}
+    for node_id, neighbours in graph.items():
+        assert node_id not in [neighbour["id"] for neighbour in neighbours]
+        scores = [neighbour["score"] for neighbour in neighbours]
+        assert scores == sorted(scores, reverse=True)
+        assert all(score > 0 for score in scores)
+    # A playlist of one track sits on that track's centroid, ahead of the doc it was written from.
+    assert [neighbour["id"] for neighbour in graph["audio-gate"][:2]] == ["playlist-night", "doc-gate"]
+    assert graph["doc-gate"][0]["id"] in {"audio-gate", "playlist-night"}
+    assert graph["doc-harbor"][0] == {**graph["doc-harbor"][0], "id": "audio-harbor", "refType": "audio", "kind": "music"}
+
+
+def test_near_duplicate_chunks_collapse_into_the_first() -> None:
+    verse = "Witness the gate where the lanterns hum, the choir is waiting for the tide to come. " * 3
+    docs = [
+        {"id": "doc-1", "title": "Choir", "kind": "chapter", "sourcePath": "docs/choir.md", "text": verse},
+        {"id": "doc-2", "title": "Harbor", "kind": "chapter", "sourcePath": "docs/harbor.md", "text": "Lanterns over the harbor at dawn."},
+    ]
+    audio = [
+        {"id": "audio-1", "title": "Witness", "kind": "track", "sourcePath": "a.mp3", "excerpt": "", "lyricsText": verse + "Oh."},
+        {"id": "audio-2", "title": "Witness", "kind": "track", "sourcePath": "b.mp3", "excerpt": "", "lyricsText": verse},
+    ]
+    duplicates = build_site.find_duplicate_chunks(docs, audio)
+    corpus = list(build_site.build_corpus(docs, audio, duplicates))
+
+    assert duplicates.dropped == {2, 3}
+    assert [chunk["id"] for chunk in corpus] == ["chunk-doc-1-0", "chunk-doc-2-0"]
+    assert corpus[0]["refs"] == [["doc", "doc-1"], ["audio", "audio-1"], ["audio", "audio-2"]]
+    assert "refs" not in corpus[1]
+    assert len(list(build_site.build_corpus(docs, audio))) == 4
+
+
+
+def test_status_serves_a_library_with_dropped_chunks(tmp_path: Path, monkeypatch) -> None:
+    fork, music = use_build_roots(tmp_path, monkeypatch)
+    fork.mkdir()
+    (fork / "MANUSCRIPT_FULL.md").write_text("## Chapter 1 — Gate Rising\n\nThe gate hums.\n", encoding="utf-8")
+    operators = music / "operators"
+    operators.mkdir(parents=True)
+    verse = " ".join(f"lantern{index}" for index in range(120))
+    for name in ("Witness Choir", "Witness Choir Reprise"):
+        (operators / f"{name}.mp3").write_bytes(f"ID3 {name}".encode())
+        (operators / f"{name}.txt").write_text(f"{verse}\n", encoding="utf-8")
+    age_files(fork, music)
+    build_site.build()
+    (build_site.DIST_ROOT / "index.html").write_text("<h1>fork//tales</h1>", encoding="utf-8")
+
+    monkeypatch.setenv("FORK_TALES_SITE_ROOT", str(build_site.DIST_ROOT))
+    with TestClient(create_app()) as client:
+        response = client.get("/api/status")
+    assert response.status_code == 200
+    assert response.json()["counts"]["corpusChunksDropped"] >= 1
+
+def test_chunks_follow_headings_and_stanzas() -> None:
+    text = "# Book\n\nOpening line.\n\n## Verse\n\nfirst line here\nsecond line here\n\nthird line here\n\n### Bridge\n\n" + " ".join(
+        f"w{index}" for index in range(30)
+    )
+    chunks = list(build_site.iter_chunks(text, budget=12, overlap=3))
+
+    assert [chunk.headings for chunk in chunks] == [
+        ("Book",),
+        ("Book", "Verse"),
+        ("Book", "Verse", "Bridge"),
+        ("Book", "Verse", "Bridge"),
+        ("Book", "Verse", "Bridge"),
+        ("Book", "Verse", "Bridge"),
+    ]
+    assert chunks[1].text == "## Verse first line here second line here third line here"
+    assert chunks[2].text.startswith("### Bridge w0")
+    assert chunks[3].text.startswith("w6 w7 w8 ")
+    assert all(len(chunk.text.split()) <= 12 for chunk in chunks)
+    assert all(build_site.collapse_whitespace(text[chunk.start : chunk.end]) == chunk.text for chunk in chunks)
+
+
+def test_render_cache_skips_unchanged_chapters_of_an_edited_manuscript(tmp_path: Path, monkeypatch) -> None:
+    fork, music = use_build_roots(tmp_path, monkeypatch)
+    manuscript = fork / "MANUSCRIPT_FULL.md"
+    fork.mkdir()
+    (music / "operators").mkdir(parents=True)
+    manuscript.write_text("## Chapter 1 — Gate Rising\n\nThe gate hums.\n\n## Chapter 2 — Choir\n\nThe choir waits.\n", encoding="utf-8")
+    age_files(fork, music)
+    build_site.build()
+    library = json.loads((build_site.CONTENT_ROOT / "library.json").read_text(encoding="utf-8"))
+
+    manuscript.write_text(manuscript.read_text(encoding="utf-8").replace("waits", "sings"), encoding="utf-8")
+    age_files(fork, music)
+    build_site.build()
+    incremental = json.loads((build_site.CONTENT_ROOT / "build.json").read_text(encoding="utf-8"))["incremental"]
+    assert (incremental["rendered"], incremental["renderCacheHits"]) == (1, 1)
+
+    build_site.BUILD_MANIFEST_PATH.unlink()
+    manuscript.write_text(manuscript.read_text(encoding="utf-8").replace("sings", "waits"), encoding="utf-8")
+    age_files(fork, music)
+    build_site.build()
+    incremental = json.loads((build_site.CONTENT_ROOT / "build.json").read_text(encoding="utf-8"))["incremental"]
+    assert (incremental["rendered"], incremental["renderCacheHits"]) == (0, 2)
+    rebuilt = json.loads((build_site.CONTENT_ROOT / "library.json").read_text(encoding="utf-8"))
+    assert [doc["html"] for doc in rebuilt["docs"]] == [doc["html"] for doc in library["docs"]]
+
+
+def test_unspaced_cjk_text_is_cut_by_characters() -> None:
+    text = "## 夜明け\n\n" + "夜明けの歌が静かに響く。" * 400 + "\n\n" + "\n".join(["ひかりのうたをうたう"] * 200)
+    chunks = list(build_site.iter_chunks(text))
+
+    assert len(chunks) >= 9
+    assert all(len(chunk.text) <= build_site.CHUNK_MAX_CHARS for chunk in chunks)
+    assert all(chunk.headings == ("夜明け",) for chunk in chunks)
+    assert all(later.start < earlier.end for earlier, later in zip(chunks, chunks[1:]))
+    assert all(build_site.collapse_whitespace(text[chunk.start : chunk.end]) == chunk.text for chunk in chunks)